@@ -1,28 +1,78 @@
 #!/usr/bin/env python3
-import boto3
-from aws_cdk import App, Environment
-from ruamel.yaml import SafeLoader
-from ruamel.yaml import load as yaml_load
+from json import loads as json_loads
+from os import environ
 
-from domino_cdk.config import config_loader
-from domino_cdk.domino_stack import DominoStack
+from domino_cdk.config import config_loader, lookup_requirements
+from domino_cdk.lookups import DominoLookupCache
+from domino_cdk.synth_cache import DominoSynthCache, cli_context
+from domino_cdk.util import DominoCdkUtil
 
-sts = boto3.client("sts")
-try:
-    sts.get_caller_identity()
-except Exception:
-    print("WARNING: Domino CDK App requires valid AWS credentials!\n")
-    raise
+# Read without App, so a reusable synth never has to start the jsii runtime
+context = cli_context()
 
 
-app = App()
+def context_flag(name: str) -> bool:
+    return str(context.get(name)).lower() in ["1", "true", "yes"]
+
+
+# Network lookups made while synthesizing are cached per account/region in lookup_cache (see domino_cdk/lookups.py)
+lookup_ttls = context.get("lookup_ttls") or {}
+offline = context_flag("offline")
+DominoLookupCache.configure(
+    cache_dir=context.get("lookup_cache") or "cdk.lookups",
+    offline=offline,
+    refresh=context_flag("refresh_lookups"),
+    ttls=json_loads(lookup_ttls) if isinstance(lookup_ttls, str) else lookup_ttls,
+)
+
+with open(context.get("config") or "config.yaml") as f:
+    raw_cfg = DominoCdkUtil.yaml_load(f)
+
+# Run every lookup the synth needs at once, before the config and constructs ask for them one by one.
+# The caller identity is among them, so this doubles as the credentials check.
+if not offline:
+    try:
+        DominoLookupCache.for_env(raw_cfg.get("aws_account_id"), raw_cfg.get("aws_region")).prefetch(
+            **lookup_requirements(raw_cfg)
+        )
+    except Exception:
+        print("WARNING: Domino CDK App requires valid AWS credentials (or -c offline=true and cached lookups)!\n")
+        raise
+
+cfg = config_loader(raw_cfg)
 
-with open(app.node.try_get_context("config") or "config.yaml") as f:
-    cfg = config_loader(yaml_load(f, Loader=SafeLoader))
+# Opt-in: reuse the last synth outright if nothing feeding any of the stacks changed, or else replay the nodegroup
+# stacks that didn't (see domino_cdk/synth_cache.py)
+synth_cache = None
+if context_flag("synth_cache") and environ.get("CDK_OUTDIR"):
+    synth_cache = DominoSynthCache(
+        environ["CDK_OUTDIR"],
+        cfg,
+        context,
+        DominoLookupCache.for_env(cfg.aws_account_id, cfg.aws_region).cache_file,
+    )
+    if synth_cache.reusable():
+        print(f"Synth cache: no changes, reusing {synth_cache.outdir}")
+        exit(0)
+    if not synth_cache.stored:
+        print("Synth cache: nothing cached yet, synthesizing")
+    elif stale := synth_cache.stale():
+        print(f"Synth cache: {', '.join(stale)} changed, synthesizing")
+    else:
+        print(f"Synth cache: {synth_cache.outdir} is incomplete, synthesizing")
 
+from aws_cdk import App, Environment  # noqa: E402
+
+from domino_cdk.domino_stack import DominoStack  # noqa: E402
+from domino_cdk.profiling import DominoSynthProfiler  # noqa: E402
+
+app = App()
 nest = app.node.try_get_context("singlestack") or True
 
-DominoStack(
+# Opt-in: time each provisioner and the synth itself, reported in cdk.out (see domino_cdk/profiling.py)
+profiler = DominoSynthProfiler(app) if context_flag("profile_synth") else None
+
+stack = DominoStack(
     app,
     f"{cfg.name}",
     # If you don't specify 'env', this stack will be environment-agnostic.
@@ -38,6 +88,22 @@ DominoStack(
     env=Environment(region=cfg.aws_region, account=cfg.aws_account_id),
     cfg=cfg,
     nest=nest,
+    profiler=profiler,
+    synth_cache=synth_cache,
 )
+if synth_cache and synth_cache.replayed:
+    print(f"Synth cache: replaying unchanged {', '.join(synth_cache.replayed)}")
+
+if profiler:
+    with profiler.phase("synth"):
+        app.synth()
+    print(f"Synth profile: {profiler.write(app.outdir)}")
+else:
+    app.synth()
+
+# Keep each nodegroup's stack and resolved instance types on later synths, as changing either replaces it
+for key, values in stack.context_records.items():
+    DominoCdkUtil.record_context(key, {cfg.name: values})
 
-app.synth()
+if synth_cache:
+    synth_cache.save()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import re
+import sys
+from os.path import dirname
+from pathlib import Path
+from statistics import median
+from subprocess import run
+from time import perf_counter
+
+CDK_DIR = dirname(dirname(__file__))
+
+# util.py commands that only handle config, templates and assets; none of them should need the jsii runtime
+COMMANDS = [
+    "load_config",
+    "generate_config_template",
+    "generate_iam_policies",
+    "generate_asset_parameters",
+    "generate_terraform_bootstrap",
+    "upload_assets",
+]
+
+# Importing any of these boots (or is only useful with) the jsii Node runtime
+JSII_MODULES = ["jsii", "aws_cdk", "constructs"]
+
+importtime_re = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def imported_modules(importtime: str) -> dict[str, int]:
+    """Cumulative import time (us) of each module, from python -X importtime's output"""
+    modules = {}
+    for line in importtime.splitlines():
+        if m := importtime_re.match(line):
+            modules[m.group(4)] = int(m.group(2))
+    return modules
+
+
+def run_command(command: str) -> tuple[float, dict[str, int]]:
+    start = perf_counter()
+    result = run(
+        [sys.executable, "-X", "importtime", "util.py", command, "--help"],
+        cwd=CDK_DIR,
+        capture_output=True,
+        text=True,
+    )
+    wall_time = perf_counter() - start
+    if result.returncode:
+        raise RuntimeError(f"util.py {command} --help failed:\n{result.stderr}")
+    return wall_time, imported_modules(result.stderr)
+
+
+def benchmark(commands: list[str], repeats: int) -> dict:
+    results = {}
+    for command in commands:
+        runs = [run_command(command) for _ in range(repeats)]
+        modules = runs[-1][1]
+        results[command] = {
+            "wall_time": round(median(r[0] for r in runs), 4),
+            "modules": len(modules),
+            "jsii_modules": sorted(m for m in modules if m.split(".")[0] in JSII_MODULES),
+            "slowest_imports": dict(sorted(modules.items(), key=lambda m: -m[1])[:10]),
+        }
+    return {"python": sys.version.split()[0], "repeats": repeats, "results": results}
+
+
+def print_report(report: dict, verbose: bool):
+    print(f"{'command':<32}{'wall time (s)':>16}{'modules':>10}{'jsii':>6}")
+    for name, result in report["results"].items():
+        print(f"{name:<32}{result['wall_time']:>16.4f}{result['modules']:>10}{len(result['jsii_modules']) > 0!s:>6}")
+        if verbose:
+            for module, us in result["slowest_imports"].items():
+                print(f"    {module:<50}{us / 1e6:>8.4f}")
+
+
+def check(report: dict, baseline_path: str, time_tolerance: float) -> list[str]:
+    failures = [
+        f"{name}: imports {result['jsii_modules']}"
+        for name, result in report["results"].items()
+        if result["jsii_modules"]
+    ]
+
+    if baseline_path:
+        baseline = json.loads(Path(baseline_path).read_text())["results"]
+        for name, result in report["results"].items():
+            if name in baseline and result["wall_time"] > baseline[name]["wall_time"] * (1 + time_tolerance):
+                failures.append(f"{name}: wall time {result['wall_time']}s vs {baseline[name]['wall_time']}s")
+
+    return failures
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark util.py startup, and check its commands don't import jsii",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--commands",
+        help=f"Commands to benchmark, from {COMMANDS}",
+        type=lambda s: [x.strip() for x in s.split(",")],
+        default=COMMANDS,
+    )
+    parser.add_argument("--repeats", help="Runs per command; the median wall time is reported", default=5, type=int)
+    parser.add_argument("--output", help="Write the JSON report to this file", default=None)
+    parser.add_argument("--baseline", help="Fail if the report regresses against this JSON report", default=None)
+    parser.add_argument("--time-tolerance", help="Allowed wall time growth over baseline", default=0.5, type=float)
+    parser.add_argument("--verbose", help="Print each command's slowest imports", default=False, action="store_true")
+    args = parser.parse_args()
+
+    for c in args.commands:
+        if c not in COMMANDS:
+            parser.error(f"{c} not a valid command. Should be: {COMMANDS}")
+
+    return args
+
+
+def main():
+    args = parse_args()
+
+    report = benchmark(args.commands, args.repeats)
+    print_report(report, args.verbose)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=4))
+
+    if failures := check(report, args.baseline, args.time_tolerance):
+        print("\nFailures:")
+        print("\n".join(failures))
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import sys
+from functools import reduce
+from pathlib import Path
+from statistics import median
+from time import perf_counter
+
+from domino_cdk.util import DominoCdkUtil
+
+CHARTS = ["nucleus", "keycloak", "mongodb", "rabbitmq", "redis", "fluentd", "prometheus", "grafana"]
+
+
+def release_overrides(layer: int, charts: int, depth: int) -> dict:
+    """
+    One override file's worth of release_overrides, shaped like the dev defaults config_template builds:
+    a few charts, each with nested chart_values. Layers overlap on most keys and add a couple of their own.
+    """
+    overrides = {}
+    for c in range(charts):
+        chart_values = values = {}
+        for d in range(depth):
+            values["replicaCount"] = {"dispatcher": layer % 3, "frontend": 1}
+            values[f"layer{layer}"] = True
+            values = values.setdefault(f"level{d}", {})
+        overrides[f"{CHARTS[c % len(CHARTS)]}{c // len(CHARTS) or ''}"] = {"chart_values": chart_values}
+    return {"release_overrides": overrides}
+
+
+def reference_merge(*dictionaries) -> dict:
+    """Merges two dictionaries at a time, copying every level, as a baseline and to check results against"""
+
+    def merge(alpha: dict, omega: dict) -> dict:
+        return {
+            **alpha,
+            **{
+                k: merge(alpha[k], v) if isinstance(alpha.get(k), dict) and isinstance(v, dict) else v
+                for k, v in omega.items()
+            },
+        }
+
+    return reduce(merge, dictionaries, {})
+
+
+def time_merge(merge, layers: list[dict], repeats: int) -> float:
+    runs = []
+    for _ in range(repeats):
+        start = perf_counter()
+        merge(*layers)
+        runs.append(perf_counter() - start)
+    return round(median(runs), 6)
+
+
+def benchmark(layer_counts: list[int], charts: int, depth: int, repeats: int) -> dict:
+    results = {}
+    for count in layer_counts:
+        layers = [release_overrides(i, charts, depth) for i in range(count)]
+        if DominoCdkUtil.deep_merge(*layers) != reference_merge(*layers):
+            raise RuntimeError(f"deep_merge of {count} layers doesn't match the reference merge")
+        results[str(count)] = {
+            "deep_merge": time_merge(DominoCdkUtil.deep_merge, layers, repeats),
+            "reference": time_merge(reference_merge, layers, repeats),
+        }
+    return {
+        "python": sys.version.split()[0],
+        "charts": charts,
+        "depth": depth,
+        "repeats": repeats,
+        "results": results,
+    }
+
+
+def print_report(report: dict):
+    print(f"{'layers':<10}{'deep_merge (s)':>16}{'reference (s)':>16}{'speedup':>10}")
+    for count, result in report["results"].items():
+        speedup = result["reference"] / result["deep_merge"] if result["deep_merge"] else 0
+        print(f"{count:<10}{result['deep_merge']:>16.6f}{result['reference']:>16.6f}{speedup:>9.1f}x")
+
+
+def check(report: dict, baseline_path: str, time_tolerance: float) -> list[str]:
+    if not baseline_path:
+        return []
+    failures = []
+    baseline = json.loads(Path(baseline_path).read_text())["results"]
+    for count, result in report["results"].items():
+        if count in baseline and result["deep_merge"] > baseline[count]["deep_merge"] * (1 + time_tolerance):
+            failures.append(f"{count} layers: {result['deep_merge']}s vs {baseline[count]['deep_merge']}s")
+    return failures
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark DominoCdkUtil.deep_merge over many layered release_overrides",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--layers",
+        help="Comma separated numbers of override layers to merge",
+        type=lambda s: [int(x) for x in s.split(",")],
+        default=[10, 100, 1000, 5000],
+    )
+    parser.add_argument("--charts", help="Charts overridden in each layer", default=8, type=int)
+    parser.add_argument("--depth", help="Nesting depth of each chart's values", default=4, type=int)
+    parser.add_argument("--repeats", help="Runs per layer count; the median time is reported", default=5, type=int)
+    parser.add_argument("--output", help="Write the JSON report to this file", default=None)
+    parser.add_argument("--baseline", help="Fail if the report regresses against this JSON report", default=None)
+    parser.add_argument("--time-tolerance", help="Allowed merge time growth over baseline", default=0.5, type=float)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    report = benchmark(args.layers, args.charts, args.depth, args.repeats)
+    print_report(report)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=4))
+
+    if failures := check(report, args.baseline, args.time_tolerance):
+        print("\nFailures:")
+        print("\n".join(failures))
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import re
+import sys
+from dataclasses import fields
+from glob import glob
+from itertools import product
+from os import environ, makedirs, wait4, waitstatus_to_exitcode
+from os.path import basename, dirname, getsize, join
+from pathlib import Path
+from statistics import median
+from subprocess import Popen
+from tempfile import TemporaryDirectory
+from time import perf_counter, time
+
+from domino_cdk.config import EKS
+from domino_cdk.config.template import config_template
+from domino_cdk.lookups import DominoLookupCache
+from domino_cdk.util import DominoCdkUtil
+
+CDK_DIR = dirname(dirname(__file__))
+
+ACCOUNT = "123456789012"
+REGION = "us-west-2"
+# 1.24 and earlier also fetch the calico manifests (see DominoStack)
+EKS_VERSION = "1.25"
+
+# Canned answers to every lookup a synth makes, so it runs offline and the same everywhere
+LOOKUPS = {
+    "identity": {"Account": ACCOUNT, "Arn": f"arn:aws:iam::{ACCOUNT}:user/bench", "UserId": "bench"},
+    "availability_zones": [f"{REGION}{az}" for az in "abcd"],
+    f"addon_versions:{EKS_VERSION}": {
+        addon: {"addonVersions": [{"addonVersion": "v1.0.0-eksbuild.1", "compatibilities": [{"defaultVersion": True}]}]}
+        for addon in ["vpc-cni", "coredns", "kube-proxy"]
+    },
+}
+
+NODEGROUP_KINDS = ["unmanaged", "managed"]
+EXTRAS = ["off", "on"]
+
+template_suffix_re = re.compile(r"([0-9A-F]{8})?(\.nested)?\.template\.json$")
+
+
+def seed_lookups(cache_dir: str):
+    cache = DominoLookupCache(ACCOUNT, REGION, cache_dir=cache_dir)
+    cache.entries = {key: {"value": value, "fetched": int(time())} for key, value in LOOKUPS.items()}
+    cache.save()
+
+
+def scenario_name(nodegroups: int, azs: int, kind: str, extras: str) -> str:
+    return f"{kind}-ng{nodegroups}-az{azs}-extras_{extras}"
+
+
+def scenario_config(nodegroups: int, azs: int, kind: str, extras: str) -> dict:
+    """
+    config_template with nodegroups each of platform, compute and gpu groups spread over azs availability zones,
+    as managed or unmanaged groups, and with the bastion and VPC endpoints on or off
+    """
+    cfg = config_template(
+        aws_region=REGION,
+        aws_account_id=ACCOUNT,
+        platform_nodegroups=nodegroups,
+        compute_nodegroups=nodegroups,
+        gpu_nodegroups=nodegroups,
+        bastion=extras == "on",
+    )
+    cfg.vpc.endpoints = extras == "on"
+    cfg.eks.version = EKS_VERSION
+    cfg.eks.max_nodegroup_azs = azs
+
+    if kind == "managed":
+        base_fields = [f.name for f in fields(EKS.NodegroupBase)]
+        cfg.eks.managed_nodegroups = {
+            # Managed nodegroups can't scale to zero
+            name: EKS.ManagedNodegroup(
+                **{f: getattr(ng, f) for f in base_fields if f != "min_size"},
+                min_size=max(ng.min_size, 1),
+                desired_size=max(ng.min_size, 1),
+            )
+            for name, ng in cfg.eks.unmanaged_nodegroups.items()
+        }
+        cfg.eks.unmanaged_nodegroups = {}
+
+    return cfg.render(True)
+
+
+def stack_name(template_file: str) -> str:
+    """domino, dominoEksStack... from the template's file name, without the construct hash"""
+    return template_suffix_re.sub("", basename(template_file))
+
+
+def templates(outdir: str) -> dict:
+    stacks = {}
+    for fn in sorted(glob(join(outdir, "*.template.json"))):
+        with open(fn) as f:
+            template = json.loads(f.read())
+        stacks[stack_name(fn)] = {"bytes": getsize(fn), "resources": len(template.get("Resources", {}))}
+    return stacks
+
+
+def synth(config_file: str, outdir: str, lookup_cache: str, log_file: str) -> tuple[float, int]:
+    """
+    Synthesize config_file with app.py in a fresh process, returning its wall time and peak RSS (KiB). The RSS is
+    that of the largest process, python or the jsii runtime it waits for.
+    """
+    env = {
+        **environ,
+        "CDK_OUTDIR": outdir,
+        "CDK_CONTEXT_JSON": json.dumps({"config": config_file, "lookup_cache": lookup_cache, "offline": "true"}),
+        "JSII_SILENCE_WARNING_DEPRECATED_NODE_VERSION": "1",
+    }
+    makedirs(dirname(outdir), exist_ok=True)
+    start = perf_counter()
+    with open(log_file, "w") as log:
+        process = Popen(
+            # From the scenario's own directory, so no scenario reads the nodegroup stacks another recorded
+            [sys.executable, join(CDK_DIR, "app.py")],
+            cwd=dirname(outdir),
+            env=env,
+            stdout=log,
+            stderr=log,
+        )
+        # wait4 rather than wait, for the resource usage of this one child
+        _, status, usage = wait4(process.pid, 0)
+    wall_time = perf_counter() - start
+    if waitstatus_to_exitcode(status):
+        raise RuntimeError(f"synth of {config_file} failed:\n{Path(log_file).read_text()}")
+    return wall_time, usage.ru_maxrss
+
+
+def benchmark(nodegroups: list[int], azs: list[int], kinds: list[str], extras: list[str], repeats: int) -> dict:
+    results = {}
+    with TemporaryDirectory() as tmp:
+        lookup_cache = join(tmp, "cdk.lookups")
+        seed_lookups(lookup_cache)
+        DominoLookupCache.configure(cache_dir=lookup_cache, offline=True)
+
+        for scenario in product(nodegroups, azs, kinds, extras):
+            name = scenario_name(*scenario)
+            config_file = join(tmp, f"{name}.yaml")
+            with open(config_file, "w") as f:
+                DominoCdkUtil.yaml_dump(scenario_config(*scenario), f)
+
+            runs = []
+            for i in range(repeats):
+                outdir = join(tmp, name, f"cdk.out.{i}")
+                runs.append(synth(config_file, outdir, lookup_cache, join(tmp, f"{name}.{i}.log")))
+
+            stacks = templates(outdir)
+            results[name] = {
+                "wall_time": round(median(r[0] for r in runs), 3),
+                "peak_rss": max(r[1] for r in runs),
+                "resources": sum(s["resources"] for s in stacks.values()),
+                "template_bytes": sum(s["bytes"] for s in stacks.values()),
+                "stacks": stacks,
+            }
+            print(f"{name}: {results[name]['wall_time']}s", file=sys.stderr)
+
+    return {"python": sys.version.split()[0], "eks_version": EKS_VERSION, "repeats": repeats, "results": results}
+
+
+def print_report(report: dict, verbose: bool):
+    print(f"{'scenario':<40}{'wall time (s)':>14}{'peak RSS (MiB)':>16}{'resources':>11}{'bytes':>10}")
+    for name, result in report["results"].items():
+        print(
+            f"{name:<40}{result['wall_time']:>14.3f}{result['peak_rss'] / 1024:>16.1f}"
+            f"{result['resources']:>11}{result['template_bytes']:>10}"
+        )
+        if verbose:
+            for stack, s in result["stacks"].items():
+                print(f"    {stack:<66}{s['resources']:>11}{s['bytes']:>10}")
+
+
+def check(
+    report: dict, baseline_path: str, time_tolerance: float, memory_tolerance: float, size_tolerance: float
+) -> list[str]:
+    """
+    Any nested stack gaining resources fails outright, so the baseline gets updated along with changes that are
+    meant to add them. Wall time, peak RSS (which vary by machine) and template size are allowed some growth.
+    """
+    if not baseline_path:
+        return []
+    failures = []
+    baseline = json.loads(Path(baseline_path).read_text())["results"]
+    for name, result in report["results"].items():
+        if name not in baseline:
+            continue
+        expected = baseline[name]
+        if result["wall_time"] > expected["wall_time"] * (1 + time_tolerance):
+            failures.append(f"{name}: wall time {result['wall_time']}s vs {expected['wall_time']}s")
+        if result["peak_rss"] > expected["peak_rss"] * (1 + memory_tolerance):
+            failures.append(f"{name}: peak RSS {result['peak_rss']}KiB vs {expected['peak_rss']}KiB")
+        for stack, got in result["stacks"].items():
+            if not (want := expected["stacks"].get(stack)):
+                continue
+            if got["resources"] > want["resources"]:
+                failures.append(f"{name}: {stack} has {got['resources']} resources vs {want['resources']}")
+            if got["bytes"] > want["bytes"] * (1 + size_tolerance):
+                failures.append(f"{name}: {stack} template is {got['bytes']} bytes vs {want['bytes']}")
+    return failures
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark synthesizing deployments as their nodegroups and availability zones scale",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+
+    def int_list(s):
+        return [int(x) for x in s.split(",")]
+
+    def choice_list(choices):
+        def parse(s):
+            values = [x.strip() for x in s.split(",")]
+            if bad := [v for v in values if v not in choices]:
+                raise argparse.ArgumentTypeError(f"{bad} not in {choices}")
+            return values
+
+        return parse
+
+    parser.add_argument(
+        "--nodegroups", help="Platform, compute and gpu nodegroups of each", type=int_list, default=[1, 3, 6]
+    )
+    parser.add_argument("--azs", help="max_nodegroup_azs", type=int_list, default=[1, 3])
+    parser.add_argument(
+        "--kinds",
+        help=f"Nodegroup kinds, from {NODEGROUP_KINDS}",
+        type=choice_list(NODEGROUP_KINDS),
+        default=["unmanaged", "managed"],
+    )
+    parser.add_argument(
+        "--extras", help=f"Bastion and VPC endpoints, from {EXTRAS}", type=choice_list(EXTRAS), default=EXTRAS
+    )
+    parser.add_argument("--repeats", help="Synths per scenario; the median wall time is reported", default=1, type=int)
+    parser.add_argument("--output", help="Write the JSON report to this file", default=None)
+    parser.add_argument("--baseline", help="Fail if the report regresses against this JSON report", default=None)
+    parser.add_argument("--time-tolerance", help="Allowed wall time growth over baseline", default=0.5, type=float)
+    parser.add_argument("--memory-tolerance", help="Allowed peak RSS growth over baseline", default=0.2, type=float)
+    parser.add_argument("--size-tolerance", help="Allowed template size growth over baseline", default=0.1, type=float)
+    parser.add_argument("--verbose", help="Print each nested stack's templates", default=False, action="store_true")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    report = benchmark(args.nodegroups, args.azs, args.kinds, args.extras, args.repeats)
+    print_report(report, args.verbose)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=4))
+
+    if failures := check(report, args.baseline, args.time_tolerance, args.memory_tolerance, args.size_tolerance):
+        print("\nFailures:")
+        print("\n".join(failures))
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,22 +2,15 @@ from io import StringIO
 from os.path import isfile
 from pathlib import Path
 from re import sub
+from typing import Optional
 
 import aws_cdk.aws_eks as eks
+from aws_cdk import Stack
 from constructs import Construct
-from requests import get as requests_get
 from ruamel.yaml import YAML
 
-manifests = [
-    (
-        "calico-operator",
-        "https://raw.githubusercontent.com/aws/amazon-vpc-cni-k8s/v1.11.0/config/master/calico-operator.yaml",
-    ),
-    (
-        "calico-crs",
-        "https://raw.githubusercontent.com/aws/amazon-vpc-cni-k8s/v1.11.0/config/master/calico-crs.yaml",
-    ),
-]
+from domino_cdk.lookups import DominoLookupCache
+from domino_cdk.lookups import calico_manifests as manifests
 
 
 # Currently this just installs calico directly via manifest, but will
@@ -25,9 +18,10 @@ manifests = [
 # deprovisoning efs backups/route53, tagging the eks cluster until
 # the CloudFormation api supports it, etc.)
 class DominoAwsConfigurator:
-    def __init__(self, scope: Construct, eks_cluster: eks.Cluster):
+    def __init__(self, scope: Construct, eks_cluster: eks.Cluster, lookups: Optional[DominoLookupCache] = None):
         self.scope = scope
         self.eks_cluster = eks_cluster
+        self.lookups = lookups or DominoLookupCache.for_env(Stack.of(scope).account, Stack.of(scope).region)
 
         self.install_calico()
 
@@ -50,7 +44,7 @@ class DominoAwsConfigurator:
                 stream = Path(filename)
             else:
                 # Something downstream will make this substitution anyway, cause fake diffs
-                stream = StringIO(sub(r'[“”]', '?', requests_get(url).text))
+                stream = StringIO(sub(r'[“”]', '?', self.lookups.manifest(url)))
 
             yaml = YAML(typ="safe")
             loaded_manifests = list(yaml.load_all(stream))
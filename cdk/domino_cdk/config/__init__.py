@@ -1,3 +1,4 @@
+from copy import deepcopy
 from typing import Optional
 
 from semantic_version import Version
@@ -19,3 +20,38 @@ def config_loader(c: dict):
     if not loader:
         raise ValueError(f"Unsupported schema version: {schema}")
     return loader(c)
+
+
+def lookup_requirements(c: dict) -> dict:
+    """
+    What the lookups for synthesizing a raw config depend on, as DominoLookupCache.prefetch's arguments. Read from the
+    raw config so they can be prefetched before loading it, which makes lookups of its own. Anything malformed is left
+    to the loader to report.
+    """
+    eks = c.get("eks") or {}
+    eks_version = eks.get("version")
+
+    instance_requirements = []
+    for ng in (eks.get("managed_nodegroups") or {}).values():
+        if not isinstance(ng, dict) or not ng.get("instance_requirements"):
+            continue
+        try:
+            request = EKS.NodegroupBase.InstanceRequirements.load(deepcopy(ng["instance_requirements"])).request()
+        except (AttributeError, KeyError, TypeError):
+            continue
+        instance_requirements.append((request, ng.get("ami_id") or (ng.get("machine_image") or {}).get("ami_id")))
+
+    # The instance types whose EBS limits loading the config checks disk performance against
+    ebs_instance_types = []
+    for ngs in [eks.get("managed_nodegroups"), eks.get("unmanaged_nodegroups")]:
+        for ng in (ngs or {}).values():
+            if not isinstance(ng, dict) or not (ng.get("disk_iops") or ng.get("disk_throughput")):
+                continue
+            if isinstance(ng.get("instance_types"), list):
+                ebs_instance_types += [it for it in ng["instance_types"] if isinstance(it, str)]
+
+    return {
+        "eks_version": eks_version if isinstance(eks_version, str) else None,
+        "instance_requirements": instance_requirements,
+        "ebs_instance_types": ebs_instance_types,
+    }
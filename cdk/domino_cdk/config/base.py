@@ -1,8 +1,8 @@
-from dataclasses import dataclass, fields, is_dataclass
+from dataclasses import dataclass, is_dataclass
 from textwrap import dedent
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 
-import boto3
+from botocore.exceptions import ClientError
 from field_properties import field_property, unwrap_property
 from ruamel.yaml.comments import CommentedMap
 
@@ -13,7 +13,9 @@ from domino_cdk.config.eks import EKS
 from domino_cdk.config.route53 import Route53
 from domino_cdk.config.s3 import S3
 from domino_cdk.config.util import from_loader
+from domino_cdk.config.validation import validate
 from domino_cdk.config.vpc import VPC
+from domino_cdk.lookups import DominoLookupCache, OfflineLookupError
 
 
 @dataclass
@@ -143,46 +145,56 @@ class DominoCDKConfig:
         return DominoCDKConfig.from_0_0_1(c)
 
     def get_vpc_azs(self):
-        ec2 = boto3.client("ec2", region_name=self.aws_region)
-        return [az["ZoneName"] for az in ec2.describe_availability_zones()["AvailabilityZones"]][: self.vpc.max_azs]
+        return DominoLookupCache.for_env(self.aws_account_id, self.aws_region).availability_zones()[: self.vpc.max_azs]
 
-    def __post_init__(self):  # noqa: C901
+    def disk_performance_errors(self) -> List[str]:
+        """Nodegroups whose provisioned disk IOPS or throughput is more than their instance types can drive"""
         errors = []
-
-        def val(path: str, obj):
-            for f in fields(obj):
-                value = getattr(obj, f.name)
-                if is_dataclass(value):
-                    val(f"{path}.{f.name}", value)
-                elif not value:
+        lookups = DominoLookupCache.for_env(self.aws_account_id, self.aws_region)
+        for ngs in [self.eks.managed_nodegroups, self.eks.unmanaged_nodegroups]:
+            for ng, cfg in ngs.items():
+                if not (cfg.disk_iops or cfg.disk_throughput):
                     continue
-                # TODO: Actually do the full check (ie List[str], etc.)
-                elif getattr(f.type, "_name", None) == "List":
-                    if type(value) is not list:
+                for instance_type in cfg.instance_types:
+                    try:
+                        limits = lookups.ebs_limits(instance_type)
+                    except OfflineLookupError:
+                        # Like the availability zones, there's nothing to check against offline without a cache
+                        continue
+                    except ClientError as e:
+                        # ie InvalidInstanceType for a typo or a type the region doesn't offer
+                        errors.append(f"Nodegroup {ng} instance type {instance_type} couldn't be looked up: {e}")
+                        continue
+                    if limits is None:
+                        errors.append(f"Nodegroup {ng} instance type {instance_type} isn't EBS optimized")
+                        continue
+                    if cfg.disk_iops and cfg.disk_iops > limits["MaximumIops"]:
                         errors.append(
-                            f"{path}.{f.name} type ({f.type}) does not match value: [{value}] ({type(value)})"
+                            f"Nodegroup {ng} disk_iops of {cfg.disk_iops} is more than instance type "
+                            f"{instance_type} supports ({limits['MaximumIops']})"
                         )
-                    else:
-                        [val(f"{path}.{f.name}.[{i}]", x) for i, x in enumerate(value) if is_dataclass(x)]
-                elif getattr(f.type, "_name", None) == "Dict":
-                    if type(value) not in [dict, CommentedMap]:
+                    # disk_throughput is in MiB/s, and EC2 gives instance limits in MB/s
+                    if cfg.disk_throughput and cfg.disk_throughput * 1.048576 > limits["MaximumThroughputInMBps"]:
                         errors.append(
-                            f"{path}.{f.name} type ({f.type}) does not match value: [{value}] ({type(value)})"
+                            f"Nodegroup {ng} disk_throughput of {cfg.disk_throughput} MiB/s is more than instance type "
+                            f"{instance_type} supports ({limits['MaximumThroughputInMBps']} MB/s)"
                         )
-                    else:
-                        [val(f"{path}.{f.name}.{k}", v) for k, v in value.items() if is_dataclass(v)]
-                elif value and f.type != type(value):
-                    errors.append(f"{path}.{f.name} type ({f.type}) does not match value: [{value}] ({type(value)})")
+        return errors
 
-        val("config", self)
+    def __post_init__(self):  # noqa: C901
+        errors = validate(self, "config")
 
         # Don't run these checks if we're just loading a template
         if self.aws_region != "__FILL__":
-            vpc_azs = self.get_vpc_azs()
+            try:
+                vpc_azs = self.get_vpc_azs()
+            except OfflineLookupError:
+                # Offline without cached availability zones (ie util.py config_diff), there's nothing to check against
+                vpc_azs = None
 
             for ngs in [self.eks.managed_nodegroups, self.eks.unmanaged_nodegroups]:
                 for ng, cfg in ngs.items():
-                    if not cfg.availability_zones:
+                    if not cfg.availability_zones or vpc_azs is None:
                         continue
                     bad_azs = [az for az in cfg.availability_zones if az not in vpc_azs]
                     if bad_azs:
@@ -190,6 +202,8 @@ class DominoCDKConfig:
                             f"Nodegroup {ng} availability zones {bad_azs} don't exist in vpc.max_azs's resulting availability zones {vpc_azs}"
                         )
 
+            errors += self.disk_performance_errors()
+
         if errors:
             raise ValueError("\n".join(errors))
 
@@ -198,24 +212,25 @@ class DominoCDKConfig:
             indent += 2
             if is_dataclass(c):
                 hidden = getattr(c, "_hidden", [])
-                cm = CommentedMap(
-                    {
-                        (x if x != "_tags" else "tags"): r_vars(y, indent)
-                        for x, y in vars(c).items()
-                        if x not in hidden or y
-                    }
-                )
-                if not disable_comments:
-                    [
-                        cm.yaml_set_comment_before_after_key(k, after=dedent(v.__doc__).strip(), after_indent=indent)
-                        for k, v in vars(c).items()
-                        if is_dataclass(v) and getattr(v, "__doc__") and not getattr(v, "_no_doc", False)
-                    ]
+                d = {
+                    (x if x != "_tags" else "tags"): r_vars(y, indent)
+                    for x, y in vars(c).items()
+                    if x not in hidden or y
+                }
+                if disable_comments:
+                    return d
+                cm = CommentedMap(d)
+                [
+                    cm.yaml_set_comment_before_after_key(k, after=dedent(v.__doc__).strip(), after_indent=indent)
+                    for k, v in vars(c).items()
+                    if is_dataclass(v) and getattr(v, "__doc__") and not getattr(v, "_no_doc", False)
+                ]
                 return cm
             elif type(c) == list:
                 return [r_vars(x, indent) for x in c]
             elif type(c) == dict:
-                return CommentedMap({x: r_vars(y, indent) for x, y in c.items()})
+                d = {x: r_vars(y, indent) for x, y in c.items()}
+                return d if disable_comments else CommentedMap(d)
             else:
                 return c
 
@@ -0,0 +1,185 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+from domino_cdk.config.base import DominoCDKConfig
+
+# Where each top-level construct of DominoStack lands. The root stack also gets the cdk_config output, the full
+# rendered config, so any change at all updates it.
+root_stack = "root"
+all_stacks = [root_stack, "S3Stack", "VpcStack", "EksStack", "EfsStack", "AcmStack"]
+
+managed_nodegroup = ["launch template LaunchTemplate{0}", "EKS nodegroups {name}-{0}-<az>"]
+unmanaged_nodegroup = [
+    "launch template UnmanagedNodeGroup{0}/LaunchTemplate0",
+    "auto scaling groups UnmanagedNodeGroup{0}/{name}-{0}-<i>",
+]
+warm_pool = [
+    "warm pools UnmanagedNodeGroup{0}/{name}-{0}-<i>/WarmPool",
+    "lifecycle hooks UnmanagedNodeGroup{0}/{name}-{0}-<i>/WarmPoolHook",
+]
+
+# (config path, {stack: [resources]}) for what each part of the config feeds. "*" matches any key, and {0}, {1}...
+# in resources are the keys it matched ({name} is the deploy name). A change maps to its path's longest matching
+# rule, so the whole-section rules also cover sections added or removed outright. Between rules of the same length
+# the first wins, so specific keys go before wildcards.
+impact_rules: List[Tuple[str, Dict[str, List[str]]]] = [
+    ("name", {s: ["every resource name"] for s in all_stacks}),
+    ("aws_region", {s: ["deployment environment"] for s in all_stacks}),
+    ("aws_account_id", {s: ["deployment environment"] for s in all_stacks}),
+    (
+        "tags",
+        {
+            **{s: ["tags on every resource"] for s in all_stacks},
+            root_stack: ["tags on every resource", "fix_missing_tags lambda"],
+            "EksStack": ["tags on every resource", "cluster_post_creation_tasks lambda"],
+        },
+    ),
+    (
+        "create_iam_roles_for_service_accounts",
+        {root_stack: ["IAM roles for service accounts"], "EksStack": ["node S3 IAM policy"]},
+    ),
+    ("vpc", {"VpcStack": ["VPC", "subnets", "NAT gateways", "pod subnets"], "EksStack": ["cluster", "nodegroups"]}),
+    ("vpc.flow_logging", {"VpcStack": ["rejectFlowLogs flow log"]}),
+    ("vpc.endpoints", {"VpcStack": ["S3 gateway endpoint", "interface endpoints"]}),
+    ("vpc.max_azs", {"VpcStack": ["subnets", "NAT gateways", "pod subnets"], "EksStack": ["nodegroups"]}),
+    # Only checked against nodegroup availability zones when loading, nothing is built from it
+    ("vpc.availability_zones", {}),
+    ("vpc.bastion", {"VpcStack": ["bastion instance", "bastion_eip"]}),
+    ("vpc.bastion.ingress_ports", {"VpcStack": ["bastion_sg ingress rules"]}),
+    (
+        "vpc.bastion.enabled",
+        {
+            "VpcStack": ["bastion instance", "bastion_sg", "bastion_eip"],
+            "EksStack": ["cluster security group bastion ingress", "UnmanagedSG bastion ingress"],
+            root_stack: ["bastion_public_ip output"],
+        },
+    ),
+    ("efs", {"EfsStack": ["Efs file system", "access point", "backup vault, plan and selection"]}),
+    ("efs.removal_policy_destroy", {"EfsStack": ["Efs file system"]}),
+    # Changing the performance mode replaces the filesystem
+    ("efs.performance_mode", {"EfsStack": ["Efs file system", "access point", "backup selection"]}),
+    ("efs.throughput_mode", {"EfsStack": ["Efs file system"]}),
+    ("efs.provisioned_throughput_mibps", {"EfsStack": ["Efs file system"]}),
+    ("efs.transition_to_ia", {"EfsStack": ["Efs file system"]}),
+    ("efs.transition_to_primary_storage_class", {"EfsStack": ["Efs file system"]}),
+    ("efs.replication_overwrite_protection", {"EfsStack": ["Efs file system"]}),
+    ("efs.backup", {"EfsStack": ["efs_backup_plan"]}),
+    (
+        "efs.backup.enable",
+        {"EfsStack": ["backup vault, plan, selection and role", "backup_post_creation_tasks lambda"]},
+    ),
+    ("efs.backup.removal_policy", {"EfsStack": ["efs_backup vault"]}),
+    ("route53", {"EksStack": ["route53 IAM policy"], root_stack: ["route53 outputs"]}),
+    ("eks", {"EksStack": ["cluster", "nodegroups"]}),
+    (
+        "eks.version",
+        {"EksStack": ["cluster", "kubectl_layer", "addons", "unmanaged nodegroup AMIs", "calico manifests"]},
+    ),
+    ("eks.private_api", {"EksStack": ["cluster endpoint access"]}),
+    ("eks.secrets_encryption_key_arn", {"EksStack": ["secrets envelope key", "cluster"]}),
+    ("eks.share_launch_templates", {"EksStack": ["launch templates", "EKS nodegroups", "auto scaling groups"]}),
+    ("eks.max_nodegroup_azs", {"EksStack": ["EKS nodegroups", "auto scaling groups"]}),
+    ("eks.global_node_labels", {"EksStack": ["launch templates", "EKS nodegroups", "auto scaling groups"]}),
+    ("eks.global_node_tags", {"EksStack": ["EKS nodegroups", "auto scaling groups"]}),
+    ("eks.managed_nodegroups.*", {"EksStack": managed_nodegroup}),
+    ("eks.managed_nodegroups.*.instance_types", {"EksStack": managed_nodegroup[1:]}),
+    ("eks.managed_nodegroups.*.min_size", {"EksStack": managed_nodegroup[1:]}),
+    ("eks.managed_nodegroups.*.max_size", {"EksStack": managed_nodegroup[1:]}),
+    ("eks.managed_nodegroups.*.desired_size", {"EksStack": managed_nodegroup[1:]}),
+    ("eks.managed_nodegroups.*.labels", {"EksStack": managed_nodegroup[1:]}),
+    ("eks.managed_nodegroups.*.tags", {"EksStack": managed_nodegroup[1:]}),
+    ("eks.managed_nodegroups.*.spot", {"EksStack": managed_nodegroup[1:]}),
+    ("eks.managed_nodegroups.*.availability_zones", {"EksStack": managed_nodegroup[1:]}),
+    ("eks.managed_nodegroups.*.instance_requirements", {"EksStack": managed_nodegroup[1:]}),
+    ("eks.unmanaged_nodegroups.*", {"EksStack": unmanaged_nodegroup}),
+    ("eks.unmanaged_nodegroups.*.min_size", {"EksStack": unmanaged_nodegroup[1:]}),
+    ("eks.unmanaged_nodegroups.*.max_size", {"EksStack": unmanaged_nodegroup[1:]}),
+    ("eks.unmanaged_nodegroups.*.tags", {"EksStack": unmanaged_nodegroup[1:]}),
+    ("eks.unmanaged_nodegroups.*.spot", {"EksStack": unmanaged_nodegroup[1:]}),
+    ("eks.unmanaged_nodegroups.*.availability_zones", {"EksStack": unmanaged_nodegroup[1:]}),
+    ("eks.unmanaged_nodegroups.*.on_demand_allocation_strategy", {"EksStack": unmanaged_nodegroup[1:]}),
+    ("eks.unmanaged_nodegroups.*.spot_allocation_strategy", {"EksStack": unmanaged_nodegroup[1:]}),
+    ("eks.unmanaged_nodegroups.*.capacity_rebalance", {"EksStack": unmanaged_nodegroup[1:]}),
+    (
+        "eks.unmanaged_nodegroups.*.warm_pool",
+        {"EksStack": [*unmanaged_nodegroup, *warm_pool, "WarmPoolPolicy IAM policy"]},
+    ),
+    ("eks.unmanaged_nodegroups.*.warm_pool.min_size", {"EksStack": warm_pool[:1]}),
+    ("eks.unmanaged_nodegroups.*.warm_pool.max_prepared_capacity", {"EksStack": warm_pool[:1]}),
+    ("eks.unmanaged_nodegroups.*.warm_pool.reuse_on_scale_in", {"EksStack": warm_pool[:1]}),
+    ("eks.unmanaged_nodegroups.*.warm_pool.pool_state", {"EksStack": [unmanaged_nodegroup[0], warm_pool[0]]}),
+    ("s3", {"S3Stack": ["buckets"], "EksStack": ["node S3 IAM policy"], "VpcStack": ["rejectFlowLogs flow log"]}),
+    (
+        "s3.buckets.monitoring",
+        {
+            "S3Stack": ["bucket monitoring"],
+            "VpcStack": ["rejectFlowLogs flow log"],
+            root_stack: ["monitoring-bucket-output"],
+        },
+    ),
+    (
+        "s3.buckets.*",
+        {"S3Stack": ["bucket {0}"], "EksStack": ["node S3 IAM policy"], root_stack: ["{0}-bucket-output"]},
+    ),
+    ("s3.buckets.*.auto_delete_objects", {"S3Stack": ["bucket {0}"]}),
+    ("s3.buckets.*.removal_policy_destroy", {"S3Stack": ["bucket {0}"]}),
+    ("s3.buckets.*.sse_kms_key_id", {"S3Stack": ["bucket {0}", "bucket {0} policy", "{0}-kms-key"]}),
+    ("acm", {"AcmStack": ["certificates"]}),
+]
+
+compiled_rules = [(tuple(pattern.split(".")), impact) for pattern, impact in impact_rules]
+
+
+@dataclass
+class ConfigChange:
+    path: Tuple[str, ...]
+    old: Any
+    new: Any
+    # {stack: [resources]} the change feeds into
+    impact: Dict[str, List[str]] = field(default_factory=dict)
+
+    @property
+    def name(self) -> str:
+        return ".".join(self.path)
+
+
+def rendered_changes(old: Any, new: Any, path: Tuple[str, ...] = ()) -> List[ConfigChange]:
+    """Changes between two rendered configs, down to the values that differ. Lists are compared whole."""
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = []
+        for k in {**old, **new}:
+            changes += rendered_changes(old.get(k), new.get(k), (*path, str(k)))
+        return changes
+    return [] if old == new else [ConfigChange(path, old, new)]
+
+
+def impact_of(path: Tuple[str, ...], name: str) -> Dict[str, List[str]]:
+    best: Tuple[int, Dict[str, List[str]]] = (-1, {})
+    for pattern, impact in compiled_rules:
+        if len(pattern) > len(path) or len(pattern) <= best[0]:
+            continue
+        if all(p in ["*", x] for p, x in zip(pattern, path)):
+            keys = [x for p, x in zip(pattern, path) if p == "*"]
+            best = (
+                len(pattern),
+                {stack: [r.format(*keys, name=name) for r in resources] for stack, resources in impact.items()},
+            )
+    return best[1]
+
+
+def config_diff(old: DominoCDKConfig, new: DominoCDKConfig) -> List[ConfigChange]:
+    """
+    What changes between two configs, with the stacks and resources each change feeds. Configs are compared
+    as loaded, so different schema versions of the same deployment compare equal.
+    """
+    changes = rendered_changes(old.render(True), new.render(True))
+    for change in changes:
+        change.impact = impact_of(change.path, new.name)
+    return changes
+
+
+def affected_stacks(changes: List[ConfigChange]) -> List[str]:
+    if not changes:
+        return []
+    stacks = {root_stack, *[stack for c in changes for stack in c.impact]}
+    return [s for s in all_stacks if s in stacks]
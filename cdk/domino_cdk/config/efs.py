@@ -3,11 +3,26 @@ from typing import Optional
 
 from domino_cdk.config.util import from_loader
 
+performance_modes = ["general_purpose", "max_io"]
+throughput_modes = ["bursting", "elastic", "provisioned"]
+# Days EFS lifecycle policies can move files to infrequent access after
+transition_to_ia_days = [1, 7, 14, 30, 60, 90]
+
 
 @dataclass
 class EFS:
     """
     removal_policy_destroy: true/false - Destroy EFS filesystem when destroying CloudFormation stack
+    performance_mode: general_purpose/max_io - max_io scales to more clients at higher latency, and can't
+                      be used with elastic throughput. Can't be changed after creation.
+    throughput_mode: bursting/elastic/provisioned - bursting throughput scales with the size stored and runs
+                     out of credits under sustained load. elastic scales with load and is billed by use.
+    provisioned_throughput_mibps: 128 - Throughput in MiB/s, for the provisioned throughput_mode only
+    transition_to_ia: 30 - Days since last access before files move to infrequent access storage,
+                      one of 1, 7, 14, 30, 60 or 90 (null to disable)
+    transition_to_primary_storage_class: true/false - Move files back out of infrequent access when accessed
+    replication_overwrite_protection: true/false - Keep the filesystem from being the destination of EFS
+                                      replication, which would overwrite it. Turn off to restore into it.
     """
 
     @dataclass
@@ -29,6 +44,32 @@ class EFS:
 
     backup: Backup
     removal_policy_destroy: bool
+    performance_mode: str
+    throughput_mode: str
+    provisioned_throughput_mibps: Optional[int]
+    transition_to_ia: Optional[int]
+    transition_to_primary_storage_class: bool
+    replication_overwrite_protection: bool
+
+    def __post_init__(self):
+        errors = []
+
+        if self.performance_mode not in performance_modes:
+            errors.append(f"Error: efs performance_mode must be one of {performance_modes}")
+        if self.throughput_mode not in throughput_modes:
+            errors.append(f"Error: efs throughput_mode must be one of {throughput_modes}")
+        if self.performance_mode == "max_io" and self.throughput_mode == "elastic":
+            errors.append("Error: efs elastic throughput_mode requires the general_purpose performance_mode")
+        if (self.throughput_mode == "provisioned") != bool(self.provisioned_throughput_mibps):
+            errors.append(
+                "Error: efs provisioned_throughput_mibps must be set (above 0) with the provisioned throughput_mode, "
+                "and only then"
+            )
+        if self.transition_to_ia is not None and self.transition_to_ia not in transition_to_ia_days:
+            errors.append(f"Error: efs transition_to_ia must be one of {transition_to_ia_days} days, or null")
+
+        if errors:
+            raise ValueError(errors)
 
     @staticmethod
     def from_0_0_0(c: dict) -> Optional['EFS']:
@@ -44,6 +85,13 @@ class EFS:
                     removal_policy=backup.pop("removal_policy", None),
                 ),
                 removal_policy_destroy=c.pop("removal_policy_destroy", None),
+                # Existing filesystems keep what they were created with
+                performance_mode=c.pop("performance_mode", "general_purpose"),
+                throughput_mode=c.pop("throughput_mode", "bursting"),
+                provisioned_throughput_mibps=c.pop("provisioned_throughput_mibps", None),
+                transition_to_ia=c.pop("transition_to_ia", None),
+                transition_to_primary_storage_class=c.pop("transition_to_primary_storage_class", False),
+                replication_overwrite_protection=c.pop("replication_overwrite_protection", True),
             ),
             c,
         )
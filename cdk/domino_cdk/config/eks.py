@@ -1,8 +1,24 @@
 from dataclasses import dataclass
-from typing import Dict, List, TypeVar
+from typing import Dict, List, Optional, TypeVar
 
 from domino_cdk.config.util import check_leavins, from_loader
 
+on_demand_allocation_strategies = ["prioritized", "lowest-price"]
+spot_allocation_strategies = [
+    "capacity-optimized-prioritized",
+    "capacity-optimized",
+    "price-capacity-optimized",
+    "lowest-price",
+]
+# Strategies that go by the order of instance types, which attribute-based selection doesn't have
+prioritized_allocation_strategies = ["prioritized", "capacity-optimized-prioritized"]
+
+# EBS limits of each root volume type: IOPS, IOPS per GiB, and throughput in MiB/s (None when it isn't configurable)
+disk_types = {
+    "gp3": {"iops": (3000, 16000), "iops_per_gib": 500, "throughput": (125, 1000)},
+    "io2": {"iops": (100, 256000), "iops_per_gib": 1000, "throughput": None},
+}
+
 
 @dataclass
 class EKS:
@@ -14,6 +30,9 @@ class EKS:
     global_node_labels: some-label: "true"  - Labels to apply to all kubernetes nodes
     global_node_tags: some-tags: "true"  - Labels to apply to all kubernetes nodes
     secrets_encryption_key_arn: ARN  - KMS key arn to encrypt kubernetes secrets. A new key will be created if omitted.
+    share_launch_templates: true/false - Nodegroups whose launch templates would be identical share one. Turning this on
+                                         for an existing deployment moves nodegroups onto another template, which
+                                         rolls (or for managed nodegroups, may replace) their nodes.
     """
 
     @dataclass
@@ -27,6 +46,10 @@ class EKS:
         """
         Nodegroup Configuration:
         disk_size: 1000 - Size in GB for disk on nodes in nodegroup
+        disk_type: gp3/io2 - Volume type of the disk
+        disk_iops: 3000 - Provisioned IOPS of the disk. gp3 defaults to 3000 (null), io2 needs it set.
+                          Up to 500 per GB of disk_size, and what the instance types support.
+        disk_throughput: 125 - Throughput of gp3 disks in MiB/s, up to a quarter of disk_iops (null for 125)
         key_name: some-key-pair - Pre-existing AWS key pair to configure for instances in the nodegorup
         min_size: 1 - Minimum node count for nodegroup. Can't be 0 on managed nodegroups.
         max_size: 10 - Maximum limit for node count in node gorup
@@ -46,6 +69,25 @@ class EKS:
         labels: some-label: "true" - Labels to apply to all nodes in nodegroup
         tags: some-tag: "true" - Tags to apply to all nodes in nodegroup
         ssm_agent: true/false - Install SSM agent (ie for console access via aws web ui)
+        instance_requirements: Pick instance types by attributes instead of listing them in instance_types,
+                               so nodes can launch as whichever matching type has capacity. null for none.
+          vcpu_count: {min: 8, max: 16} - vCPUs. max is optional, as for the other ranges.
+          memory_mib: {min: 32768, max: 65536} - Memory in MiB
+          accelerator_count: {min: 1, max: 1} - GPUs. {max: 0} excludes GPU instances. [Optional]
+          instance_generations: [current] - current and/or previous. [Optional]
+          Managed nodegroups get the first 20 matching types, smallest first, recorded in cdk.context.json.
+        on_demand_allocation_strategy: prioritized/lowest-price - How unmanaged nodegroups pick among their
+                                       instance types for on-demand nodes. prioritized (the default without
+                                       instance_requirements) goes in instance_types order.
+        spot_allocation_strategy: capacity-optimized/price-capacity-optimized/... - How unmanaged nodegroups
+                                  pick spot pools. Defaults to capacity-optimized-prioritized, or
+                                  price-capacity-optimized with instance_requirements.
+        capacity_rebalance: true/false - Replace spot nodes proactively when they're at elevated risk of
+                            interruption. EKS always does this for managed spot nodegroups.
+        stack: 1 - Nested stack for the nodegroup: 0 for the EKS stack, n for NodegroupStack<n>. null places
+                   it by estimated size on its first synth, which is then kept in cdk.context.json.
+                   Left out, as in configs from before nested stacks, it's 0. Changing it replaces the
+                   nodegroup.
         ...
         Managed nodegroup-specific options:
         spot: true/false - Use spot instances, may affect reliability/availability of nodegroup
@@ -55,8 +97,65 @@ class EKS:
         gpu: true/false - Setup GPU instance support
         taints: some-taint: "true" - Taints to apply to all nodes in nodegroup
                                      ie to taint gpu nodes, etc.)
+        warm_pool: Keep pre-initialized nodes (AMI booted, images pulled by user_data, etc.) stopped
+                   next to the nodegroup, so scaling out only has to start them and join the cluster.
+                   null for none. Needs a single instance type and no spot.
+          min_size: 0 - Nodes to keep in the pool, even while the nodegroup is at max_size
+          max_prepared_capacity: 10 - Cap on nodegroup plus pool nodes. null uses the nodegroup's max_size
+          pool_state: stopped/hibernated - Hibernated nodes also keep their memory. Needs instance types
+                      that support hibernation, and a disk_size larger than their memory.
+          reuse_on_scale_in: true/false - Return nodes to the pool on scale in, rather than terminating them
+          With a custom AMI, the user_data script must complete the "domino-warm-pool" launch lifecycle
+          hook itself, or new nodes wait out its timeout before going into service.
         """
 
+        @dataclass
+        class InstanceRequirements:
+            vcpu_count: Dict[str, int]
+            memory_mib: Dict[str, int]
+            accelerator_count: Optional[Dict[str, int]]
+            instance_generations: Optional[List[str]]
+            _no_doc = True
+
+            @classmethod
+            def load(cls, ir):
+                if ir is None:
+                    return None
+                out = cls(
+                    vcpu_count=ir.pop("vcpu_count"),
+                    memory_mib=ir.pop("memory_mib"),
+                    accelerator_count=ir.pop("accelerator_count", None),
+                    instance_generations=ir.pop("instance_generations", None),
+                )
+                check_leavins("instance requirement", "config.eks.nodegroups.instance_requirements", ir)
+                return out
+
+            def ranges(self) -> Dict[str, Dict[str, int]]:
+                return {
+                    k: v
+                    for k, v in {
+                        "vcpu_count": self.vcpu_count,
+                        "memory_mib": self.memory_mib,
+                        "accelerator_count": self.accelerator_count,
+                    }.items()
+                    if v is not None
+                }
+
+            def request(self) -> dict:
+                """As the InstanceRequirements of EC2 and Auto Scaling APIs"""
+
+                def api_range(r):
+                    return {k.capitalize(): v for k, v in r.items() if v is not None}
+
+                request = {"VCpuCount": api_range(self.vcpu_count), "MemoryMiB": api_range(self.memory_mib)}
+                if self.accelerator_count is not None:
+                    request["AcceleratorCount"] = api_range(self.accelerator_count)
+                    if self.accelerator_count.get("min"):
+                        request["AcceleratorTypes"] = ["gpu"]
+                if self.instance_generations:
+                    request["InstanceGenerations"] = self.instance_generations
+                return request
+
         ssm_agent: bool
         disk_size: int
         key_name: str
@@ -69,6 +168,14 @@ class EKS:
         labels: Dict[str, str]
         tags: Dict[str, str]
         spot: bool
+        instance_requirements: Optional[InstanceRequirements]
+        on_demand_allocation_strategy: Optional[str]
+        spot_allocation_strategy: Optional[str]
+        capacity_rebalance: bool
+        disk_type: str
+        disk_iops: Optional[int]
+        disk_throughput: Optional[int]
+        stack: Optional[int]
 
         def base_load(ng):
             return {
@@ -80,10 +187,22 @@ class EKS:
                 "availability_zones": ng.pop("availability_zones", None),
                 "ami_id": ng.pop("ami_id", None),
                 "user_data": ng.pop("user_data", None),
-                "instance_types": ng.pop("instance_types"),
+                "instance_types": ng.pop("instance_types", []),
                 "labels": ng.pop("labels"),
                 "tags": ng.pop("tags"),
                 "spot": ng.pop("spot", False),
+                "instance_requirements": EKS.NodegroupBase.InstanceRequirements.load(
+                    ng.pop("instance_requirements", None)
+                ),
+                "on_demand_allocation_strategy": ng.pop("on_demand_allocation_strategy", None),
+                "spot_allocation_strategy": ng.pop("spot_allocation_strategy", None),
+                "capacity_rebalance": ng.pop("capacity_rebalance", False),
+                "disk_type": ng.pop("disk_type", "gp3"),
+                "disk_iops": ng.pop("disk_iops", None),
+                "disk_throughput": ng.pop("disk_throughput", None),
+                # Nodegroups from configs older than nested nodegroup stacks are already deployed in the EKS stack,
+                # which their fixed names keep them in
+                "stack": ng.pop("stack", 0),
             }
 
     @dataclass
@@ -98,9 +217,31 @@ class EKS:
 
     @dataclass
     class UnmanagedNodegroup(NodegroupBase):
+        @dataclass
+        class WarmPool:
+            min_size: int
+            max_prepared_capacity: Optional[int]
+            pool_state: str
+            reuse_on_scale_in: bool
+            _no_doc = True
+
+            @classmethod
+            def load(cls, wp):
+                if wp is None:
+                    return None
+                out = cls(
+                    min_size=wp.pop("min_size", 0),
+                    max_prepared_capacity=wp.pop("max_prepared_capacity", None),
+                    pool_state=wp.pop("pool_state", "stopped"),
+                    reuse_on_scale_in=wp.pop("reuse_on_scale_in", False),
+                )
+                check_leavins("warm pool attribute", "config.eks.unmanaged_nodegroups.warm_pool", wp)
+                return out
+
         gpu: bool
         imdsv2_required: bool
         taints: Dict[str, str]
+        warm_pool: Optional[WarmPool]
 
         @classmethod
         def load(cls, ng):
@@ -109,6 +250,7 @@ class EKS:
                 gpu=ng.pop("gpu"),
                 imdsv2_required=ng.pop("imdsv2_required"),
                 taints=ng.pop("taints", {}),
+                warm_pool=cls.WarmPool.load(ng.pop("warm_pool", None)),
             )
             check_leavins("unmanaged nodegroup attribute", "config.eks.unmanaged_nodegroups", ng)
             return out
@@ -119,6 +261,7 @@ class EKS:
     global_node_labels: Dict[str, str]
     global_node_tags: Dict[str, str]
     secrets_encryption_key_arn: str
+    share_launch_templates: bool
     managed_nodegroups: Dict[str, ManagedNodegroup]
     unmanaged_nodegroups: Dict[str, UnmanagedNodegroup]
 
@@ -141,6 +284,9 @@ class EKS:
 
         for name, ng in self.managed_nodegroups.items():
             error_name = f"Managed nodegroup [{name}]"
+            errors += self._instance_selection_errors(error_name, ng, True)
+            errors += self._disk_errors(error_name, ng)
+            errors += self._stack_errors(error_name, ng)
             check_ami_exceptions(error_name, ng.ami_id, ng.user_data, ["ssm_agent", "labels", "disk_size"])
             if ng.min_size == 0:
                 errors.append(
@@ -153,10 +299,110 @@ class EKS:
         for name, ng in self.unmanaged_nodegroups.items():
             error_name = f"Unmanaged nodegroup [{name}]"
             check_ami_exceptions(error_name, ng.ami_id, ng.user_data, ["ssm_agent", "labels", "taints", "disk_size"])
+            errors += self._instance_selection_errors(error_name, ng, False)
+            errors += self._disk_errors(error_name, ng)
+            errors += self._stack_errors(error_name, ng)
+            if wp := ng.warm_pool:
+                # Auto Scaling doesn't support warm pools with a mixed instances policy
+                if ng.spot or len(ng.instance_types) != 1 or ng.on_demand_allocation_strategy:
+                    errors.append(
+                        f"Error: {error_name} has a warm pool, which requires a single instance type and no spot "
+                        "or allocation strategy."
+                    )
+                if wp.pool_state not in ["stopped", "hibernated"]:
+                    errors.append(
+                        f"Error: {error_name} has a warm pool_state of {wp.pool_state}. Must be stopped or hibernated."
+                    )
+                if wp.min_size < 0 or (wp.max_prepared_capacity is not None and wp.max_prepared_capacity < ng.max_size):
+                    errors.append(
+                        f"Error: {error_name} warm pool min_size can't be negative, and max_prepared_capacity "
+                        f"(currently: {wp.max_prepared_capacity}) can't be less than max_size (currently: {ng.max_size})."
+                    )
 
         if errors:
             raise ValueError(errors)
 
+    @staticmethod
+    def _instance_selection_errors(ng_name: str, ng: "EKS.NodegroupBase", managed: bool) -> List[str]:
+        errors = []
+        if bool(ng.instance_types) == bool(ng.instance_requirements):
+            errors.append(f"Error: {ng_name} needs either instance_types or instance_requirements, not both.")
+
+        if ir := ng.instance_requirements:
+            for attribute, r in ir.ranges().items():
+                if (
+                    set(r) - {"min", "max"}
+                    or (attribute != "accelerator_count" and r.get("min") is None)
+                    or any(v is not None and (type(v) != int or v < 0) for v in r.values())
+                    or (r.get("max") is not None and (r.get("min") or 0) > r["max"])
+                ):
+                    errors.append(
+                        f"Error: {ng_name} instance_requirements {attribute} must be a range of "
+                        f"non-negative integers, {{min: x, max: y}} (currently: {r})."
+                    )
+            if set(ir.instance_generations or []) - {"current", "previous"}:
+                errors.append(
+                    f"Error: {ng_name} instance_requirements instance_generations can only be current or previous."
+                )
+
+        strategies = {
+            "on_demand_allocation_strategy": (ng.on_demand_allocation_strategy, on_demand_allocation_strategies),
+            "spot_allocation_strategy": (ng.spot_allocation_strategy, spot_allocation_strategies),
+        }
+        for option, (strategy, valid) in strategies.items():
+            if strategy is None:
+                continue
+            if managed:
+                errors.append(f"Error: {ng_name} can't set {option}, EKS picks it for managed nodegroups.")
+            elif strategy not in valid:
+                errors.append(f"Error: {ng_name} {option} must be one of {valid} (currently: {strategy}).")
+            elif ng.instance_requirements and strategy in prioritized_allocation_strategies:
+                errors.append(f"Error: {ng_name} {option} can't be {strategy} with instance_requirements.")
+
+        if ng.capacity_rebalance and not ng.spot:
+            errors.append(f"Error: {ng_name} has capacity_rebalance, which only applies to spot nodegroups.")
+        return errors
+
+    @staticmethod
+    def _stack_errors(ng_name: str, ng: "EKS.NodegroupBase") -> List[str]:
+        if ng.stack is not None and (type(ng.stack) != int or ng.stack < 0):
+            return [f"Error: {ng_name} stack must be 0 (the EKS stack) or above (currently: {ng.stack})."]
+        return []
+
+    @staticmethod
+    def _disk_errors(ng_name: str, ng: "EKS.NodegroupBase") -> List[str]:
+        if ng.disk_type not in disk_types:
+            return [f"Error: {ng_name} disk_type must be one of {list(disk_types)} (currently: {ng.disk_type})."]
+        if ng.ami_id:
+            # Custom AMIs bring their own block devices (see check_ami_exceptions)
+            if ng.disk_iops or ng.disk_throughput or ng.disk_type != "gp3":
+                return [f"Error: {ng_name} disk_type, disk_iops and disk_throughput only apply to the default EKS AMI."]
+            return []
+
+        errors = []
+        limits = disk_types[ng.disk_type]
+        iops = ng.disk_iops or limits["iops"][0]
+        if ng.disk_type == "io2" and not ng.disk_iops:
+            errors.append(f"Error: {ng_name} io2 disks need disk_iops.")
+        # gp3's baseline IOPS come with any size of disk
+        elif ng.disk_iops and not limits["iops"][0] <= iops <= min(
+            limits["iops"][1], limits["iops_per_gib"] * ng.disk_size
+        ):
+            errors.append(
+                f"Error: {ng_name} disk_iops of {iops} must be from {limits['iops'][0]} to {limits['iops'][1]}, and "
+                f"at most {limits['iops_per_gib']} per GB of disk_size (currently: {ng.disk_size})."
+            )
+
+        if ng.disk_throughput:
+            if not limits["throughput"]:
+                errors.append(f"Error: {ng_name} disk_throughput can only be set on gp3 disks.")
+            elif not limits["throughput"][0] <= ng.disk_throughput <= min(limits["throughput"][1], iops / 4):
+                errors.append(
+                    f"Error: {ng_name} disk_throughput of {ng.disk_throughput} must be from {limits['throughput'][0]} "
+                    f"to {limits['throughput'][1]} MiB/s, and at most a quarter of disk_iops ({iops})."
+                )
+        return errors
+
     @staticmethod
     def from_0_0_0(c: dict):
         def remap_mi(ng, unmanaged=False):
@@ -182,6 +428,7 @@ class EKS:
                     for name, ng in c.pop("nodegroups", {}).items()
                 },
                 secrets_encryption_key_arn=None,
+                share_launch_templates=False,
             ),
             c,
         )
@@ -194,6 +441,7 @@ class EKS:
                 version=c.pop("version"),
                 private_api=c.pop("private_api"),
                 secrets_encryption_key_arn=c.pop("secrets_encryption_key_arn", None),
+                share_launch_templates=c.pop("share_launch_templates", False),
                 max_nodegroup_azs=c.pop("max_nodegroup_azs"),
                 global_node_labels=c.pop("global_node_labels"),
                 global_node_tags=c.pop("global_node_tags"),
@@ -1,4 +1,17 @@
-from aws_cdk.region_info import Fact, FactName
+# Region prefix -> partition. This used to come from aws_cdk.region_info, but that
+# boots jsii (seconds) for a string lookup, and its table doesn't know about regions newer than the library.
+partitions = [
+    ("cn-", "aws-cn"),
+    ("us-gov-", "aws-us-gov"),
+    ("us-iso-", "aws-iso"),
+    ("us-isob-", "aws-iso-b"),
+    ("eu-isoe-", "aws-iso-e"),
+    ("us-isof-", "aws-iso-f"),
+]
+
+
+def region_partition(region: str) -> str:
+    return next((partition for prefix, partition in partitions if region.startswith(prefix)), "aws")
 
 
 # Future TODO item: Incorporate IAM reqs into the provisioning
@@ -10,7 +23,7 @@ def generate_iam(
     manual: bool = False,
     use_bastion: bool = False,
 ):
-    partition = Fact.require_fact(region, FactName.PARTITION)
+    partition = region_partition(region)
 
     if manual:
         asset_bucket = "*"
@@ -60,6 +60,15 @@ def config_template(
                 tags={},
                 taints=taints or {},
                 spot=False,
+                instance_requirements=None,
+                on_demand_allocation_strategy=None,
+                spot_allocation_strategy=None,
+                capacity_rebalance=False,
+                disk_type="gp3",
+                disk_iops=None,
+                disk_throughput=None,
+                stack=None,
+                warm_pool=None,
             )
 
     add_nodegroups(
@@ -118,12 +127,19 @@ def config_template(
             removal_policy="DESTROY" if destroy_on_destroy else False,
         ),
         removal_policy_destroy=destroy_on_destroy,
+        performance_mode="general_purpose",
+        throughput_mode="elastic",
+        provisioned_throughput_mibps=None,
+        transition_to_ia=None,
+        transition_to_primary_storage_class=False,
+        replication_overwrite_protection=True,
     )
 
     eks = EKS(
         version="1.24",
         private_api=private_api,
         secrets_encryption_key_arn=secrets_encryption_key_arn,
+        share_launch_templates=True,
         max_nodegroup_azs=3,
         global_node_labels={'dominodatalab.com/domino-node': 'true'},
         global_node_tags={},
@@ -0,0 +1,102 @@
+from dataclasses import fields, is_dataclass
+from functools import lru_cache
+from typing import Any, Callable, List, Tuple, Union, get_args, get_origin
+
+# checker(path, value, errors) appends a message to errors for each mismatch found at or below path
+Checker = Callable[[str, Any, List[str]], None]
+
+
+def mismatch(path: str, tp, value) -> str:
+    return f"{path} type ({tp}) does not match value: [{value}] ({type(value)})"
+
+
+@lru_cache(maxsize=None)
+def compile_checker(tp) -> Checker:  # noqa: C901
+    """
+    A checker for values annotated tp, built once per annotation. Empty values (None, "", 0, [], {}, False)
+    are always accepted, as config loaders fill unset options with them.
+    """
+    origin = get_origin(tp)
+    args = get_args(tp)
+
+    if tp is Any:
+
+        def check(path, value, errors):
+            pass
+
+    elif origin is Union and len(options := [a for a in args if a is not type(None)]) == 1:  # noqa: E721
+        # Optional[X]: None is empty, so accepted anyway
+        return compile_checker(options[0])
+
+    elif origin is Union:
+        options = [compile_checker(a) for a in options]
+
+        def check(path, value, errors):
+            if not value:
+                return
+            for option in options:
+                option_errors: List[str] = []
+                option(path, value, option_errors)
+                if not option_errors:
+                    return
+            errors.append(mismatch(path, tp, value))
+
+    elif origin is list:
+        item = compile_checker(args[0]) if args else compile_checker(Any)
+
+        def check(path, value, errors):
+            if not value:
+                return
+            if not isinstance(value, list):
+                errors.append(mismatch(path, tp, value))
+                return
+            for i, x in enumerate(value):
+                item(f"{path}.[{i}]", x, errors)
+
+    elif origin is dict:
+        key, item = [compile_checker(a) for a in args] if args else [compile_checker(Any)] * 2
+
+        def check(path, value, errors):
+            if not value:
+                return
+            # dict covers ruamel's CommentedMap, which configs edited with comments load as
+            if not isinstance(value, dict):
+                errors.append(mismatch(path, tp, value))
+                return
+            for k, v in value.items():
+                key(f"{path}.{k} (key)", k, errors)
+                item(f"{path}.{k}", v, errors)
+
+    elif is_dataclass(tp):
+
+        def check(path, value, errors):
+            if not value:
+                return
+            if not isinstance(value, tp):
+                errors.append(mismatch(path, tp, value))
+                return
+            validate(value, path, errors)
+
+    else:
+
+        def check(path, value, errors):
+            # Exact type, so ie a bool doesn't pass for an int
+            if value and type(value) is not tp:
+                errors.append(mismatch(path, tp, value))
+
+    return check
+
+
+@lru_cache(maxsize=None)
+def validation_plan(cls) -> Tuple[Tuple[str, Checker], ...]:
+    """(field name, checker) for each field of a dataclass type, derived once per type"""
+    return tuple((f.name, compile_checker(f.type)) for f in fields(cls))
+
+
+def validate(obj, path: str, errors: List[str] = None) -> List[str]:
+    """Type errors in a dataclass instance and everything it holds, with their paths"""
+    if errors is None:
+        errors = []
+    for name, check in validation_plan(type(obj)):
+        check(f"{path}.{name}", getattr(obj, name), errors)
+    return errors
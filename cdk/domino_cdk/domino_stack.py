@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Dict, Optional
 
 import aws_cdk.aws_s3 as s3
 from aws_cdk import CfnOutput, Stack, Tags
@@ -6,6 +6,8 @@ from constructs import Construct
 
 from domino_cdk.aws_configurator import DominoAwsConfigurator
 from domino_cdk.config import DominoCDKConfig
+from domino_cdk.lookups import DominoLookupCache
+from domino_cdk.profiling import DominoSynthProfiler
 from domino_cdk.provisioners import (
     DominoAcmProvisioner,
     DominoEfsProvisioner,
@@ -17,6 +19,7 @@ from domino_cdk.provisioners.eks.eks_iam_roles_for_k8s import (
     DominoEksK8sIamRolesProvisioner,
 )
 from domino_cdk.provisioners.lambda_utils import create_lambda
+from domino_cdk.synth_cache import DominoSynthCache
 from domino_cdk.util import DominoCdkUtil
 
 
@@ -26,13 +29,26 @@ class DominoStack(Stack):
     s3_stack: Optional[DominoS3Provisioner] = None
     monitoring_bucket: Optional[s3.Bucket] = None
 
-    def __init__(self, scope: Construct, construct_id: str, cfg: DominoCDKConfig, nest: bool = True, **kwargs) -> None:
+    def __init__(
+        self,
+        scope: Construct,
+        construct_id: str,
+        cfg: DominoCDKConfig,
+        nest: bool = True,
+        profiler: Optional[DominoSynthProfiler] = None,
+        synth_cache: Optional[DominoSynthCache] = None,
+        **kwargs,
+    ) -> None:
         super().__init__(scope, construct_id, **kwargs)
+        self.profiler = profiler or DominoSynthProfiler(enabled=False)
+        # Replays nodegroup stacks that didn't change since the previous synth (see DominoEksNodegroupProvisioner)
+        self.synth_cache = synth_cache
 
         # The code that defines your stack goes here
         self.cfg = cfg
         self.env = kwargs["env"]
         self.name = self.cfg.name
+        self.lookups = DominoLookupCache.for_env(self.cfg.aws_account_id, self.cfg.aws_region)
         CfnOutput(self, "deploy_name", value=self.name)
 
         self.untagged_resources = {"ec2": [], "iam": []}
@@ -41,52 +57,85 @@ class DominoStack(Stack):
             Tags.of(self).add(str(k), str(v))
 
         if self.cfg.s3 is not None:
-            self.s3_stack = DominoS3Provisioner(self, "S3Stack", self.name, self.cfg.s3, nest)
+            with self.profiler.phase("S3Stack"):
+                self.s3_stack = DominoS3Provisioner(self, "S3Stack", self.name, self.cfg.s3, nest)
             self.monitoring_bucket = self.s3_stack.monitoring_bucket
 
-        self.vpc_stack = DominoVpcProvisioner(
-            self, "VpcStack", self.name, self.cfg.vpc, nest, monitoring_bucket=self.monitoring_bucket
-        )
-
-        self.eks_stack = DominoEksProvisioner(
-            self,
-            "EksStack",
-            self.name,
-            self.cfg.eks,
-            self.vpc_stack.vpc,
-            self.vpc_stack.private_subnet_name,
-            self.vpc_stack.bastion_sg,
-            self.cfg.route53.zone_ids if self.cfg.route53 is not None else [],
-            nest,
-            # Do not pass list of buckets to Eks provisioner if we are not using S3 access per node
-            self.s3_stack.buckets
-            if self.s3_stack is not None and cfg.create_iam_roles_for_service_accounts is False
-            else [],
-        )
-
-        if cfg.create_iam_roles_for_service_accounts:
-            DominoEksK8sIamRolesProvisioner(self).provision(self.name, self.eks_stack.cluster, self.s3_stack.buckets)
+        with self.profiler.phase("VpcStack"):
+            self.vpc_stack = DominoVpcProvisioner(
+                self, "VpcStack", self.name, self.cfg.vpc, nest, monitoring_bucket=self.monitoring_bucket
+            )
 
-        if self.cfg.efs is not None:
-            self.efs_stack = DominoEfsProvisioner(
+        with self.profiler.phase("EksStack"):
+            self.eks_stack = DominoEksProvisioner(
                 self,
-                "EfsStack",
+                "EksStack",
                 self.name,
-                self.cfg.efs,
+                self.cfg.eks,
                 self.vpc_stack.vpc,
-                self.eks_stack.cluster.cluster_security_group,
+                self.vpc_stack.private_subnet_name,
+                self.vpc_stack.bastion_sg,
+                self.cfg.route53.zone_ids if self.cfg.route53 is not None else [],
                 nest,
+                # Do not pass list of buckets to Eks provisioner if we are not using S3 access per node
+                self.s3_stack.buckets
+                if self.s3_stack is not None and cfg.create_iam_roles_for_service_accounts is False
+                else [],
             )
 
-        if self.cfg.acm is not None:
-            self.acm_stack = DominoAcmProvisioner(
-                self,
-                "AcmStack",
-                self.name,
-                self.cfg.acm,
-                nest,
-            )
+        if cfg.create_iam_roles_for_service_accounts:
+            with self.profiler.phase("K8sIamRoles"):
+                DominoEksK8sIamRolesProvisioner(self).provision(
+                    self.name, self.eks_stack.cluster, self.s3_stack.buckets
+                )
 
+        if self.cfg.efs is not None:
+            with self.profiler.phase("EfsStack"):
+                self.efs_stack = DominoEfsProvisioner(
+                    self,
+                    "EfsStack",
+                    self.name,
+                    self.cfg.efs,
+                    self.vpc_stack.vpc,
+                    self.eks_stack.cluster.cluster_security_group,
+                    nest,
+                )
+
+        if self.cfg.acm is not None:
+            with self.profiler.phase("AcmStack"):
+                self.acm_stack = DominoAcmProvisioner(
+                    self,
+                    "AcmStack",
+                    self.name,
+                    self.cfg.acm,
+                    nest,
+                )
+
+        with self.profiler.phase("fix_missing_tags"):
+            self.provision_fix_missing_tags()
+
+        with self.profiler.phase("calico"):
+            self.provision_calico()
+
+        with self.profiler.phase("outputs"):
+            self.generate_outputs()
+
+    @property
+    def context_records(self) -> Dict[str, dict]:
+        """
+        What later synths of this deployment have to repeat, as changing it replaces nodegroups, by the cdk.context.json
+        key to record it under: the stack number each nodegroup was placed in by kind and name (see
+        DominoEksNodegroupProvisioner.place_nodegroups), and the instance types managed nodegroups' instance
+        requirements were resolved to (see DominoEksNodegroupProvisioner.managed_instance_types). Empty ones are left out.
+        """
+        nodegroups = self.eks_stack.nodegroups
+        records = {
+            "nodegroup_stacks": nodegroups.placements if any(nodegroups.placements.values()) else {},
+            "managed_instance_types": nodegroups.resolved_instance_types,
+        }
+        return {k: v for k, v in records.items() if v}
+
+    def provision_fix_missing_tags(self):
         create_lambda(
             scope=self,
             stack_name=self.name,
@@ -112,12 +161,13 @@ class DominoStack(Stack):
             ],
         )
 
+    def provision_calico(self):
         # From 1.25 and on, you must maintain calico yourself
         if self.cfg.eks.version <= "1.24":
             # At least until we get the lambda working, this has to live in the eks stack's scope
             # as there is some implicit token used to construct the magically auto-generated kubectl
             # lambda behind the scenes when they are in separate stacks (nested or otehrwise).
-            DominoAwsConfigurator(self.eks_stack.scope, self.eks_stack.cluster)
+            DominoAwsConfigurator(self.eks_stack.scope, self.eks_stack.cluster, self.lookups)
         else:
             CfnOutput(
                 self,
@@ -125,8 +175,6 @@ class DominoStack(Stack):
                 value="Calico is no longer managed by CDK and has been uninstalled.. If upgrading from\n1.24 or earlier, you will have to manage Calico manually, or forgo network\npolicy enforcement.\n\nYou can reinstall Calico with the following command:\nhelm upgrade calico-tigera-operator tigera-operator \\\n--repo https://projectcalico.docs.tigera.io/charts --version v3.25.0 \\\n--namespace tigera-operator --set installation.kubernetesProvider=EKS \\\n--set installation.cni.type=AmazonVPC --set installation.registry=quay.io/ \\\n--timeout 10m --create-namespace --install\n\nIf you choose not to reinstall Calico, you should cycle all nodes.",
             )
 
-        self.generate_outputs()
-
     def generate_outputs(self):
         if self.efs_stack is not None:
             CfnOutput(
@@ -0,0 +1,308 @@
+from concurrent.futures import ThreadPoolExecutor
+from json import dumps as json_dumps
+from json import loads as json_loads
+from os import getpid, makedirs, replace
+from os.path import isfile
+from os.path import join as path_join
+from threading import Lock
+from time import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import boto3
+from botocore.exceptions import ClientError
+from requests import get as requests_get
+
+calico_manifests = [
+    (
+        "calico-operator",
+        "https://raw.githubusercontent.com/aws/amazon-vpc-cni-k8s/v1.11.0/config/master/calico-operator.yaml",
+    ),
+    (
+        "calico-crs",
+        "https://raw.githubusercontent.com/aws/amazon-vpc-cni-k8s/v1.11.0/config/master/calico-crs.yaml",
+    ),
+]
+
+# Seconds each kind of lookup is reused for. None never expires: the calico manifests are pinned to a release.
+default_ttls: Dict[str, Optional[int]] = {
+    "identity": 60 * 60,
+    "availability_zones": 7 * 24 * 60 * 60,
+    "addon_versions": 24 * 60 * 60,
+    "instance_types": 24 * 60 * 60,
+    "ebs_limits": 7 * 24 * 60 * 60,
+    "ami_architecture": None,
+    "manifest": None,
+}
+
+# Architecture of the AMI managed nodegroups run without an ami_id: EKS's default, Amazon Linux 2 on x86_64
+default_ami_architecture = "x86_64"
+
+# Most instance types describe_instance_types takes at once
+describe_instance_types_batch = 100
+
+
+class OfflineLookupError(Exception):
+    """A lookup missing from the cache was needed in offline mode"""
+
+
+class DominoLookupCache:
+    """
+    Results of the network lookups synthesis makes (caller identity, availability zones, EKS addon versions,
+    instance types matching managed nodegroups' instance requirements, AMI architectures, EBS limits of instance types,
+    calico manifests),
+    persisted per account and region in the same spirit as cdk.context.json.
+
+    Entries are reused until their kind's TTL runs out. In offline mode nothing is fetched: entries are used
+    whatever their age, and a missing one raises OfflineLookupError. With refresh, every entry is fetched again
+    the first time it's used. Without a cache_dir, lookups are only cached in memory.
+    """
+
+    _settings: Dict[str, Any] = {"cache_dir": None, "offline": False, "refresh": False, "ttls": {}}
+    _instances: Dict[Tuple[str, str], "DominoLookupCache"] = {}
+
+    def __init__(
+        self,
+        account: str,
+        region: str,
+        cache_dir: Optional[str] = None,
+        offline: bool = False,
+        refresh: bool = False,
+        ttls: Optional[Dict[str, Optional[int]]] = None,
+    ):
+        self.account = account
+        self.region = region
+        self.cache_dir = cache_dir
+        self.offline = offline
+        self.refresh = refresh
+        self.ttls = {**default_ttls, **(ttls or {})}
+        self.refreshed: set = set()
+        self.lock = Lock()
+
+        self.entries: Dict[str, dict] = {}
+        if self.cache_file and isfile(self.cache_file):
+            with open(self.cache_file) as f:
+                self.entries = json_loads(f.read())["lookups"]
+
+    @classmethod
+    def configure(
+        cls,
+        cache_dir: Optional[str] = None,
+        offline: bool = False,
+        refresh: bool = False,
+        ttls: Optional[Dict[str, Optional[int]]] = None,
+    ):
+        """Settings for the caches for_env hands out from now on"""
+        cls._settings = {"cache_dir": cache_dir, "offline": offline, "refresh": refresh, "ttls": ttls or {}}
+        cls._instances = {}
+
+    @classmethod
+    def for_env(cls, account: str, region: str) -> "DominoLookupCache":
+        """The shared cache for an account and region, so config loading and the stack reuse each other's lookups"""
+        key = (str(account), region)
+        if key not in cls._instances:
+            cls._instances[key] = cls(*key, **cls._settings)
+        return cls._instances[key]
+
+    @property
+    def cache_file(self) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        return path_join(self.cache_dir, f"{self.account}.{self.region}.json")
+
+    def save(self):
+        if not self.cache_file:
+            return
+        makedirs(self.cache_dir, exist_ok=True)
+        tmp = f"{self.cache_file}.{getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(
+                json_dumps(
+                    {"account": self.account, "region": self.region, "lookups": self.entries}, indent=4, sort_keys=True
+                )
+            )
+        replace(tmp, self.cache_file)
+
+    def lookup(self, kind: str, key: str, fetch: Callable[[], Any]) -> Any:
+        entry = self.entries.get(key)
+
+        if self.offline:
+            if entry is None:
+                raise OfflineLookupError(
+                    f"{key} for account {self.account} in {self.region} isn't cached and lookups are offline. "
+                    "Run util.py refresh_lookups with AWS credentials first."
+                )
+            return entry["value"]
+
+        ttl = self.ttls.get(kind)
+        fresh = entry is not None and (ttl is None or time() - entry["fetched"] < ttl)
+        if fresh and not (self.refresh and key not in self.refreshed):
+            return entry["value"]
+
+        value = fetch()
+        with self.lock:
+            self.entries[key] = {"value": value, "fetched": int(time())}
+            self.refreshed.add(key)
+            self.save()
+        return value
+
+    def client(self, service: str):
+        # A session per client: lookups run concurrently when prefetched, and boto3's default session isn't thread-safe
+        return boto3.session.Session().client(service, region_name=self.region)
+
+    def identity(self) -> dict:
+        def fetch():
+            identity = self.client("sts").get_caller_identity()
+            return {k: identity[k] for k in ["Account", "Arn", "UserId"]}
+
+        return self.lookup("identity", "identity", fetch)
+
+    def availability_zones(self) -> List[str]:
+        def fetch():
+            ec2 = self.client("ec2")
+            return [az["ZoneName"] for az in ec2.describe_availability_zones()["AvailabilityZones"]]
+
+        return self.lookup("availability_zones", "availability_zones", fetch)
+
+    def addon_versions(self, eks_version: str) -> Dict[str, dict]:
+        """describe_addon_versions for eks_version by addon name, trimmed to what picking a version needs"""
+
+        def fetch():
+            eks_client = self.client("eks")
+            addons = {}
+            for page in eks_client.get_paginator("describe_addon_versions").paginate(kubernetesVersion=eks_version):
+                for a in page["addons"]:
+                    addons.setdefault(a["addonName"], {"addonVersions": []})["addonVersions"] += [
+                        {
+                            "addonVersion": v["addonVersion"],
+                            "compatibilities": [{"defaultVersion": c["defaultVersion"]} for c in v["compatibilities"]],
+                        }
+                        for v in a["addonVersions"]
+                    ]
+            return addons
+
+        return self.lookup("addon_versions", f"addon_versions:{eks_version}", fetch)
+
+    def instance_types(self, instance_requirements: dict, ami_id: Optional[str] = None) -> List[str]:
+        """
+        Instance types matching an InstanceRequirements request that can run ami_id (or without one, the default EKS
+        AMI), smallest first: by vCPUs, then memory, then name. The first ones are those closest to the minimums.
+        """
+
+        def fetch():
+            ec2 = self.client("ec2")
+            architecture = self.ami_architecture(ami_id) if ami_id else default_ami_architecture
+            instance_types = []
+            for page in ec2.get_paginator("get_instance_types_from_instance_requirements").paginate(
+                ArchitectureTypes=[architecture],
+                VirtualizationTypes=["hvm"],
+                InstanceRequirements=instance_requirements,
+            ):
+                instance_types += [it["InstanceType"] for it in page["InstanceTypes"]]
+
+            sizes = {}
+            for start in range(0, len(instance_types), describe_instance_types_batch):
+                end = start + describe_instance_types_batch
+                batch = instance_types[start:end]
+                for it in ec2.describe_instance_types(InstanceTypes=batch)["InstanceTypes"]:
+                    sizes[it["InstanceType"]] = (it["VCpuInfo"]["DefaultVCpus"], it["MemoryInfo"]["SizeInMiB"])
+            return sorted(instance_types, key=lambda it: (*sizes.get(it, (0, 0)), it))
+
+        key = json_dumps(instance_requirements, sort_keys=True)
+        return self.lookup(
+            "instance_types", f"instance_types:{ami_id}:{key}" if ami_id else f"instance_types:{key}", fetch
+        )
+
+    def ami_architecture(self, ami_id: str) -> str:
+        """An AMI's architecture (x86_64, arm64...), which never changes"""
+
+        def fetch():
+            return self.client("ec2").describe_images(ImageIds=[ami_id])["Images"][0]["Architecture"]
+
+        return self.lookup("ami_architecture", f"ami_architecture:{ami_id}", fetch)
+
+    def ebs_limits(self, instance_type: str) -> Optional[dict]:
+        """
+        The most IOPS and throughput (MB/s) instance_type's EBS optimization supports, or None for types without
+        EBS optimization
+        """
+
+        def fetch():
+            ec2 = self.client("ec2")
+            instance_types = ec2.describe_instance_types(InstanceTypes=[instance_type])["InstanceTypes"]
+            if not (info := instance_types[0]["EbsInfo"].get("EbsOptimizedInfo")):
+                return None
+            return {k: info[k] for k in ["MaximumIops", "MaximumThroughputInMBps"]}
+
+        return self.lookup("ebs_limits", f"ebs_limits:{instance_type}", fetch)
+
+    def manifest(self, url: str) -> str:
+        def fetch():
+            response = requests_get(url)
+            response.raise_for_status()
+            return response.text
+
+        return self.lookup("manifest", f"manifest:{url}", fetch)
+
+    def required(
+        self,
+        eks_version: Optional[str],
+        instance_requirements: Optional[List[Tuple[dict, Optional[str]]]] = None,
+        ebs_instance_types: Optional[List[str]] = None,
+    ) -> List[Tuple[Callable, tuple]]:
+        """
+        The lookups synthesizing a deployment of eks_version makes, as (method, args), with those for its managed
+        nodegroups' instance_requirements (as (request, ami_id)) and the instance types of nodegroups with
+        provisioned disk performance
+        """
+        required: List[Tuple[Callable, tuple]] = [(self.identity, ()), (self.availability_zones, ())]
+        required += [(self.instance_types, args) for args in instance_requirements or []]
+        required += [(self.ebs_limits, (it,)) for it in sorted(set(ebs_instance_types or []))]
+        if eks_version:
+            required.append((self.addon_versions, (eks_version,)))
+            # From 1.25 and on, calico isn't installed (see DominoStack)
+            if eks_version <= "1.24":
+                required += [(self.manifest, (url,)) for name, url in calico_manifests if not isfile(f"{name}.yaml")]
+        return required
+
+    def prefetch(
+        self,
+        eks_version: Optional[str],
+        jobs: Optional[int] = None,
+        instance_requirements: Optional[List[Tuple[dict, Optional[str]]]] = None,
+        ebs_instance_types: Optional[List[str]] = None,
+    ):
+        """
+        Run every lookup a deployment of eks_version needs concurrently, so a cold synth waits for the slowest
+        one rather than all of them in turn as constructs are built. Cached entries return immediately.
+        """
+        required = self.required(eks_version, instance_requirements, ebs_instance_types)
+        with ThreadPoolExecutor(max_workers=jobs or len(required)) as pool:
+            futures = [(method, pool.submit(method, *args)) for method, args in required]
+        for method, future in futures:
+            try:
+                future.result()
+            except ClientError:
+                # Loading the config looks the EBS limits up again and reports an instance type EC2 rejects
+                # alongside its other validation errors
+                if method != self.ebs_limits:
+                    raise
+
+    def refresh_all(self, cfg) -> List[str]:
+        """Fetch every lookup synthesizing cfg needs, whether cached or not. Returns the keys fetched."""
+        self.refresh = True
+        self.prefetch(
+            cfg.eks.version,
+            instance_requirements=[
+                (ng.instance_requirements.request(), ng.ami_id)
+                for ng in cfg.eks.managed_nodegroups.values()
+                if ng.instance_requirements
+            ],
+            ebs_instance_types=[
+                it
+                for ngs in [cfg.eks.managed_nodegroups, cfg.eks.unmanaged_nodegroups]
+                for ng in ngs.values()
+                if ng.disk_iops or ng.disk_throughput
+                for it in ng.instance_types
+            ],
+        )
+        return sorted(self.refreshed)
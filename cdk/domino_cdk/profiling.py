@@ -0,0 +1,149 @@
+from contextlib import contextmanager
+from glob import glob
+from json import dumps as json_dumps
+from json import loads as json_loads
+from os.path import basename, getsize
+from os.path import join as path_join
+from time import perf_counter
+from typing import List, Optional
+
+from constructs import Construct
+
+try:
+    # Not public API: only used to count round trips to the jsii runtime when it's there to patch
+    from jsii._kernel.providers.process import _NodeProcess
+except ImportError:  # pragma: no cover
+    _NodeProcess = None
+
+SYNTH_PROFILE = "synth-profile.json"
+SYNTH_PROFILE_FOLDED = "synth-profile.folded"
+
+
+class DominoSynthProfiler:
+    """
+    Times named, nestable phases of building and synthesizing the app: wall time, round trips to the jsii runtime
+    and the time spent waiting on them, and constructs created. write() puts the phases in cdk.out along with the
+    size of every template, as JSON holding Chrome trace events (chrome://tracing, speedscope, perfetto) and as
+    folded stacks for flamegraph.pl.
+
+    A disabled profiler's phases do nothing, so provisioners can always declare them.
+    """
+
+    def __init__(self, root: Optional[Construct] = None, enabled: bool = True):
+        self.root = root
+        self.enabled = enabled
+        self.phases: List[dict] = []
+        self.stack: List[dict] = []
+        self.jsii_calls = 0
+        self.jsii_time = 0.0
+        self.origin = perf_counter()
+        # Time spent counting constructs, which the clock leaves out
+        self.count_time = 0.0
+        self._send = None
+
+        if self.enabled and _NodeProcess is not None:
+            self._send = _NodeProcess.send
+            profiler = self
+
+            def send(process, request, response_type):
+                start = perf_counter()
+                try:
+                    return profiler._send(process, request, response_type)
+                finally:
+                    profiler.jsii_calls += 1
+                    profiler.jsii_time += perf_counter() - start
+
+            _NodeProcess.send = send
+
+    def stop(self):
+        """Stop counting jsii round trips"""
+        if self._send is not None:
+            _NodeProcess.send = self._send
+            self._send = None
+
+    def clock(self) -> float:
+        """Seconds since the profiler started, less the time spent counting constructs"""
+        return perf_counter() - self.origin - self.count_time
+
+    def count_constructs(self) -> Optional[int]:
+        if self.root is None:
+            return None
+        # Counting walks the whole tree in round trips of its own, so it's kept out of the counters and the clock,
+        # or every phase would include the counting done by the phases nested in it
+        calls, time, start = self.jsii_calls, self.jsii_time, perf_counter()
+        count = len(self.root.node.find_all())
+        self.jsii_calls, self.jsii_time = calls, time
+        self.count_time += perf_counter() - start
+        return count
+
+    @contextmanager
+    def phase(self, name: str):
+        if not self.enabled:
+            yield
+            return
+
+        constructs = self.count_constructs()
+        phase = {
+            "name": name,
+            "path": ";".join([p["name"] for p in self.stack] + [name]),
+            "start": self.clock(),
+        }
+        self.stack.append(phase)
+        calls, jsii_time = self.jsii_calls, self.jsii_time
+        try:
+            yield
+        finally:
+            phase["duration"] = self.clock() - phase["start"]
+            phase["jsii_calls"] = self.jsii_calls - calls
+            phase["jsii_time"] = self.jsii_time - jsii_time
+            self.stack.pop()
+            after = self.count_constructs()
+            phase["constructs"] = after - constructs if after is not None else None
+            self.phases.append(phase)
+
+    def templates(self, outdir: str) -> dict:
+        templates = {}
+        for fn in sorted(glob(path_join(outdir, "*.template.json"))):
+            with open(fn) as f:
+                template = json_loads(f.read())
+            templates[basename(fn)] = {"bytes": getsize(fn), "resources": len(template.get("Resources", {}))}
+        return templates
+
+    def folded(self) -> str:
+        """Self time of each phase in microseconds, as flamegraph.pl's folded stacks"""
+        children: dict = {}
+        for p in self.phases:
+            parent = p["path"].rpartition(";")[0]
+            children[parent] = children.get(parent, 0) + p["duration"]
+        return "".join(
+            f"{p['path']} {max(0, round((p['duration'] - children.get(p['path'], 0)) * 1e6))}\n"
+            for p in sorted(self.phases, key=lambda p: p["start"])
+        )
+
+    def write(self, outdir: str) -> str:
+        self.stop()
+        phases = sorted(self.phases, key=lambda p: p["start"])
+        report = {
+            "phases": phases,
+            "jsii_calls": self.jsii_calls,
+            "jsii_time": self.jsii_time,
+            "templates": self.templates(outdir),
+            "traceEvents": [
+                {
+                    "name": p["name"],
+                    "ph": "X",
+                    "ts": round(p["start"] * 1e6),
+                    "dur": round(p["duration"] * 1e6),
+                    "pid": 1,
+                    "tid": 1,
+                    "args": {k: p[k] for k in ["jsii_calls", "jsii_time", "constructs"]},
+                }
+                for p in phases
+            ],
+        }
+        report_file = path_join(outdir, SYNTH_PROFILE)
+        with open(report_file, "w") as f:
+            f.write(json_dumps(report, indent=4))
+        with open(path_join(outdir, SYNTH_PROFILE_FOLDED), "w") as f:
+            f.write(self.folded())
+        return report_file
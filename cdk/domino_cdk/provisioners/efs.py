@@ -3,7 +3,7 @@ import aws_cdk.aws_ec2 as ec2
 import aws_cdk.aws_efs as efs
 import aws_cdk.aws_events as events
 import aws_cdk.aws_iam as iam
-from aws_cdk import CfnOutput, Duration, NestedStack, RemovalPolicy
+from aws_cdk import CfnOutput, Duration, NestedStack, RemovalPolicy, Size
 from aws_cdk.region_info import Fact, FactName
 from constructs import Construct
 
@@ -41,13 +41,24 @@ class DominoEfsProvisioner:
             encrypted=True,
             file_system_name=stack_name,
             # kms_key,
-            # lifecycle_policy,
+            lifecycle_policy=efs.LifecyclePolicy[f"AFTER_{d}_DAY{'S' if d > 1 else ''}"]
+            if (d := cfg.transition_to_ia)
+            else None,
+            out_of_infrequent_access_policy=efs.OutOfInfrequentAccessPolicy.AFTER_1_ACCESS
+            if cfg.transition_to_primary_storage_class
+            else None,
             removal_policy=RemovalPolicy.DESTROY if cfg.removal_policy_destroy else RemovalPolicy.RETAIN,
             security_group=security_group,
-            performance_mode=efs.PerformanceMode.GENERAL_PURPOSE,
-            throughput_mode=efs.ThroughputMode.BURSTING,
+            performance_mode=efs.PerformanceMode[cfg.performance_mode.upper()],
+            throughput_mode=efs.ThroughputMode[cfg.throughput_mode.upper()],
+            provisioned_throughput_per_second=Size.mebibytes(t) if (t := cfg.provisioned_throughput_mibps) else None,
             vpc_subnets=ec2.SubnetSelection(subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS),
         )
+        if not cfg.replication_overwrite_protection:
+            # Not in this CDK's CfnFileSystem yet
+            self.efs.node.default_child.add_property_override(
+                "FileSystemProtection.ReplicationOverwriteProtection", "DISABLED"
+            )
 
         self.efs_access_point = self.efs.add_access_point(
             "access_point",
@@ -34,22 +34,36 @@ class DominoEksProvisioner:
 
         eks_version = eks.KubernetesVersion.of(eks_cfg.version)
 
-        self.cluster = DominoEksClusterProvisioner(self.scope).provision(
-            stack_name,
-            parent,
-            eks_version,
-            eks_cfg.private_api,
-            eks_cfg.secrets_encryption_key_arn,
-            vpc,
-            bastion_sg,
-            parent.cfg.tags,
-        )
-        ng_role = DominoEksIamProvisioner(self.scope).provision(
-            stack_name, self.cluster.cluster_name, r53_zone_ids, buckets
-        )
-        DominoEksNodegroupProvisioner(
-            self.scope, self.cluster, ng_role, stack_name, eks_cfg, eks_version, vpc, private_subnet_name, bastion_sg
-        )
+        with parent.profiler.phase("cluster"):
+            self.cluster = DominoEksClusterProvisioner(self.scope, parent.lookups).provision(
+                stack_name,
+                parent,
+                eks_version,
+                eks_cfg.private_api,
+                eks_cfg.secrets_encryption_key_arn,
+                vpc,
+                bastion_sg,
+                parent.cfg.tags,
+            )
+        with parent.profiler.phase("iam"):
+            ng_role = DominoEksIamProvisioner(self.scope).provision(
+                stack_name, self.cluster.cluster_name, r53_zone_ids, buckets
+            )
+        with parent.profiler.phase("nodegroups"):
+            self.nodegroups = DominoEksNodegroupProvisioner(
+                self.scope,
+                self.cluster,
+                ng_role,
+                stack_name,
+                eks_cfg,
+                eks_version,
+                vpc,
+                private_subnet_name,
+                bastion_sg,
+                profiler=parent.profiler,
+                nest=nest,
+                synth_cache=parent.synth_cache,
+            )
 
         CfnOutput(parent, "eks_cluster_name", value=self.cluster.cluster_name)
 
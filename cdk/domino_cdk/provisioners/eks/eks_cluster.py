@@ -1,10 +1,9 @@
 import re
-from typing import Any, Dict, Optional
+from typing import Dict, Optional
 
 import aws_cdk.aws_ec2 as ec2
 import aws_cdk.aws_eks as eks
 import aws_cdk.aws_iam as iam
-import boto3
 from aws_cdk import CfnOutput, RemovalPolicy
 from aws_cdk.aws_kms import Key
 from aws_cdk.lambda_layer_kubectl_v24 import KubectlV24Layer
@@ -13,6 +12,8 @@ from aws_cdk.lambda_layer_kubectl_v26 import KubectlV26Layer
 from aws_cdk.region_info import Fact, FactName
 from constructs import Construct
 
+from domino_cdk.lookups import DominoLookupCache
+
 from ..lambda_utils import create_lambda
 
 
@@ -20,9 +21,10 @@ class DominoEksClusterProvisioner:
     def __init__(
         self,
         scope: Construct,
+        lookups: Optional[DominoLookupCache] = None,
     ) -> None:
         self.scope = scope
-        self._addon_cache: Optional[Dict[str, Any]] = None
+        self.lookups = lookups or DominoLookupCache.for_env(self.scope.account, self.scope.region)
 
     def provision(
         self,
@@ -175,12 +177,7 @@ class DominoEksClusterProvisioner:
         patch.node.add_dependency(vpc_cni_addon)
 
     def _get_addon_version(self, addon: str, eks_version: str):
-        if not self._addon_cache:
-            eks_client = boto3.client("eks", self.scope.region)
-            result = eks_client.describe_addon_versions(kubernetesVersion=eks_version)
-            self._addon_cache = {a["addonName"]: a for a in result["addons"]}
-
-        addon_versions = self._addon_cache[addon]["addonVersions"]
+        addon_versions = self.lookups.addon_versions(eks_version)[addon]["addonVersions"]
 
         if default_version := next(
             (
@@ -1,12 +1,126 @@
-from typing import Any, Dict, List, Optional, Union
+from dataclasses import asdict
+from hashlib import sha256
+from itertools import count
+from json import dumps as json_dumps
+from json import loads as json_loads
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import aws_cdk.aws_ec2 as ec2
 import aws_cdk.aws_eks as eks
 import aws_cdk.aws_iam as iam
-from aws_cdk import Fn, Stack, Tags, aws_autoscaling
+from aws_cdk import (
+    CfnResource,
+    CfnStack,
+    Duration,
+    FileAssetPackaging,
+    Fn,
+    NestedStack,
+    RemovalPolicy,
+    Stack,
+    Tags,
+    Token,
+    aws_autoscaling,
+)
 from constructs import Construct
 
 from domino_cdk import config
+from domino_cdk.lookups import DominoLookupCache
+from domino_cdk.profiling import DominoSynthProfiler
+from domino_cdk.synth_cache import DominoSynthCache
+from domino_cdk.synth_replay import DominoTemplateReferences, ReplayError
+
+# CloudFormation's per stack limits (nested stack templates are read from S3, which allows the larger size), and the
+# share of them nodegroups may fill before spilling into another nested stack
+max_stack_resources = 500
+max_stack_bytes = 1_000_000
+stack_headroom = 0.8
+
+# Rough template bytes of each resource already in the EKS stack (cluster, addons, IAM...)
+bytes_per_resource = 1100
+
+# Resources and template bytes of a nodegroup, as (fixed, per availability zone), measured from synthesized
+# templates (see benchmarks/synth_bench.py). Tags, labels and user data are added on top.
+nodegroup_footprint = {
+    "managed": {"resources": (1, 1), "bytes": (2600, 1900)},
+    "unmanaged": {"resources": (2, 2), "bytes": (4900, 3300)},
+}
+
+# Resources and template bytes a warm pool adds per availability zone (its WarmPool and launch lifecycle hook), on top
+# of the warm pool scripts in the nodegroup's user data
+warm_pool_footprint = {"resources": 2, "bytes": 600}
+
+# Managed policies and aws-auth role mapping connect_auto_scaling_group_capacity gives each unmanaged nodegroup's
+# auto scaling groups, which replaying their stack gives the node role again
+node_policies = ["AmazonEKSWorkerNodePolicy", "AmazonEKS_CNI_Policy", "AmazonEC2ContainerRegistryReadOnly"]
+node_role_mapping = {
+    "username": "system:node:{{EC2PrivateDNSName}}",
+    "groups": ["system:bootstrappers", "system:nodes"],
+}
+
+# EKS's limit on a managed nodegroup's instance types, which instance requirements are resolved to
+max_managed_instance_types = 20
+
+# Unmanaged nodegroups picking instance types by attributes don't have one for the auto scaling group construct. It
+# only feeds the launch configuration, which is swapped for the launch template.
+placeholder_instance_type = "m5.large"
+
+# Launch lifecycle hook of warm pool nodegroups, which nodes complete once they're prepared for the pool or have joined
+# the cluster. Custom AMIs' user data has to complete it too.
+warm_pool_hook_name = "domino-warm-pool"
+warm_pool_join = "/var/lib/domino/warm-pool-join.sh"
+warm_pool_unit = "domino-warm-pool-join.service"
+warm_pool_sleep_hook = "/usr/lib/systemd/system-sleep/domino-warm-pool-join"
+
+# Goes ahead of the bootstrap script. Nodes launched into the warm pool don't join the cluster then, but keep the
+# script to run when they're started (or resumed from hibernation) on leaving the pool.
+warm_pool_gate = f"""
+imds() {{
+  TOKEN=$(curl -sX PUT http://169.254.169.254/latest/api/token -H "X-aws-ec2-metadata-token-ttl-seconds: 60")
+  curl -s -H "X-aws-ec2-metadata-token: $TOKEN" http://169.254.169.254/latest/meta-data/$1
+}}
+complete_launch() {{
+  INSTANCE_ID=$(imds instance-id)
+  REGION=$(imds placement/region)
+  ASG_NAME=$(aws autoscaling describe-auto-scaling-instances --region $REGION --instance-ids $INSTANCE_ID \\
+    --query "AutoScalingInstances[0].AutoScalingGroupName" --output text)
+  aws autoscaling complete-lifecycle-action --region $REGION --auto-scaling-group-name $ASG_NAME \\
+    --instance-id $INSTANCE_ID --lifecycle-hook-name {warm_pool_hook_name} --lifecycle-action-result CONTINUE
+}}
+STATE=$(imds autoscaling/target-lifecycle-state)
+if [ "$0" = {warm_pool_join} ]; then
+  while [[ $STATE == Warmed:* ]]; do sleep 5; STATE=$(imds autoscaling/target-lifecycle-state); done
+elif [[ $STATE == Warmed:* ]]; then
+  mkdir -p $(dirname {warm_pool_join})
+  cp "$0" {warm_pool_join}
+  chmod +x {warm_pool_join}
+  cat > /etc/systemd/system/{warm_pool_unit} <<'UNIT'
+[Unit]
+Description=Join the EKS cluster on leaving the warm pool
+Wants=network-online.target
+After=network-online.target
+[Service]
+Type=oneshot
+ExecStart={warm_pool_join}
+[Install]
+WantedBy=multi-user.target
+UNIT
+  cat > {warm_pool_sleep_hook} <<'HOOK'
+#!/bin/bash
+[ "$1" = post ] && systemctl start --no-block {warm_pool_unit}
+HOOK
+  chmod +x {warm_pool_sleep_hook}
+  systemctl enable {warm_pool_unit}
+  complete_launch
+  exit 0
+fi
+""".strip()
+
+# Follows the bootstrap script, once the node has joined
+warm_pool_joined = f"""
+complete_launch
+systemctl disable {warm_pool_unit}
+rm -f {warm_pool_sleep_hook}
+""".strip()
 
 
 class DominoEksNodegroupProvisioner:
@@ -21,6 +135,10 @@ class DominoEksNodegroupProvisioner:
         vpc: ec2.Vpc,
         private_subnet_name: str,
         bastion_sg: ec2.SecurityGroup,
+        profiler: Optional[DominoSynthProfiler] = None,
+        nest: bool = False,
+        lookups: Optional[DominoLookupCache] = None,
+        synth_cache: Optional[DominoSynthCache] = None,
     ) -> None:
         self.scope = scope
         self.cluster = cluster
@@ -31,11 +149,34 @@ class DominoEksNodegroupProvisioner:
         self.vpc = vpc
         self.private_subnet_name = private_subnet_name
         self.bastion_sg = bastion_sg
-
-        max_nodegroup_azs = self.eks_cfg.max_nodegroup_azs
-
-        def provision_nodegroup(nodegroup: Dict[str, config.eks.T_NodegroupBase], prov_func):
-            for name, ng in nodegroup.items():
+        self.profiler = profiler or DominoSynthProfiler(enabled=False)
+        self.nest = nest
+        self.lookups = lookups or DominoLookupCache.for_env(Stack.of(scope).account, Stack.of(scope).region)
+        self.synth_cache = synth_cache
+        # Launch templates by (stack, fingerprint), and the user data managed nodegroups' templates are built from
+        self.launch_templates: Dict[Tuple[str, str], ec2.LaunchTemplate] = {}
+        self.user_data: Dict[tuple, ec2.UserData] = {}
+
+        # Stacks nodegroups are placed in by number (0 is the EKS stack), with their estimated resources and bytes
+        existing_resources = self._count_resources(self.scope) if self.nest else 0
+        self.nodegroup_stacks: Dict[int, dict] = {
+            0: {"scope": self.scope, "resources": existing_resources, "bytes": existing_resources * bytes_per_resource}
+        }
+        # Stack number of each nodegroup by kind and name, and the instance types managed nodegroups' instance
+        # requirements were resolved to, for recording in cdk.context.json (see DominoStack)
+        self.placements: Dict[str, Dict[str, int]] = {"managed": {}, "unmanaged": {}}
+        self.resolved_instance_types: Dict[str, dict] = {}
+        # Nested stacks being replayed from the previous synth by number, and the logical IDs of the launch templates
+        # each nodegroup in a nested stack lists as untagged, for replaying it on the next (see replay_stacks)
+        self.replayed: Dict[int, dict] = {}
+        self.untagged: Dict[str, Dict[str, List[str]]] = {"managed": {}, "unmanaged": {}}
+
+        nodegroups = [
+            ("managed", self.eks_cfg.managed_nodegroups, self.provision_managed_nodegroup),
+            ("unmanaged", self.eks_cfg.unmanaged_nodegroups, self.provision_unmanaged_nodegroup),
+        ]
+        for kind, ngs, _ in nodegroups:
+            for ng in ngs.values():
                 if not ng.ami_id:
                     ng.labels = {**ng.labels, **self.eks_cfg.global_node_labels}
                     ng.tags = {
@@ -44,34 +185,444 @@ class DominoEksNodegroupProvisioner:
                         **{f"k8s.io/cluster-autoscaler/node-template/label/{k}": v for k, v in ng.labels.items()},
                         "k8s.io/cluster-autoscaler/node-template/resources/smarter-devices/fuse": "20",
                     }
-                prov_func(name, ng, max_nodegroup_azs)
+                    if kind == "unmanaged":
+                        ng.tags = {
+                            **ng.tags,
+                            **{f"k8s.io/cluster-autoscaler/node-template/taint/{k}": v for k, v in ng.taints.items()},
+                        }
+
+        if self.nest:
+            self.place_nodegroups()
+            if self.synth_cache:
+                self.replay_stacks()
+
+        for kind, ngs, prov_func in nodegroups:
+            for name, ng in ngs.items():
+                with self.profiler.phase(name):
+                    if self.synth_cache and (stack := self.replayed_stack(name, ng, kind)):
+                        self.replay_nodegroup(name, ng, kind, stack)
+                    else:
+                        prov_func(name, ng)
+
+        if self.synth_cache:
+            self.wire_replayed_stacks()
+            self.record_replays()
+
+    @staticmethod
+    def _count_resources(scope: Construct) -> int:
+        stack = Stack.of(scope)
+        return len(
+            [
+                c
+                for c in stack.node.find_all()
+                if isinstance(c, CfnResource) and Stack.of(c).node.path == stack.node.path
+            ]
+        )
 
-        provision_nodegroup(self.eks_cfg.managed_nodegroups, self.provision_managed_nodegroup)
-        provision_nodegroup(self.eks_cfg.unmanaged_nodegroups, self.provision_unmanaged_nodegroup)
+    def estimate_nodegroup(self, ng: config.eks.T_NodegroupBase, kind: str, azs: int) -> Dict[str, int]:
+        """Resources and template bytes a nodegroup spread over azs availability zones adds to its stack"""
+        footprint = nodegroup_footprint[kind]
+        resources = footprint["resources"][0] + footprint["resources"][1] * azs
+        extra_bytes = len(json_dumps({**ng.labels, **ng.tags})) * azs + len(ng.user_data or "")
+        if kind == "unmanaged" and ng.warm_pool:
+            resources += warm_pool_footprint["resources"] * azs
+            extra_bytes += warm_pool_footprint["bytes"] * azs
+            if not ng.ami_id:
+                # As escaped in the template
+                extra_bytes += len(json_dumps(warm_pool_gate)) + len(json_dumps(warm_pool_joined))
+        return {
+            "resources": resources,
+            "bytes": footprint["bytes"][0] + footprint["bytes"][1] * azs + extra_bytes,
+        }
 
-    def provision_managed_nodegroup(
-        self, name: str, ng: config.eks.EKS.ManagedNodegroup, max_nodegroup_azs: int
-    ) -> None:
-        region = Stack.of(self.scope).region
-        machine_image: Optional[ec2.IMachineImage] = (
-            ec2.MachineImage.generic_linux({region: ng.ami_id}) if ng.ami_id else None
+    def nodegroup_azs(self, ng: config.eks.T_NodegroupBase) -> List[str]:
+        return ng.availability_zones or self.vpc.availability_zones[: self.eks_cfg.max_nodegroup_azs]
+
+    def recorded(self, key: str) -> dict:
+        """What earlier synths of this deployment recorded under key in cdk.context.json"""
+        recorded = self.scope.node.try_get_context(key) or {}
+        if isinstance(recorded, str):
+            # From -c on the command line
+            recorded = json_loads(recorded)
+        return recorded.get(self.stack_name) or {}
+
+    def place_nodegroups(self):
+        """
+        Picks each nodegroup's stack: the EKS stack (0), or NodegroupStack1, 2... nested in it, which CloudFormation
+        deploys in parallel. A nodegroup's resources have fixed names, so moving it to another stack fails to
+        replace it. Nodegroups keep the stack set as their `stack` in the config, or else the one recorded for them
+        on an earlier synth. Only nodegroups with neither are placed by estimate, in config order, in the first stack
+        with room for them after the others.
+        """
+        recorded = self.recorded("nodegroup_stacks")
+        estimates = {}
+        new = []
+        for kind, ngs in [
+            ("managed", self.eks_cfg.managed_nodegroups),
+            ("unmanaged", self.eks_cfg.unmanaged_nodegroups),
+        ]:
+            for name, ng in ngs.items():
+                estimates[(kind, name)] = self.estimate_nodegroup(ng, kind, len(self.nodegroup_azs(ng)))
+                number = ng.stack if ng.stack is not None else recorded.get(kind, {}).get(name)
+                if number is None:
+                    new.append((kind, name))
+                else:
+                    self.placements[kind][name] = number
+
+        def add(kind: str, name: str, number: int):
+            stack = self.nodegroup_stacks.setdefault(number, {"resources": 0, "bytes": 0})
+            stack["resources"] += estimates[(kind, name)]["resources"]
+            stack["bytes"] += estimates[(kind, name)]["bytes"]
+            self.placements[kind][name] = number
+
+        for kind, names in self.placements.items():
+            for name, number in names.items():
+                add(kind, name, number)
+
+        def fits(number: int, estimate: Dict[str, int]) -> bool:
+            if not (stack := self.nodegroup_stacks.get(number)):
+                return True
+            return (
+                stack["resources"] + estimate["resources"] <= max_stack_resources * stack_headroom
+                and stack["bytes"] + estimate["bytes"] <= max_stack_bytes * stack_headroom
+            )
+
+        for kind, name in new:
+            add(kind, name, next(n for n in count() if fits(n, estimates[(kind, name)])))
+
+    def nodegroup_scope(self, name: str, kind: str) -> Construct:
+        """The stack place_nodegroups picked for the nodegroup. Without nested stacks, everything is in the one stack."""
+        if not self.nest:
+            return self.scope
+        stack = self.nodegroup_stacks[self.placements[kind][name]]
+        if "scope" not in stack:
+            stack["scope"] = NestedStack(self.scope, f"NodegroupStack{self.placements[kind][name]}")
+        return stack["scope"]
+
+    def stack_nodegroups(self, number: int) -> Dict[str, Dict[str, config.eks.T_NodegroupBase]]:
+        """The nodegroups placed in the stack, by kind and name"""
+        ngs = {"managed": self.eks_cfg.managed_nodegroups, "unmanaged": self.eks_cfg.unmanaged_nodegroups}
+        return {
+            kind: {name: ngs[kind][name] for name, n in placements.items() if n == number}
+            for kind, placements in self.placements.items()
+        }
+
+    def replay_stacks(self):
+        """
+        Keys each nested stack of nodegroups on its nodegroups (see DominoSynthCache.nodegroup_stack_key), and picks
+        those that didn't change since the previous synth to replay rather than build. A replayed stack deploys the
+        template the previous synth wrote, with its parameters wired to the constructs being built, and the EKS stack
+        gets what the stack's nodegroups add to it (see replay_nodegroup). Stacks the previous output doesn't have as
+        they were are built.
+        """
+        self.references = DominoTemplateReferences(self.synth_cache.outdir)
+        for number in sorted(n for n in self.nodegroup_stacks if n):
+            stack_id = f"NodegroupStack{number}"
+            nodegroups = self.stack_nodegroups(number)
+            self.synth_cache.nodegroup_stack_key(
+                stack_id,
+                {
+                    kind: {
+                        name: {
+                            **asdict(ng),
+                            "instance_types": self.managed_instance_types(name, ng)
+                            if kind == "managed"
+                            else ng.instance_types,
+                        }
+                        for name, ng in ngs.items()
+                    }
+                    for kind, ngs in nodegroups.items()
+                },
+            )
+            if replay := self.synth_cache.replay(stack_id):
+                try:
+                    self.replayed[number] = self.previous_stack(stack_id, replay)
+                except ReplayError:
+                    continue
+
+    def previous_stack(self, stack_id: str, replay: dict) -> dict:
+        """
+        The stack's nested stack resource in the previous EKS stack template, and the names of the outputs passing
+        out its launch templates' IDs
+        """
+        resources = self.references.template(Stack.of(self.scope)).get("Resources", {})
+        # Found by the template it deployed, which the asset hash names
+        found = [
+            (logical_id, resource)
+            for logical_id, resource in resources.items()
+            if resource["Type"] == "AWS::CloudFormation::Stack"
+            and replay["hash"] in json_dumps(resource.get("Properties", {}).get("TemplateURL"))
+        ]
+        if len(found) != 1:
+            raise ReplayError(f"{stack_id} isn't in the previous template")
+        logical_id, resource = found[0]
+        if any(logical_id in r.get("DependsOn", []) for r in resources.values()):
+            raise ReplayError(f"{stack_id} has dependents")
+
+        outputs = {
+            output["Value"]["Ref"]: name
+            for name, output in self.references.template_file(replay["template"]).get("Outputs", {}).items()
+            if isinstance(output.get("Value"), dict) and "Ref" in output["Value"]
+        }
+        if any(lt not in outputs for ngs in replay["untagged"].values() for lts in ngs.values() for lt in lts):
+            raise ReplayError(f"{stack_id} doesn't output all of its launch templates")
+        return {"id": stack_id, "previous": resource, "outputs": outputs, **replay}
+
+    def replayed_stack(self, name: str, ng: config.eks.T_NodegroupBase, kind: str) -> Optional[dict]:
+        """
+        The replayed stack the nodegroup is in, if any. The first of its nodegroups adds its nested stack resource,
+        where nodegroup_scope would have added the NestedStack, so the EKS stack's template comes out the same.
+        """
+        number = self.placements[kind].get(name)
+        if number not in self.replayed:
+            return None
+        if kind == "unmanaged":
+            # Made ahead of the nodegroup's stack, as provision_unmanaged_nodegroup does
+            self.unmanaged_security_group()
+            if ng.warm_pool:
+                self.add_warm_pool_policy()
+
+        stack = self.replayed[number]
+        if "resource" not in stack:
+            stack["resource"] = self.replay_stack(stack)
+            self.synth_cache.replayed.append(stack["id"])
+        return stack
+
+    def replay_stack(self, stack: dict) -> CfnStack:
+        """A nested stack resource deploying the stack's previous template, as NestedStack would have added it"""
+        eks_stack = Stack.of(self.scope)
+        location = eks_stack.synthesizer.add_file_asset(
+            file_name=stack["template"], packaging=FileAssetPackaging.FILE, source_hash=stack["hash"]
         )
-        mime_user_data: Optional[ec2.UserData] = self._handle_user_data(name, ng.ami_id, ng.ssm_agent, [ng.user_data])
-
-        lt = self._launch_template(
-            self.cluster,
-            f"LaunchTemplate{name}",
-            ng,
-            machine_image=machine_image,
-            user_data=mime_user_data,
+        cfn_stack = CfnStack(
+            Construct(self.scope, f"{stack['id']}.NestedStack"),
+            f"{stack['id']}.NestedStackResource",
+            template_url=f"https://s3.{eks_stack.region}.{eks_stack.url_suffix}/"
+            f"{location.bucket_name}/{location.object_key}",
         )
-        self.scope.untagged_resources["ec2"].append(lt.launch_template_id)
-        lts = eks.LaunchTemplateSpec(id=lt.launch_template_id, version=lt.version_number)
+        cfn_stack.apply_removal_policy(RemovalPolicy.DESTROY)
+        for key, value in stack["previous"].get("Metadata", {}).items():
+            if key != "aws:cdk:path":
+                cfn_stack.add_metadata(key, value)
+        return cfn_stack
+
+    def wire_replayed_stacks(self):
+        """
+        Pass replayed stacks the parameters, and give them the dependencies, they had in the previous template. As
+        with NestedStack, this waits for every nodegroup, as the first of a stack may come before what it takes (ie
+        the security group unmanaged nodegroups share).
+        """
+        eks_stack = Stack.of(self.scope)
+        for stack in self.replayed.values():
+            previous = stack["previous"]
+            parameters = {
+                name: self.references.resolve(eks_stack, value)
+                for name, value in previous.get("Properties", {}).get("Parameters", {}).items()
+            }
+            if parameters:
+                stack["resource"].parameters = parameters
+            for logical_id in previous.get("DependsOn", []):
+                stack["resource"].node.add_dependency(self.references.element(eks_stack, logical_id))
+
+    def replay_nodegroup(self, name: str, ng: config.eks.T_NodegroupBase, kind: str, stack: dict):
+        """What a nodegroup in a replayed stack adds to the EKS stack, as its constructs would have"""
+        availability_zones = self.nodegroup_azs(ng)
+
+        if kind == "managed":
+            # Resolved again only to be recorded
+            self.managed_instance_types(name, ng)
+        else:
+            # The rules connect_auto_scaling_group_capacity adds for each auto scaling group, which all share the
+            # security group, are the same every time
+            connections = ec2.Connections(security_groups=[self.unmanaged_sg])
+            connections.allow_internally(ec2.Port.all_traffic())
+            connections.allow_from(self.cluster, ec2.Port.tcp(443))
+            connections.allow_from(self.cluster, ec2.Port.tcp_range(1025, 65535))
+            connections.allow_to(self.cluster, ec2.Port.tcp(443))
+            connections.allow_to_any_ipv4(ec2.Port.all_tcp())
+            connections.allow_to_any_ipv4(ec2.Port.all_udp())
+            connections.allow_to_any_ipv4(ec2.Port.all_icmp())
+            for policy in node_policies:
+                self.ng_role.add_managed_policy(iam.ManagedPolicy.from_aws_managed_policy_name(policy))
+
+        # Managed nodegroups and unmanaged auto scaling groups, one per availability zone, each map the node role
+        for _ in availability_zones:
+            self.cluster.aws_auth.add_role_mapping(self.ng_role, **node_role_mapping)
+
+        for lt in stack["untagged"][kind][name]:
+            output = stack["resource"].get_att(f"Outputs.{stack['outputs'][lt]}")
+            self.scope.untagged_resources["ec2"].append(Token.as_string(output))
+        self.untagged[kind][name] = stack["untagged"][kind][name]
+
+    def add_untagged(self, name: str, kind: str, lt: CfnResource):
+        """List a launch template for fix_missing_tags, noting its logical ID to replay its stack by"""
+        self.scope.untagged_resources["ec2"].append(lt.ref)
+        if self.synth_cache:
+            self.untagged[kind].setdefault(name, []).append(Stack.of(lt).resolve(lt.logical_id))
+
+    def record_replays(self):
+        """What the synth cache needs to replay each nested stack of nodegroups on the next synth"""
+        for number, stack in self.nodegroup_stacks.items():
+            if number in self.replayed:
+                template = self.replayed[number]["template"]
+            elif number and "scope" in stack:
+                template = stack["scope"].template_file
+            else:
+                continue
+            self.synth_cache.replays[f"NodegroupStack{number}"] = {
+                "template": template,
+                "untagged": {
+                    kind: {name: self.untagged[kind].get(name, []) for name in ngs}
+                    for kind, ngs in self.stack_nodegroups(number).items()
+                },
+            }
+
+    def unmanaged_security_group(self) -> ec2.SecurityGroup:
+        """The security group shared by unmanaged nodegroups, open to the bastion for ssh"""
+        if not hasattr(self, "unmanaged_sg"):
+            self.unmanaged_sg = ec2.SecurityGroup(
+                self.scope,
+                "UnmanagedSG",
+                vpc=self.vpc,
+                security_group_name=f"{self.stack_name}-sharedNodeSG",
+                allow_all_outbound=False,
+            )
+
+        if self.bastion_sg:
+            self.unmanaged_sg.add_ingress_rule(
+                peer=self.bastion_sg,
+                connection=ec2.Port(
+                    protocol=ec2.Protocol("TCP"),
+                    string_representation="ssh",
+                    from_port=22,
+                    to_port=22,
+                ),
+            )
+        return self.unmanaged_sg
+
+    def add_warm_pool_policy(self):
+        if hasattr(self, "warm_pool_policy"):
+            return
+        # For nodes to complete their launch lifecycle hook
+        self.warm_pool_policy = iam.Policy(
+            self.scope,
+            "WarmPoolPolicy",
+            roles=[self.ng_role],
+            statements=[
+                iam.PolicyStatement(actions=["autoscaling:DescribeAutoScalingInstances"], resources=["*"]),
+                iam.PolicyStatement(
+                    actions=["autoscaling:CompleteLifecycleAction"],
+                    resources=["*"],
+                    conditions={
+                        "StringEquals": {"autoscaling:ResourceTag/eks:cluster-name": self.cluster.cluster_name}
+                    },
+                ),
+            ],
+        )
+
+    def launch_template_key(
+        self, scope: Construct, name: str, ng: config.eks.T_NodegroupBase, kind: str
+    ) -> Tuple[str, str]:
+        """
+        The stack a nodegroup's launch template goes in, and a fingerprint of everything the template is built from,
+        so nodegroups whose templates would be identical can share one. Templates are only shared within a stack, as
+        nested stacks can't reference the ones depending on them.
+        """
+        data = {
+            "kind": kind,
+            "ami_id": ng.ami_id,
+            "ssm_agent": ng.ssm_agent,
+            "user_data": ng.user_data,
+            "nodegroup": self._user_data_nodegroup(name, ng),
+            "key_name": ng.key_name,
+            "disk_size": ng.disk_size,
+            "disk_type": ng.disk_type,
+            "disk_iops": ng.disk_iops,
+            "disk_throughput": ng.disk_throughput,
+        }
+        if kind == "unmanaged":
+            # Unmanaged templates also carry the AMI variant, instance type, IMDS options and bootstrap script
+            data.update(
+                gpu=ng.gpu,
+                instance_type=ng.instance_types[0] if ng.instance_types else None,
+                imdsv2_required=ng.imdsv2_required,
+                labels=ng.labels,
+                taints=ng.taints,
+                warm_pool=asdict(ng.warm_pool) if ng.warm_pool else None,
+            )
+        return Stack.of(scope).node.path, sha256(json_dumps(data, sort_keys=True).encode()).hexdigest()
+
+    @staticmethod
+    def _user_data_nodegroup(name: str, ng: config.eks.T_NodegroupBase) -> Optional[str]:
+        """The nodegroup's name if it's substituted into its user data, which then differs for each nodegroup"""
+        return name if "${NodegroupName}" in (ng.user_data or "") else None
+
+    def shared_launch_template(self, key: Tuple[str, str]) -> Optional[ec2.LaunchTemplate]:
+        return self.launch_templates.get(key) if self.eks_cfg.share_launch_templates else None
+
+    def managed_instance_types(self, name: str, ng: config.eks.EKS.ManagedNodegroup) -> List[str]:
+        """
+        The nodegroup's instance types. EKS takes a list, so instance requirements are resolved to the smallest types
+        matching them (see DominoLookupCache.instance_types). Changing a managed nodegroup's instance types replaces
+        it, so they're resolved once and recorded in cdk.context.json, to be kept until its requirements or AMI change.
+        """
+        if not ng.instance_requirements:
+            return ng.instance_types
+        resolved = {"instance_requirements": ng.instance_requirements.request(), "ami_id": ng.ami_id}
+        recorded = self.recorded("managed_instance_types").get(name) or {}
+        if recorded.get("instance_types") and all(recorded.get(k) == v for k, v in resolved.items()):
+            instance_types = recorded["instance_types"]
+        else:
+            instance_types = self.lookups.instance_types(resolved["instance_requirements"], ng.ami_id)
+            if not instance_types:
+                raise ValueError(f"Managed nodegroup [{name}]: no instance types match its instance_requirements")
+            instance_types = instance_types[:max_managed_instance_types]
+        self.resolved_instance_types[name] = {**resolved, "instance_types": instance_types}
+        return instance_types
+
+    def provision_managed_nodegroup(self, name: str, ng: config.eks.EKS.ManagedNodegroup) -> None:
+        availability_zones = self.nodegroup_azs(ng)
+        scope = self.nodegroup_scope(name, "managed")
+
+        if scope is self.scope:
+            # As always, so nodegroups in the EKS stack keep their resource IDs
+            lt_scope = self.cluster
+            add_nodegroup = self.cluster.add_nodegroup_capacity
+        else:
+            lt_scope = scope
+
+            def add_nodegroup(id: str, **kwargs) -> eks.Nodegroup:
+                return eks.Nodegroup(scope, id, cluster=self.cluster, **kwargs)
+
+        key = self.launch_template_key(lt_scope, name, ng, "managed")
+        if not (lt := self.shared_launch_template(key)):
+            region = Stack.of(self.scope).region
+            machine_image: Optional[ec2.IMachineImage] = (
+                ec2.MachineImage.generic_linux({region: ng.ami_id}) if ng.ami_id else None
+            )
+            user_data_key = (
+                bool(ng.ami_id),
+                ng.ssm_agent,
+                ng.user_data,
+                self._user_data_nodegroup(name, ng),
+            )
+            if user_data_key not in self.user_data:
+                self.user_data[user_data_key] = self._handle_user_data(name, ng.ami_id, ng.ssm_agent, [ng.user_data])
 
-        availability_zones = ng.availability_zones or self.vpc.availability_zones[:max_nodegroup_azs]
+            lt = self._launch_template(
+                lt_scope,
+                f"LaunchTemplate{name}",
+                ng,
+                machine_image=machine_image,
+                user_data=self.user_data[user_data_key],
+            )
+            self.launch_templates[key] = lt
+            self.add_untagged(name, "managed", lt.node.default_child)
+        lts = eks.LaunchTemplateSpec(id=lt.launch_template_id, version=lt.version_number)
+        instance_types = self.managed_instance_types(name, ng)
 
         for i, az in enumerate(availability_zones):
-            self.cluster.add_nodegroup_capacity(
+            add_nodegroup(
                 f"{self.stack_name}-{name}-{i}",
                 nodegroup_name=f"{self.stack_name}-{name}-{az}",
                 capacity_type=eks.CapacityType.SPOT if ng.spot else eks.CapacityType.ON_DEMAND,
@@ -82,7 +633,7 @@ class DominoEksNodegroupProvisioner:
                     subnet_group_name=self.private_subnet_name,
                     availability_zones=[az],
                 ),
-                instance_types=[ec2.InstanceType(it) for it in ng.instance_types],
+                instance_types=[ec2.InstanceType(it) for it in instance_types],
                 launch_template_spec=lts,
                 labels=ng.labels,
                 tags={
@@ -92,9 +643,7 @@ class DominoEksNodegroupProvisioner:
                 node_role=self.ng_role,
             )
 
-    def provision_unmanaged_nodegroup(
-        self, name: str, ng: config.eks.EKS.UnmanagedNodegroup, max_nodegroup_azs: int
-    ) -> None:
+    def provision_unmanaged_nodegroup(self, name: str, ng: config.eks.EKS.UnmanagedNodegroup) -> None:
         region = Stack.of(self.scope).region
         machine_image = (
             ec2.MachineImage.generic_linux({region: ng.ami_id})
@@ -106,42 +655,25 @@ class DominoEksNodegroupProvisioner:
             )
         )
 
-        if not ng.ami_id:
-            ng.tags = {
-                **ng.tags,
-                **{f"k8s.io/cluster-autoscaler/node-template/taint/{k}": v for k, v in ng.taints.items()},
-            }
+        self.unmanaged_security_group()
+        if ng.warm_pool:
+            self.add_warm_pool_policy()
 
-        if not hasattr(self, "unmanaged_sg"):
-            self.unmanaged_sg = ec2.SecurityGroup(
-                self.scope,
-                "UnmanagedSG",
-                vpc=self.vpc,
-                security_group_name=f"{self.stack_name}-sharedNodeSG",
-                allow_all_outbound=False,
-            )
-
-        if self.bastion_sg:
-            self.unmanaged_sg.add_ingress_rule(
-                peer=self.bastion_sg,
-                connection=ec2.Port(
-                    protocol=ec2.Protocol("TCP"),
-                    string_representation="ssh",
-                    from_port=22,
-                    to_port=22,
-                ),
-            )
-
-        scope = Construct(self.scope, f"UnmanagedNodeGroup{name}")
+        availability_zones = self.nodegroup_azs(ng)
+        scope = Construct(self.nodegroup_scope(name, "unmanaged"), f"UnmanagedNodeGroup{name}")
+        key = self.launch_template_key(scope, name, ng, "unmanaged")
         cfn_lt = None
-        availability_zones = ng.availability_zones or self.vpc.availability_zones[:max_nodegroup_azs]
+        if lt := self.shared_launch_template(key):
+            cfn_lt = lt.node.default_child
         for i, az in enumerate(availability_zones):
             indexed_name = f"{self.stack_name}-{name}-{az}"
             asg = aws_autoscaling.AutoScalingGroup(
                 scope,
                 f"{self.stack_name}-{name}-{i}",
                 auto_scaling_group_name=indexed_name,
-                instance_type=ec2.InstanceType(ng.instance_types[0]),
+                instance_type=ec2.InstanceType(
+                    ng.instance_types[0] if ng.instance_types else placeholder_instance_type
+                ),
                 machine_image=machine_image,
                 vpc=self.cluster.vpc,
                 min_capacity=ng.min_size,
@@ -167,19 +699,23 @@ class DominoEksNodegroupProvisioner:
             ).items():
                 Tags.of(asg).add(str(k), str(v), apply_to_launched_instances=True)
 
-            mime_user_data = self._handle_user_data(name, ng.ami_id, ng.ssm_agent, [ng.user_data, asg.user_data])
+            if ng.warm_pool and not ng.ami_id:
+                asg.user_data.add_commands(warm_pool_gate)
 
             if not cfn_lt:
+                # The template takes the first ASG's user data, which connect_auto_scaling_group_capacity fills in
+                mime_user_data = self._handle_user_data(name, ng.ami_id, ng.ssm_agent, [ng.user_data, asg.user_data])
                 lt = self._launch_template(
                     scope,
                     f"LaunchTemplate{i}",
                     ng,
                     launch_template_name=indexed_name,
                     role=self.ng_role,
-                    instance_type=ec2.InstanceType(ng.instance_types[0]),
+                    instance_type=ec2.InstanceType(ng.instance_types[0]) if ng.instance_types else None,
                     machine_image=machine_image,
                     user_data=mime_user_data,
                     security_group=self.unmanaged_sg,
+                    hibernation_configured=True if ng.warm_pool and ng.warm_pool.pool_state == "hibernated" else None,
                 )
                 # mimic adding the security group via the ASG during connect_auto_scaling_group_capacity
                 lt.connections.add_security_group(self.cluster.cluster_security_group)
@@ -194,8 +730,9 @@ class DominoEksNodegroupProvisioner:
                     ),
                 )
                 cfn_lt.launch_template_data = lt_data
+                self.launch_templates[key] = lt
 
-            self.scope.untagged_resources["ec2"].append(cfn_lt.ref)
+            self.add_untagged(name, "unmanaged", cfn_lt)
 
             # https://github.com/aws/aws-cdk/issues/6734
             cfn_asg: aws_autoscaling.CfnAutoScalingGroup = asg.node.default_child
@@ -203,22 +740,17 @@ class DominoEksNodegroupProvisioner:
             asg.node.try_remove_child("LaunchConfig")
             cfn_asg.launch_configuration_name = None
             # Attach the launch template to the auto scaling group
-            cfn_asg.mixed_instances_policy = cfn_asg.MixedInstancesPolicyProperty(
-                launch_template=cfn_asg.LaunchTemplateProperty(
-                    launch_template_specification=cfn_asg.LaunchTemplateSpecificationProperty(
-                        launch_template_id=cfn_lt.ref,
-                        version=lt.version_number,
-                    ),
-                    overrides=[cfn_asg.LaunchTemplateOverridesProperty(instance_type=it) for it in ng.instance_types],
-                ),
-                instances_distribution=cfn_asg.InstancesDistributionProperty(
-                    spot_allocation_strategy="capacity-optimized-prioritized",
-                    on_demand_percentage_above_base_capacity=0,  # all spot instances
-                    on_demand_base_capacity=0,
+            if ng.warm_pool:
+                # Warm pools don't support mixed instances policies, and they're only needed for multiple types or spot
+                cfn_asg.launch_template = cfn_asg.LaunchTemplateSpecificationProperty(
+                    launch_template_id=cfn_lt.ref,
+                    version=lt.version_number,
                 )
-                if ng.spot
-                else None,
-            )
+                self._warm_pool(asg, ng.warm_pool)
+            else:
+                cfn_asg.mixed_instances_policy = self._mixed_instances_policy(ng, cfn_lt.ref, lt.version_number)
+                # None leaves it out of the template
+                cfn_asg.capacity_rebalance = ng.capacity_rebalance or None
 
             options: dict[str, Any] = {
                 "bootstrap_enabled": ng.ami_id is None,
@@ -238,6 +770,81 @@ class DominoEksNodegroupProvisioner:
 
             self.cluster.connect_auto_scaling_group_capacity(asg, **options)
 
+            if ng.warm_pool and not ng.ami_id:
+                asg.user_data.add_commands(warm_pool_joined)
+
+    @staticmethod
+    def _mixed_instances_policy(
+        ng: config.eks.EKS.UnmanagedNodegroup, launch_template_id: str, version: str
+    ) -> aws_autoscaling.CfnAutoScalingGroup.MixedInstancesPolicyProperty:
+        cfn_asg = aws_autoscaling.CfnAutoScalingGroup
+
+        if ir := ng.instance_requirements:
+
+            def cfn_range(prop, r: Optional[Dict[str, int]]):
+                return prop(min=r.get("min"), max=r.get("max")) if r is not None else None
+
+            overrides = [
+                cfn_asg.LaunchTemplateOverridesProperty(
+                    instance_requirements=cfn_asg.InstanceRequirementsProperty(
+                        v_cpu_count=cfn_range(cfn_asg.VCpuCountRequestProperty, ir.vcpu_count),
+                        memory_mib=cfn_range(cfn_asg.MemoryMiBRequestProperty, ir.memory_mib),
+                        accelerator_count=cfn_range(cfn_asg.AcceleratorCountRequestProperty, ir.accelerator_count),
+                        accelerator_types=ir.request().get("AcceleratorTypes"),
+                        instance_generations=ir.instance_generations,
+                    )
+                )
+            ]
+        else:
+            overrides = [cfn_asg.LaunchTemplateOverridesProperty(instance_type=it) for it in ng.instance_types]
+
+        # Attribute-based selection has no order of instance types to go by
+        on_demand_allocation_strategy = ng.on_demand_allocation_strategy or ("lowest-price" if ir else None)
+        if ng.spot:
+            instances_distribution = cfn_asg.InstancesDistributionProperty(
+                spot_allocation_strategy=ng.spot_allocation_strategy
+                or ("price-capacity-optimized" if ir else "capacity-optimized-prioritized"),
+                on_demand_allocation_strategy=on_demand_allocation_strategy,
+                on_demand_percentage_above_base_capacity=0,  # all spot instances
+                on_demand_base_capacity=0,
+            )
+        elif on_demand_allocation_strategy:
+            instances_distribution = cfn_asg.InstancesDistributionProperty(
+                on_demand_allocation_strategy=on_demand_allocation_strategy
+            )
+        else:
+            instances_distribution = None
+
+        return cfn_asg.MixedInstancesPolicyProperty(
+            launch_template=cfn_asg.LaunchTemplateProperty(
+                launch_template_specification=cfn_asg.LaunchTemplateSpecificationProperty(
+                    launch_template_id=launch_template_id,
+                    version=version,
+                ),
+                overrides=overrides,
+            ),
+            instances_distribution=instances_distribution,
+        )
+
+    @staticmethod
+    def _warm_pool(asg: aws_autoscaling.AutoScalingGroup, warm_pool: config.EKS.UnmanagedNodegroup.WarmPool):
+        asg.add_warm_pool(
+            min_size=warm_pool.min_size,
+            max_group_prepared_capacity=warm_pool.max_prepared_capacity,
+            pool_state=aws_autoscaling.PoolState.HIBERNATED
+            if warm_pool.pool_state == "hibernated"
+            else aws_autoscaling.PoolState.STOPPED,
+            reuse_on_scale_in=warm_pool.reuse_on_scale_in,
+        )
+        # Holds new nodes, going into the pool or into service, until they've finished their user data
+        asg.add_lifecycle_hook(
+            "WarmPoolHook",
+            lifecycle_hook_name=warm_pool_hook_name,
+            lifecycle_transition=aws_autoscaling.LifecycleTransition.INSTANCE_LAUNCHING,
+            default_result=aws_autoscaling.DefaultResult.CONTINUE,
+            heartbeat_timeout=Duration.minutes(10),
+        )
+
     def _handle_user_data(
         self, name: str, custom_ami: bool, ssm_agent: bool, user_data_list: List[Union[ec2.UserData, str]]
     ) -> Optional[ec2.UserData]:
@@ -300,9 +907,16 @@ class DominoEksNodegroupProvisioner:
                         ng.disk_size,
                         delete_on_termination=True,
                         encrypted=True,
-                        volume_type=ec2.EbsDeviceVolumeType.GP3,
+                        volume_type=getattr(ec2.EbsDeviceVolumeType, ng.disk_type.upper()),
+                        iops=ng.disk_iops,
                     ),
                 )
             ]
 
-        return ec2.LaunchTemplate(scope, name, **{**opts, **kwargs})
+        lt = ec2.LaunchTemplate(scope, name, **{**opts, **kwargs})
+        if ng.disk_throughput and not ng.ami_id:
+            # BlockDeviceVolume.ebs has no throughput option
+            lt.node.default_child.add_property_override(
+                "LaunchTemplateData.BlockDeviceMappings.0.Ebs.Throughput", ng.disk_throughput
+            )
+        return lt
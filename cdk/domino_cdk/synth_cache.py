@@ -0,0 +1,261 @@
+import sys
+from hashlib import sha256
+from importlib.metadata import PackageNotFoundError, version
+from json import dumps as json_dumps
+from json import loads as json_loads
+from os import environ, getpid, replace, walk
+from os.path import abspath, dirname, exists, expanduser, isfile
+from os.path import join as path_join
+from os.path import relpath
+from typing import Dict, List, Optional
+
+from domino_cdk.config import DominoCDKConfig
+from domino_cdk.lookups import calico_manifests
+
+SYNTH_CACHE = "synth-cache.json"
+
+# Libraries that render the templates along with domino_cdk
+synth_libraries = ["aws-cdk-lib", "constructs", "jsii"]
+
+# Context the cdk CLI sets for every synth, unless told otherwise
+cli_defaults = {
+    "aws:cdk:enable-path-metadata": True,
+    "aws:cdk:enable-asset-metadata": True,
+    "aws:cdk:version-reporting": True,
+    "aws:cdk:bundling-stacks": ["**"],
+}
+
+# Context app.py records in cdk.context.json from each synth (see DominoStack.context_records)
+recorded_context = ["nodegroup_stacks", "managed_instance_types"]
+
+# Scripts building the app with domino_cdk
+app_scripts = ["app.py", "fleet.py"]
+
+# Sections of the config every stack is named, tagged or placed by
+shared_sections = ["name", "aws_region", "aws_account_id", "tags"]
+
+# Config sections each stack's template is built from, and the stacks whose constructs it takes (ie the VPC or
+# the monitoring bucket). The root stack's cdk_config output carries the whole config.
+stack_inputs: Dict[str, dict] = {
+    "S3Stack": {"sections": ["s3"], "upstream": []},
+    "VpcStack": {"sections": ["vpc"], "upstream": ["S3Stack"]},
+    "EksStack": {
+        "sections": ["eks", "route53", "create_iam_roles_for_service_accounts"],
+        "upstream": ["S3Stack", "VpcStack"],
+    },
+    "EfsStack": {"sections": ["efs"], "upstream": ["VpcStack", "EksStack"]},
+    "AcmStack": {"sections": ["acm"], "upstream": []},
+    "root": {"sections": ["*"], "upstream": ["S3Stack", "VpcStack", "EksStack", "EfsStack", "AcmStack"]},
+}
+
+
+def cli_context() -> dict:
+    """The context the cdk CLI hands app.py (cdk.json, cdk.context.json and -c), read the way App reads it"""
+    context = json_loads(environ.get("CDK_CONTEXT_JSON") or "{}")
+    if overflow := environ.get("CONTEXT_OVERFLOW_LOCATION_ENV"):
+        with open(overflow) as f:
+            context.update(json_loads(f.read()))
+    return context
+
+
+def project_context(overrides: dict) -> dict:
+    """
+    The context the cdk CLI would hand an app run from this directory with overrides as its -c options:
+    ~/.cdk.json, cdk.json and cdk.context.json, in that order, plus the metadata settings the CLI turns on
+    """
+    context = {}
+    for fn, key in [(expanduser("~/.cdk.json"), "context"), ("cdk.json", "context"), ("cdk.context.json", None)]:
+        if isfile(fn):
+            with open(fn) as f:
+                settings = json_loads(f.read())
+            context.update(settings.get(key, {}) if key else settings)
+    context.update(cli_defaults)
+    context.update(overrides)
+    return context
+
+
+def hash_json(value) -> str:
+    return sha256(json_dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def source_hash() -> str:
+    """Hash of the domino_cdk package, so changing the provisioners invalidates everything"""
+    package_dir = dirname(__file__)
+    h = sha256()
+    for root, dirs, files in walk(package_dir):
+        dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+        for fn in sorted(files):
+            if fn.endswith(".pyc"):
+                continue
+            path = path_join(root, fn)
+            h.update(relpath(path, package_dir).encode())
+            with open(path, "rb") as f:
+                h.update(f.read())
+    return h.hexdigest()
+
+
+def file_hash(path: str) -> Optional[str]:
+    if not isfile(path):
+        return None
+    with open(path, "rb") as f:
+        return sha256(f.read()).hexdigest()
+
+
+def library_versions() -> Dict[str, Optional[str]]:
+    versions: Dict[str, Optional[str]] = {}
+    for library in synth_libraries:
+        try:
+            versions[library] = version(library)
+        except PackageNotFoundError:
+            versions[library] = None
+    return versions
+
+
+def entry_inputs(app_dir: Optional[str] = None) -> dict:
+    """
+    What else a synth reads from outside the package: the scripts building the app (in app_dir, by default that of
+    the running script), cdk.json, and local calico manifests that stand in for the downloaded ones (see
+    DominoAwsConfigurator). Both scripts count, so app.py and fleet.py key the same synth the same way.
+    """
+    if app_dir is None:
+        main = getattr(sys.modules.get("__main__"), "__file__", None)
+        app_dir = dirname(abspath(main)) if main else None
+    return {
+        "entry": {s: file_hash(path_join(app_dir, s)) for s in app_scripts} if app_dir else None,
+        "cdk_json": file_hash("cdk.json"),
+        "manifests": {name: file_hash(f"{name}.yaml") for name, _ in calico_manifests},
+    }
+
+
+class DominoSynthCache:
+    """
+    Keys for each nested stack of a synth, from the config sections that feed it and the keys of the stacks it
+    builds on, kept next to the synthesized output.
+
+    When no key changed and the previous output is intact, the whole cloud assembly is reused without starting the
+    CDK at all. Otherwise stale() says which stacks changed and the app is built again, as every stack's template
+    takes constructs from the ones before it. Nodegroups' nested stacks are the exception: nothing else is built from
+    their constructs, so each one whose nodegroups didn't change is replayed from its previous template (see
+    DominoEksNodegroupProvisioner.replay_stacks) rather than built.
+    """
+
+    def __init__(
+        self,
+        outdir: str,
+        cfg: DominoCDKConfig,
+        context: dict,
+        lookups_file: Optional[str] = None,
+        app_dir: Optional[str] = None,
+    ):
+        self.outdir = outdir
+        self.cache_file = path_join(outdir, SYNTH_CACHE)
+
+        lookups = {}
+        if lookups_file and isfile(lookups_file):
+            with open(lookups_file) as f:
+                lookups = {k: v["value"] for k, v in json_loads(f.read())["lookups"].items()}
+
+        rendered = cfg.render(True)
+        self.environment = hash_json(
+            {
+                "source": source_hash(),
+                "libraries": library_versions(),
+                **entry_inputs(app_dir),
+                # Records of nodegroup stacks and instance types only repeat what the output they came from has
+                "context": {k: v for k, v in context.items() if k not in recorded_context},
+                "lookups": lookups,
+                "shared": {s: rendered.get(s) for s in shared_sections},
+            }
+        )
+
+        self.keys: Dict[str, str] = {}
+        for stack, inputs in stack_inputs.items():
+            sections = rendered if inputs["sections"] == ["*"] else {s: rendered.get(s) for s in inputs["sections"]}
+            self.keys[stack] = hash_json(
+                {
+                    "environment": self.environment,
+                    "sections": sections,
+                    "upstream": [self.keys[u] for u in inputs["upstream"]],
+                }
+            )
+
+        # The EKS stack's inputs other than its nodegroups, which those in nested stacks are keyed on instead
+        self.nodegroup_sections = {s: rendered.get(s) for s in stack_inputs["EksStack"]["sections"]}
+        self.nodegroup_sections["eks"] = {
+            k: v
+            for k, v in (rendered.get("eks") or {}).items()
+            if k not in ["managed_nodegroups", "unmanaged_nodegroups"]
+        }
+
+        self.stored: Dict[str, str] = {}
+        self.files: List[str] = []
+        self.stored_replays: Dict[str, dict] = {}
+        if isfile(self.cache_file):
+            with open(self.cache_file) as f:
+                stored = json_loads(f.read())
+            self.stored = stored["stacks"]
+            self.files = stored["files"]
+            self.stored_replays = stored.get("replays", {})
+
+        # What this synth needs to replay each of its nodegroup stacks next time, and the ones it replayed itself
+        self.replays: Dict[str, dict] = {}
+        self.replayed: List[str] = []
+
+    def stale(self) -> List[str]:
+        """Stacks whose inputs changed since the output was synthesized"""
+        return [stack for stack, key in self.keys.items() if self.stored.get(stack) != key]
+
+    def reusable(self) -> bool:
+        return bool(self.files) and not self.stale() and all(exists(path_join(self.outdir, f)) for f in self.files)
+
+    def nodegroup_stack_key(self, stack: str, nodegroups: dict) -> str:
+        """
+        Key a nested stack of nodegroups (see DominoEksNodegroupProvisioner) on the EKS stack's inputs besides its
+        nodegroups, and the nodegroups in it, so changing one nodegroup leaves the others' stacks as they were
+        """
+        self.keys[stack] = hash_json(
+            {
+                "environment": self.environment,
+                "sections": self.nodegroup_sections,
+                "nodegroups": nodegroups,
+                "upstream": [self.keys[u] for u in stack_inputs["EksStack"]["upstream"]],
+            }
+        )
+        return self.keys[stack]
+
+    def replay(self, stack: str) -> Optional[dict]:
+        """What's needed to replay the stack's template from the previous synth, if none of its inputs changed"""
+        replay = self.stored_replays.get(stack)
+        if not replay or self.stored.get(stack) != self.keys.get(stack):
+            return None
+        if not exists(path_join(self.outdir, replay["template"])):
+            return None
+        return replay
+
+    def save(self):
+        """Record the keys of a finished synth, and the files it needs to be reused"""
+        with open(path_join(self.outdir, "manifest.json")) as f:
+            artifacts = json_loads(f.read())["artifacts"].values()
+
+        files = ["manifest.json"]
+        # Asset hashes by file, which nested stack templates are uploaded under
+        hashes = {}
+        for artifact in artifacts:
+            properties = artifact.get("properties", {})
+            files += [properties[p] for p in ["templateFile", "file"] if p in properties]
+            if artifact["type"] == "cdk:asset-manifest":
+                # Nested stack templates and staged assets
+                with open(path_join(self.outdir, properties["file"])) as f:
+                    assets = json_loads(f.read()).get("files", {})
+                files += [a["source"]["path"] for a in assets.values()]
+                hashes.update({a["source"]["path"]: h for h, a in assets.items()})
+
+        replays = {
+            stack: {**replay, "hash": hashes[replay["template"]]}
+            for stack, replay in self.replays.items()
+            if replay["template"] in hashes
+        }
+        tmp = f"{self.cache_file}.{getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(json_dumps({"stacks": self.keys, "files": sorted(set(files)), "replays": replays}, indent=4))
+        replace(tmp, self.cache_file)
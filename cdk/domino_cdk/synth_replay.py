@@ -0,0 +1,116 @@
+from json import loads as json_loads
+from os.path import join as path_join
+from typing import Dict, List
+
+from aws_cdk import CfnElement, CfnResource, NestedStack, Stack, Token
+from constructs import Construct
+
+
+class ReplayError(Exception):
+    """A previous synth's template refers to something the constructs being built don't have"""
+
+
+class DominoTemplateReferences:
+    """
+    Reads the templates a previous synth left in outdir, and turns the references in them (Ref and Fn::GetAtt,
+    through nested stacks' parameters and outputs) back into tokens of the constructs being built. A template from
+    that synth can then be deployed again from the new one, with the CDK wiring its parameters as it did before.
+
+    Logical IDs are found from the aws:cdk:path metadata when the templates have it, or else by resolving those of
+    every element in the stack.
+    """
+
+    def __init__(self, outdir: str):
+        self.outdir = outdir
+        self.templates: Dict[str, dict] = {}
+        self.elements: Dict[str, Dict[str, CfnElement]] = {}
+
+    def template_file(self, fn: str) -> dict:
+        if fn not in self.templates:
+            try:
+                with open(path_join(self.outdir, fn)) as f:
+                    self.templates[fn] = json_loads(f.read())
+            except (OSError, ValueError) as e:
+                raise ReplayError(f"No previous template {fn}: {e}")
+        return self.templates[fn]
+
+    def template(self, stack: Stack) -> dict:
+        """The stack's template from the previous synth"""
+        return self.template_file(stack.template_file)
+
+    @staticmethod
+    def _stack_elements(stack: Stack) -> List[CfnElement]:
+        elements = []
+        scopes: List[Construct] = [stack]
+        while scopes:
+            for child in scopes.pop().node.children:
+                # Other stacks' elements have their own logical IDs
+                if Stack.is_stack(child):
+                    continue
+                if CfnElement.is_cfn_element(child):
+                    elements.append(child)
+                scopes.append(child)
+        return elements
+
+    def element(self, stack: Stack, logical_id: str) -> CfnElement:
+        """The element of stack that had logical_id"""
+        resource = self.template(stack).get("Resources", {}).get(logical_id, {})
+        if path := resource.get("Metadata", {}).get("aws:cdk:path"):
+            scope = stack.node.root
+            for part in path.split("/"):
+                if not (scope := scope.node.try_find_child(part)):
+                    break
+            if scope and CfnElement.is_cfn_element(scope) and stack.resolve(scope.logical_id) == logical_id:
+                return scope
+
+        if stack.node.path not in self.elements:
+            self.elements[stack.node.path] = {
+                stack.resolve(element.logical_id): element for element in self._stack_elements(stack)
+            }
+        if not (element := self.elements[stack.node.path].get(logical_id)):
+            raise ReplayError(f"{stack.node.path} has nothing with the logical ID {logical_id}")
+        return element
+
+    def nested_stack(self, stack: Stack, logical_id: str) -> NestedStack:
+        """The nested stack whose resource in stack had logical_id"""
+        for child in stack.node.children:
+            if (
+                NestedStack.is_nested_stack(child)
+                and stack.resolve(child.nested_stack_resource.logical_id) == logical_id
+            ):
+                return child
+        raise ReplayError(f"{stack.node.path} has no nested stack with the logical ID {logical_id}")
+
+    def resolve(self, stack: Stack, expression) -> str:
+        """A token for a Ref or Fn::GetAtt as it was in stack's template"""
+        if not (isinstance(expression, dict) and len(expression) == 1):
+            raise ReplayError(f"Can't resolve {expression} in {stack.node.path}")
+        ((function, argument),) = expression.items()
+        template = self.template(stack)
+
+        if function == "Ref" and argument in template.get("Resources", {}):
+            element = self.element(stack, argument)
+            if isinstance(element, CfnResource):
+                return element.ref
+
+        elif function == "Ref" and argument in template.get("Parameters", {}) and NestedStack.is_nested_stack(stack):
+            # Passed in by the parent stack
+            parent = stack.nested_stack_parent
+            resource = self.template(parent)["Resources"].get(parent.resolve(stack.nested_stack_resource.logical_id))
+            if parameter := (resource or {}).get("Properties", {}).get("Parameters", {}).get(argument):
+                return self.resolve(parent, parameter)
+
+        elif function == "Fn::GetAtt" and isinstance(argument, list) and len(argument) == 2:
+            logical_id, attribute = argument
+            prefix, _, name = attribute.partition(".")
+            if prefix == "Outputs":
+                # Passed out by a nested stack
+                nested = self.nested_stack(stack, logical_id)
+                if output := self.template(nested).get("Outputs", {}).get(name):
+                    return self.resolve(nested, output["Value"])
+            else:
+                element = self.element(stack, logical_id)
+                if isinstance(element, CfnResource):
+                    return Token.as_string(element.get_att(attribute))
+
+        raise ReplayError(f"Can't resolve {expression} in {stack.node.path}")
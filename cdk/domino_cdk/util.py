@@ -1,21 +1,42 @@
-from filecmp import cmp
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from glob import glob
+from hashlib import sha256
 from io import BytesIO
+from json import dumps as json_dumps
 from json import loads as json_loads
-from os.path import basename, isfile
+from os import getpid, makedirs, remove, replace, stat, walk
+from os.path import abspath, basename, dirname, getsize, isdir, isfile
 from os.path import join as path_join
-from subprocess import run
+from os.path import normpath, relpath
+from shutil import copyfile
 from time import time
-from typing import List
+from typing import Any, Dict, List, Optional
 from urllib.parse import urlparse
+from zipfile import ZIP_DEFLATED, BadZipFile, ZipFile, ZipInfo
 
+import boto3
+from boto3.s3.transfer import TransferConfig
 from ruamel.yaml import YAML
+from ruamel.yaml.comments import CommentedBase
 
 
 class ExternalCommandException(Exception):
     """Exception running spawned external commands"""
 
 
+# zip can't represent earlier timestamps; fixed so the same directory always zips to the same bytes
+ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+
+# Content-addressed asset objects live under this prefix as <sha256><extension>
+ASSET_KEY_PREFIX = "assets/"
+UPLOAD_MANIFEST = "upload-manifest.json"
+TEMPLATE_INDEX = "{stack_name}.templates.json"
+# Beside the asset directory rather than in it, which is uploaded as is
+TEMPLATE_INDEX_DIR = "{asset_dir}.templates"
+
+MERGE_LIST_STRATEGIES = ["replace", "append", "by_key"]
+
+
 class DominoCdkUtil:
     @staticmethod
     def load_manifest(manifest_file):
@@ -31,31 +52,185 @@ class DominoCdkUtil:
                 raise KeyError(f"Cannot parse CDK asset manifest {manifest_file}!")
             return {"name": stack_name, "region": aws_region, "metadata": metadata}
 
+    @staticmethod
+    def zip_directory(src_dir: str, dest: str, compression_level: int = 9, comment: str = ""):
+        """
+        Deterministically zip src_dir's contents to dest: entries are sorted and timestamped ZIP_EPOCH,
+        keeping only their permission bits, so identical directories always produce identical archives.
+        Top-level dotfiles are left out, like the ./* glob assets used to be zipped with.
+        """
+        if not isdir(src_dir):
+            raise FileNotFoundError(f"Asset directory {src_dir} does not exist")
+
+        entries = []
+        for root, dirs, files in walk(src_dir, followlinks=True):
+            if root == src_dir:
+                dirs[:] = [d for d in dirs if not d.startswith(".")]
+                files = [f for f in files if not f.startswith(".")]
+            dirs.sort()
+            entries.extend(path_join(root, d) for d in dirs)
+            entries.extend(path_join(root, f) for f in sorted(files))
+
+        tmp = f"{dest}.{getpid()}.tmp"
+        try:
+            with ZipFile(tmp, "w", ZIP_DEFLATED, compresslevel=compression_level) as z:
+                for entry in entries:
+                    name = relpath(entry, src_dir).replace("\\", "/")
+                    mode = stat(entry).st_mode & 0o777
+                    if isdir(entry):
+                        info = ZipInfo(f"{name}/", ZIP_EPOCH)
+                        info.external_attr = (0o40000 | mode) << 16 | 0x10
+                        z.writestr(info, b"")
+                    else:
+                        info = ZipInfo(name, ZIP_EPOCH)
+                        info.external_attr = (0o100000 | mode) << 16
+                        info.compress_type = ZIP_DEFLATED
+                        with open(entry, "rb") as f:
+                            z.writestr(info, f.read(), compresslevel=compression_level)
+                z.comment = comment.encode()
+            replace(tmp, dest)
+        finally:
+            if isfile(tmp):
+                remove(tmp)
+
+    @staticmethod
+    def zipped_source_hash(zip_file: str) -> Optional[str]:
+        """The sourceHash recorded in an asset zip written by generate_asset_parameters, if any"""
+        try:
+            with ZipFile(zip_file) as z:
+                return z.comment.decode()
+        except (FileNotFoundError, BadZipFile):
+            return None
+
+    @staticmethod
+    def file_sha256(path: str) -> str:
+        h = sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                h.update(chunk)
+        return h.hexdigest()
+
+    @classmethod
+    def add_to_upload_manifest(cls, upload_manifest: dict, asset_dir: str, path: str, key: str = None) -> str:
+        """
+        Add asset_dir/path to upload_manifest (sha256 -> object) and return its key, which is content-addressed
+        unless given
+        """
+        source = path_join(asset_dir, path)
+        digest = cls.file_sha256(source)
+        if not key:
+            extension = ".zip" if path.endswith(".zip") else ".json"
+            key = f"{ASSET_KEY_PREFIX}{digest}{extension}"
+        upload_manifest[digest] = {"key": key, "source": path, "size": getsize(source)}
+        return key
+
     @classmethod
-    def generate_asset_parameters(cls, asset_dir: str, asset_bucket: str, cfg: dict = None):
+    def generate_asset_parameters(
+        cls,
+        asset_dir: str,
+        asset_bucket: str,
+        cfg: dict = None,
+        compression_level: int = 9,
+        jobs: Optional[int] = None,
+        upload_manifest: Optional[dict] = None,
+    ):
+        """
+        When given upload_manifest, asset objects are keyed by the sha256 of their contents rather than their
+        filename, and each one is added to the manifest.
+        """
         if not cfg:
             cfg = cls.load_manifest(path_join(asset_dir, "manifest.json"))
 
         parameters = {}
+        to_zip = []
+        keys = {}
 
         for c in cfg["metadata"]:
             if c["type"] == "aws:cdk:asset":
                 d = c["data"]
                 path = d['path']
-                if ".zip" not in path and ".json" not in path and not isfile(path_join(asset_dir, "path.zip")):
-                    shell_command = f"cd {asset_dir}/{path}/ && zip -9r {path}.zip ./* && mv {path}.zip ../"
-                    output = run(shell_command, shell=True, capture_output=True)
-                    if output.returncode:
-                        raise ExternalCommandException(
-                            f"Error running: {shell_command}\nretval: {output.returncode}\nstdout: {output.stdout.decode()}\nstderr: {output.stderr.decode()}"
-                        )
+                if ".zip" not in path and ".json" not in path:
+                    src_dir = path_join(asset_dir, path)
+                    zip_file = f"{src_dir}.zip"
+                    # Each zip records the sourceHash it was built from, so unchanged assets are skipped
+                    if cls.zipped_source_hash(zip_file) != d['sourceHash']:
+                        to_zip.append((src_dir, zip_file, compression_level, d['sourceHash']))
                     path = f"{path}.zip"
                 parameters[d['artifactHashParameter']] = d['sourceHash']
                 parameters[d['s3BucketParameter']] = asset_bucket
                 parameters[d['s3KeyParameter']] = f"||{path}"
+                keys[d['s3KeyParameter']] = path
+
+        if len(to_zip) == 1 or jobs == 1:
+            for args in to_zip:
+                cls.zip_directory(*args)
+        elif to_zip:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                # list() to surface any worker's exception
+                list(pool.map(cls.zip_directory, *zip(*to_zip)))
+
+        # Assets have to be zipped before they can be hashed
+        if upload_manifest is not None:
+            for parameter, path in keys.items():
+                parameters[parameter] = f"||{cls.add_to_upload_manifest(upload_manifest, asset_dir, path)}"
 
         return parameters
 
+    @classmethod
+    def store_template(cls, asset_dir: str, stack_name: str, retention: int = 10) -> str:
+        """
+        Copy the stack's template to a timestamped filename (<stack_name>-<timestamp>.template.json), so
+        terraform sees a change whenever the template does. An index of content hash -> timestamped template
+        lets any prior version be reused rather than copied again. Only the retention most recently used
+        templates are kept (0 keeps them all). Returns the timestamped template's filename.
+
+        The index lives in <asset_dir>.templates, so it isn't uploaded with the assets.
+        """
+        template_file = path_join(asset_dir, f"{stack_name}.template.json")
+        index_dir = TEMPLATE_INDEX_DIR.format(asset_dir=normpath(abspath(asset_dir)))
+        index_file = path_join(index_dir, TEMPLATE_INDEX.format(stack_name=stack_name))
+        # Where the index used to be kept
+        old_index_file = path_join(asset_dir, TEMPLATE_INDEX.format(stack_name=stack_name))
+        now = int(time())
+
+        try:
+            with open(index_file if isfile(index_file) else old_index_file) as f:
+                index = json_loads(f.read())
+        except FileNotFoundError:
+            # Adopt templates generated before there was an index, so they're reused and pruned too
+            index = {}
+            for existing in glob(path_join(asset_dir, f"{stack_name}-*.template.json")):
+                index[cls.file_sha256(existing)] = {"filename": basename(existing), "last_used": 0}
+
+        digest = cls.file_sha256(template_file)
+        if digest not in index or not isfile(path_join(asset_dir, index[digest]["filename"])):
+            taken = {entry["filename"] for entry in index.values()}
+            ts = now
+            while (filename := f"{stack_name}-{ts}.template.json") in taken or isfile(path_join(asset_dir, filename)):
+                ts += 1
+            copyfile(template_file, path_join(asset_dir, filename))
+            index[digest] = {"filename": filename}
+        index[digest]["last_used"] = now
+
+        if retention:
+            by_use = sorted(index, key=lambda d: (index[d]["last_used"], index[d]["filename"]), reverse=True)
+            for stale in by_use[retention:]:
+                if stale != digest:
+                    try:
+                        remove(path_join(asset_dir, index.pop(stale)["filename"]))
+                    except FileNotFoundError:
+                        pass
+
+        makedirs(index_dir, exist_ok=True)
+        tmp = f"{index_file}.{getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(json_dumps(index, indent=4, sort_keys=True))
+        replace(tmp, index_file)
+        if isfile(old_index_file):
+            remove(old_index_file)
+
+        return index[digest]["filename"]
+
     # disable_random_templates is a negative flag that's False by default to facilitate the naive cli access (ie any parameter given triggers it)
     @classmethod
     def generate_terraform_bootstrap(
@@ -69,6 +244,11 @@ class DominoCdkUtil:
         iam_role_arn: str = "",
         iam_policy_paths: List[str] = None,
         disable_rollback: bool = False,
+        compression_level: int = 9,
+        jobs: Optional[int] = None,
+        content_addressed_assets: bool = False,
+        external_asset_upload: bool = False,
+        template_retention: int = 10,
     ):
         cfg = cls.load_manifest(path_join(asset_dir, "manifest.json"))
         stack_name = cfg["name"]
@@ -79,25 +259,30 @@ class DominoCdkUtil:
             if aws_region == "unknown-region":
                 raise Exception("Please provide region")
 
-        asset_parameters = cls.generate_asset_parameters(asset_dir, asset_bucket, cfg)
+        upload_manifest = {} if content_addressed_assets else None
+        asset_parameters = cls.generate_asset_parameters(
+            asset_dir, asset_bucket, cfg, compression_level, jobs, upload_manifest
+        )
         template_filename = path_join(asset_dir, f"{stack_name}.template.json")
 
         if not disable_random_templates:
-            template_files = sorted(glob(f"{asset_dir}/{stack_name}-*.template.json"))
-            last_template_file = template_files[-1] if template_files else None
-
-            # Generate new timestamped template file?
-            if not last_template_file or not cmp(template_filename, last_template_file):
-                ts_template_filename = f"{stack_name}-{int(time())}.template.json"
-                shell_command = f"cp {template_filename} {asset_dir}/{ts_template_filename}"
-                output = run(shell_command, shell=True, capture_output=True)
-                if output.returncode:
-                    raise ExternalCommandException(
-                        f"Error running: {shell_command}\nretval: {output.returncode}\nstdout: {output.stdout.decode()}\nstderr: {output.stderr.decode()}"
-                    )
-                template_filename = ts_template_filename
-            else:
-                template_filename = last_template_file
+            template_filename = cls.store_template(asset_dir, stack_name, template_retention)
+
+        content_addressed_config = {}
+        if content_addressed_assets:
+            # The root template keeps its filename, terraform passes it to CloudFormation as template_filename
+            cls.add_to_upload_manifest(
+                upload_manifest, asset_dir, basename(template_filename), basename(template_filename)
+            )
+            with open(path_join(asset_dir, UPLOAD_MANIFEST), "w") as f:
+                f.write(
+                    json_dumps({"bucket": asset_bucket, "region": aws_region, "objects": upload_manifest}, indent=4)
+                )
+            content_addressed_config = {
+                "asset_manifest": {k: {"key": v["key"], "source": v["source"]} for k, v in upload_manifest.items()},
+                "upload_assets": not external_asset_upload,
+            }
+
         return {
             "module": {
                 "cdk": {
@@ -112,6 +297,7 @@ class DominoCdkUtil:
                     "parameters": asset_parameters,
                     "template_filename": basename(template_filename),
                     "output_dir": output_dir,
+                    **content_addressed_config,
                 },
             },
             "output": {
@@ -145,39 +331,181 @@ class DominoCdkUtil:
             },
         }
 
+    @staticmethod
+    def upload_assets(
+        manifest_file: str,
+        asset_bucket: str = None,
+        asset_dir: str = None,
+        jobs: int = 8,
+        multipart_threshold: int = 64 * 1024 * 1024,
+        s3_client=None,
+    ) -> dict:
+        """
+        Upload the objects in an upload manifest that aren't in the bucket yet. Content-addressed keys never change
+        contents, so anything already under ASSET_KEY_PREFIX is skipped; anything else is always uploaded.
+        """
+        with open(manifest_file) as f:
+            manifest = json_loads(f.read())
+        asset_bucket = asset_bucket or manifest["bucket"]
+        asset_dir = asset_dir or dirname(manifest_file)
+        s3 = s3_client or boto3.client("s3", region_name=manifest.get("region"))
+
+        existing = set()
+        for page in s3.get_paginator("list_objects_v2").paginate(Bucket=asset_bucket, Prefix=ASSET_KEY_PREFIX):
+            existing.update(o["Key"] for o in page.get("Contents", []))
+
+        objects = sorted(manifest["objects"].values(), key=lambda o: o["key"])
+        missing = [o for o in objects if o["key"] not in existing]
+
+        transfer_config = TransferConfig(multipart_threshold=multipart_threshold, max_concurrency=jobs)
+
+        def upload(o: dict):
+            s3.upload_file(path_join(asset_dir, o["source"]), asset_bucket, o["key"], Config=transfer_config)
+
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            list(pool.map(upload, missing))
+
+        return {
+            "uploaded": [o["key"] for o in missing],
+            "skipped": [o["key"] for o in objects if o["key"] in existing],
+            "bytes_uploaded": sum(o["size"] for o in missing),
+        }
+
     @classmethod
-    def deep_merge(cls, *dictionaries) -> dict:
+    def deep_merge(cls, *dictionaries, list_strategy: str = "replace", list_key: str = "name") -> dict:  # noqa: C901
         """
         Recursive dict merge.
 
         Takes any number of dictionaries as arguments. Each subsequent dictionary will be overlaid on the previous ones
         before. Therefore, the rightmost dictionary's value will take precedence. None values will be interpreted as
         empty dictionaries, but otherwise arguments provided must be of the dict type.
+
+        Lists are handled according to list_strategy:
+          replace: the rightmost list wins, like any other value
+          append: lists overlaid on lists are concatenated
+          by_key: dict items sharing a list_key value are merged, other items are appended
+
+        All the dictionaries are merged in a single pass, level by level, without recursion. Values only one
+        dictionary provides are shared with the result rather than copied, so copy before mutating the result.
         """
+        if list_strategy not in MERGE_LIST_STRATEGIES:
+            raise ValueError(f"Unknown list strategy {list_strategy}, should be one of {MERGE_LIST_STRATEGIES}")
 
-        def check_type(dx) -> dict:
+        layers = []
+        for dx in dictionaries:
             if dx is None:
                 dx = {}
             if not isinstance(dx, dict):
                 raise TypeError("Must provide only dictionaries!")
-            return dx
+            layers.append(dx)
+
+        if not layers:
+            return {}
+        if len(layers) == 1:
+            return layers[0]
 
-        def merge(alpha, omega, key):
-            if isinstance(alpha.get(key), dict) and isinstance(omega[key], dict):
-                return cls.deep_merge(alpha[key], omega[key])
-            else:
-                return omega[key]
+        # (layers to merge, dict to merge them into); merging a level queues up the levels below it
+        work: List[tuple] = []
 
-        def overlay(alpha: dict, omega: dict) -> dict:
-            return {**alpha, **{k: merge(alpha, omega, k) for k, _ in omega.items()}}
+        def trailing(values: list, tp) -> list:
+            """The values of type tp overlaid since the last value of another type, ie what gets merged"""
+            i = len(values)
+            while i and isinstance(values[i - 1], tp):
+                i -= 1
+            return values[i:]
 
-        if 0 == len(dictionaries):
-            return {}
-        base_dict = check_type(dictionaries[0])
-        return base_dict if len(dictionaries) == 1 else overlay(base_dict, cls.deep_merge(*dictionaries[1:]))
+        def merged(values: list):
+            if len(values) == 1:
+                return values[0]
+            if isinstance(values[0], dict):
+                out: dict = {}
+                work.append((values, out))
+                return out
+            if list_strategy == "append":
+                return [x for v in values for x in v]
+
+            items = []
+            keyed: Dict[Any, list] = {}
+            for v in values:
+                for x in v:
+                    if isinstance(x, dict) and list_key in x:
+                        if x[list_key] in keyed:
+                            keyed[x[list_key]][1].append(x)
+                            continue
+                        keyed[x[list_key]] = [len(items), [x]]
+                    items.append(x)
+            for i, group in keyed.values():
+                items[i] = merged(group)
+            return items
+
+        result: dict = {}
+        work.append((layers, result))
+        while work:
+            level, out = work.pop()
+            values: Dict[Any, list] = {}
+            for dx in level:
+                for k, v in dx.items():
+                    values.setdefault(k, []).append(v)
+            for k, vs in values.items():
+                if isinstance(vs[-1], dict):
+                    out[k] = merged(trailing(vs, dict))
+                elif isinstance(vs[-1], list) and list_strategy != "replace":
+                    out[k] = merged(trailing(vs, list))
+                else:
+                    out[k] = vs[-1]
+
+        return result
+
+    @staticmethod
+    def record_context(key: str, values: dict, context_file: str = "cdk.context.json") -> bool:
+        """
+        Merge values into key of cdk.context.json, which the cdk CLI (and fleet.py) hands to every later synth.
+        Returns whether anything changed, only writing the file if so.
+        """
+        context = {}
+        if isfile(context_file):
+            with open(context_file) as f:
+                context = json_loads(f.read())
+        recorded = {**context.get(key, {}), **values}
+        if recorded == context.get(key):
+            return False
+        context[key] = recorded
+        tmp = f"{context_file}.{getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(json_dumps(context, indent=2))
+        replace(tmp, context_file)
+        return True
 
     @staticmethod
-    def ruamel_dump(data: dict):
+    def yaml_load(stream):
+        """Load YAML without round-trip comment tracking, through libyaml when ruamel's C extension is installed"""
+        return YAML(typ="safe").load(stream)
+
+    @staticmethod
+    def yaml_dumper(data) -> YAML:
+        """
+        The round-trip dumper only for data carrying comments. Plain data skips the comment machinery and goes
+        through the safe representer, set up to emit exactly what the round-trip dumper would. libyaml's emitter
+        is left out on purpose: it quotes, folds and pads some scalars differently, which would change the
+        cdk_config stack output.
+        """
+        if isinstance(data, CommentedBase):
+            return YAML()
+
+        yaml = YAML(typ="safe", pure=True)
+        yaml.default_flow_style = False
+        yaml.sort_base_mapping_type_on_output = False
+        yaml.representer.add_representer(
+            type(None), lambda representer, _: representer.represent_scalar("tag:yaml.org,2002:null", "")
+        )
+        return yaml
+
+    @classmethod
+    def yaml_dump(cls, data, stream):
+        cls.yaml_dumper(data).dump(data, stream)
+
+    @classmethod
+    def ruamel_dump(cls, data: dict):
         buf = BytesIO()
-        YAML().dump(data, buf)
+        cls.yaml_dump(data, buf)
         return buf.getvalue().decode()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+from multiprocessing import get_context
+from os import getpid, makedirs
+from os.path import abspath, basename, dirname, join, splitext
+from time import perf_counter
+from traceback import format_exc
+from typing import Optional
+
+from domino_cdk.config import config_loader, lookup_requirements
+from domino_cdk.lookups import DominoLookupCache
+from domino_cdk.synth_cache import DominoSynthCache, project_context
+from domino_cdk.util import DominoCdkUtil
+
+FLEET_REPORT = "fleet-report.json"
+
+# Seconds each worker process spent starting the jsii runtime and loading the construct libraries
+worker_startup = None
+
+
+def start_worker(lookup_cache: str, offline: bool):
+    global worker_startup
+    start = perf_counter()
+    DominoLookupCache.configure(cache_dir=lookup_cache, offline=offline)
+    import aws_cdk  # noqa: F401
+
+    import domino_cdk.domino_stack  # noqa: F401
+
+    worker_startup = perf_counter() - start
+
+
+def load_deployment(config_file: str, offline: bool):
+    with open(config_file) as f:
+        raw_cfg = DominoCdkUtil.yaml_load(f)
+    if not offline:
+        DominoLookupCache.for_env(raw_cfg.get("aws_account_id"), raw_cfg.get("aws_region")).prefetch(
+            **lookup_requirements(raw_cfg)
+        )
+    return config_loader(raw_cfg)
+
+
+def synth_cache_for(cfg, outdir: str, context: dict) -> DominoSynthCache:
+    return DominoSynthCache(
+        outdir,
+        cfg,
+        context,
+        DominoLookupCache.for_env(cfg.aws_account_id, cfg.aws_region).cache_file,
+        app_dir=dirname(abspath(__file__)),
+    )
+
+
+def synth_deployment(config_file: str, outdir: str, context: dict, offline: bool, synth_cache: bool) -> dict:
+    """Synthesize one config into outdir in this worker's already running jsii runtime, timing each step"""
+    from aws_cdk import App, Environment
+
+    from domino_cdk.domino_stack import DominoStack
+
+    global worker_startup
+    result = {"config": config_file, "outdir": outdir, "pid": getpid(), "worker_startup": worker_startup}
+    # Only the first deployment a worker synthesizes pays for its startup
+    worker_startup = None
+
+    start = perf_counter()
+    try:
+        cfg = load_deployment(config_file, offline)
+        result["name"] = cfg.name
+        result["load"] = perf_counter() - start
+        # Keyed before building, as provisioners fill in parts of the config
+        cache = synth_cache_for(cfg, outdir, context) if synth_cache else None
+
+        mark = perf_counter()
+        app = App(outdir=outdir, context=context)
+        stack = DominoStack(
+            app,
+            cfg.name,
+            env=Environment(region=cfg.aws_region, account=cfg.aws_account_id),
+            cfg=cfg,
+            nest=context.get("singlestack") or True,
+            synth_cache=cache,
+        )
+        result["construct"] = perf_counter() - mark
+        if cache:
+            result["replayed"] = cache.replayed
+        result["context_records"] = stack.context_records
+
+        mark = perf_counter()
+        app.synth()
+        result["synth"] = perf_counter() - mark
+
+        if cache:
+            cache.save()
+    except Exception:
+        result["error"] = format_exc()
+
+    result["total"] = perf_counter() - start
+    return result
+
+
+def cached_deployment(config_file: str, outdir: str, context: dict, offline: bool) -> Optional[dict]:
+    """The result for config_file if its previous output is still current, checked without starting jsii"""
+    start = perf_counter()
+    try:
+        cfg = load_deployment(config_file, offline)
+        if not synth_cache_for(cfg, outdir, context).reusable():
+            return None
+    except Exception:
+        # Leave it to the worker, to be reported along with the timings
+        return None
+    return {
+        "config": config_file,
+        "outdir": outdir,
+        "pid": getpid(),
+        "worker_startup": None,
+        "name": cfg.name,
+        "cached": True,
+        "total": perf_counter() - start,
+    }
+
+
+def print_report(report: dict):
+    print(f"{'deployment':<32}{'pid':>8}{'startup':>9}{'load':>8}{'build':>8}{'synth':>8}{'total':>8}")
+
+    def fmt(t):
+        return f"{t:8.2f}" if t is not None else f"{'-':>8}"
+
+    for r in report["deployments"]:
+        name = r.get("name") or basename(r["config"])
+        status = " cached" if r.get("cached") else " FAILED" if "error" in r else ""
+        print(
+            f"{name:<32}{r['pid']:>8} {fmt(r['worker_startup'])}{fmt(r.get('load'))}{fmt(r.get('construct'))}"
+            f"{fmt(r.get('synth'))}{fmt(r['total'])}{status}"
+        )
+    print(f"\n{len(report['deployments'])} deployments in {report['wall_time']:.2f}s with {report['jobs']} workers")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Synthesize a directory of deployment configs, each into its own cdk.out",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("configs", help="Directory of deployment configs (*.yaml, *.yml)")
+    parser.add_argument("-o", "--outdir", help="Each config synthesizes to <outdir>/<config name>", default="cdk.fleet")
+    parser.add_argument(
+        "-j", "--jobs", help="Worker processes, each starting the jsii runtime once", default=4, type=int
+    )
+    parser.add_argument(
+        "-c", "--context", help="Context for every app, as key=value", action="append", default=[], metavar="KEY=VALUE"
+    )
+    parser.add_argument("--lookup-cache", help="Lookup cache directory (see app.py)", default="cdk.lookups")
+    parser.add_argument(
+        "--offline", help="Only use cached lookups, never the network", default=False, action="store_true"
+    )
+    parser.add_argument(
+        "--synth-cache",
+        help="Skip deployments whose previous output is still current (see app.py -c synth_cache)",
+        default=False,
+        action="store_true",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    config_files = sorted(glob(join(args.configs, "*.yaml")) + glob(join(args.configs, "*.yml")))
+    if not config_files:
+        exit(f"No configs found in {args.configs}")
+
+    overrides = dict(c.split("=", 1) for c in args.context)
+    overrides["lookup_cache"] = args.lookup_cache
+    if args.offline:
+        overrides["offline"] = "true"
+    # What cdk synth would hand app.py, so the output and synth cache keys match a cdk synth of the same config
+    context = project_context(overrides)
+
+    start = perf_counter()
+    DominoLookupCache.configure(cache_dir=args.lookup_cache, offline=args.offline)
+    outdirs = {fn: join(args.outdir, splitext(basename(fn))[0]) for fn in config_files}
+    results = {}
+    if args.synth_cache:
+        for fn in config_files:
+            if cached := cached_deployment(fn, outdirs[fn], context, args.offline):
+                results[fn] = cached
+
+    to_synth = [fn for fn in config_files if fn not in results]
+    jobs = min(args.jobs, len(to_synth))
+    if to_synth:
+        # Spawned rather than forked: a forked worker would share any jsii runtime already running in this process
+        with ProcessPoolExecutor(
+            max_workers=jobs,
+            mp_context=get_context("spawn"),
+            initializer=start_worker,
+            initargs=(args.lookup_cache, args.offline),
+        ) as pool:
+            futures = {
+                fn: pool.submit(synth_deployment, fn, outdirs[fn], context, args.offline, args.synth_cache)
+                for fn in to_synth
+            }
+            results.update({fn: f.result() for fn, f in futures.items()})
+    results = [results[fn] for fn in config_files]
+
+    # Recorded by the parent, rather than each worker writing cdk.context.json (see app.py)
+    records: dict = {}
+    for r in results:
+        for key, values in r.get("context_records", {}).items():
+            records.setdefault(key, {})[r["name"]] = values
+    for key, values in records.items():
+        DominoCdkUtil.record_context(key, values)
+
+    report = {
+        "jobs": jobs,
+        "wall_time": perf_counter() - start,
+        "deployments": results,
+    }
+    makedirs(args.outdir, exist_ok=True)
+    with open(join(args.outdir, FLEET_REPORT), "w") as f:
+        f.write(json.dumps(report, indent=4))
+
+    print_report(report)
+    for r in results:
+        if "error" in r:
+            print(f"\n{r['config']} failed:\n{r['error']}")
+    if any("error" in r for r in results):
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -46,6 +46,12 @@ default_config = DominoCDKConfig(
             removal_policy=False,
         ),
         removal_policy_destroy=False,
+        performance_mode="general_purpose",
+        throughput_mode="elastic",
+        provisioned_throughput_mibps=None,
+        transition_to_ia=None,
+        transition_to_primary_storage_class=False,
+        replication_overwrite_protection=True,
     ),
     route53=Route53(zone_ids=[]),
     eks=EKS(
@@ -72,6 +78,15 @@ default_config = DominoCDKConfig(
                 ssm_agent=True,
                 taints={},
                 spot=False,
+                instance_requirements=None,
+                on_demand_allocation_strategy=None,
+                spot_allocation_strategy=None,
+                capacity_rebalance=False,
+                disk_type="gp3",
+                disk_iops=None,
+                disk_throughput=None,
+                stack=None,
+                warm_pool=None,
             ),
             'compute-0': EKS.UnmanagedNodegroup(
                 disk_size=1000,
@@ -89,6 +104,15 @@ default_config = DominoCDKConfig(
                 ssm_agent=True,
                 taints={},
                 spot=False,
+                instance_requirements=None,
+                on_demand_allocation_strategy=None,
+                spot_allocation_strategy=None,
+                capacity_rebalance=False,
+                disk_type="gp3",
+                disk_iops=None,
+                disk_throughput=None,
+                stack=None,
+                warm_pool=None,
             ),
             'gpu-0': EKS.UnmanagedNodegroup(
                 disk_size=1000,
@@ -106,9 +130,19 @@ default_config = DominoCDKConfig(
                 ssm_agent=True,
                 taints={'nvidia.com/gpu': 'true:NoSchedule'},
                 spot=False,
+                instance_requirements=None,
+                on_demand_allocation_strategy=None,
+                spot_allocation_strategy=None,
+                capacity_rebalance=False,
+                disk_type="gp3",
+                disk_iops=None,
+                disk_throughput=None,
+                stack=None,
+                warm_pool=None,
             ),
         },
         secrets_encryption_key_arn=None,
+        share_launch_templates=True,
     ),
     s3=S3(
         buckets=S3.BucketList(
@@ -232,6 +266,12 @@ legacy_config = DominoCDKConfig(
             removal_policy='DESTROY',
         ),
         removal_policy_destroy=None,
+        performance_mode="general_purpose",
+        throughput_mode="bursting",
+        provisioned_throughput_mibps=None,
+        transition_to_ia=None,
+        transition_to_primary_storage_class=False,
+        replication_overwrite_protection=True,
     ),
     route53=Route53(zone_ids=[]),
     eks=EKS(
@@ -258,6 +298,15 @@ legacy_config = DominoCDKConfig(
                 ssm_agent=True,
                 taints={},
                 spot=False,
+                instance_requirements=None,
+                on_demand_allocation_strategy=None,
+                spot_allocation_strategy=None,
+                capacity_rebalance=False,
+                disk_type="gp3",
+                disk_iops=None,
+                disk_throughput=None,
+                stack=0,
+                warm_pool=None,
             ),
             'compute-0': EKS.UnmanagedNodegroup(
                 disk_size=100,
@@ -275,6 +324,15 @@ legacy_config = DominoCDKConfig(
                 ssm_agent=True,
                 taints={},
                 spot=False,
+                instance_requirements=None,
+                on_demand_allocation_strategy=None,
+                spot_allocation_strategy=None,
+                capacity_rebalance=False,
+                disk_type="gp3",
+                disk_iops=None,
+                disk_throughput=None,
+                stack=0,
+                warm_pool=None,
             ),
             'gpu-0': EKS.UnmanagedNodegroup(
                 disk_size=100,
@@ -292,9 +350,19 @@ legacy_config = DominoCDKConfig(
                 ssm_agent=True,
                 taints={'nvidia.com/gpu': 'true:NoSchedule'},
                 spot=False,
+                instance_requirements=None,
+                on_demand_allocation_strategy=None,
+                spot_allocation_strategy=None,
+                capacity_rebalance=False,
+                disk_type="gp3",
+                disk_iops=None,
+                disk_throughput=None,
+                stack=0,
+                warm_pool=None,
             ),
         },
         secrets_encryption_key_arn=None,
+        share_launch_templates=False,
     ),
     s3=S3(
         buckets=S3.BucketList(
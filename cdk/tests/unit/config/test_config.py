@@ -2,10 +2,11 @@ import unittest
 from copy import deepcopy
 from unittest.mock import patch
 
+from botocore.exceptions import ClientError
 from semantic_version import Version
 
 from domino_cdk import __version__
-from domino_cdk.config import config_loader
+from domino_cdk.config import config_loader, lookup_requirements
 from domino_cdk.config.template import config_template
 
 from . import default_config, legacy_config, legacy_template
@@ -111,6 +112,74 @@ class TestConfig(unittest.TestCase):
             ):
                 config_loader(c)
 
+    def test_eks_ng_disk_performance(self):
+        limits = {"m5.2xlarge": {"MaximumIops": 18750, "MaximumThroughputInMBps": 593.75}, "t2.large": None}
+        with patch("domino_cdk.config.DominoCDKConfig.get_vpc_azs") as get_vpc_azs, patch(
+            "domino_cdk.lookups.DominoLookupCache.ebs_limits", side_effect=lambda it: limits[it]
+        ) as ebs_limits:
+            get_vpc_azs.return_value = ["us-west-2a", "us-west-2b", "us-west-2c"]
+
+            c = config_template().render()
+            c["aws_region"] = "us-west-2"
+            config_loader(deepcopy(c))
+            ebs_limits.assert_not_called()
+
+            c["eks"]["unmanaged_nodegroups"]["platform-0"].update(disk_iops=16000, disk_throughput=550)
+            config_loader(deepcopy(c))
+            ebs_limits.assert_called_with("m5.2xlarge")
+
+            c["eks"]["unmanaged_nodegroups"]["platform-0"]["disk_throughput"] = 570
+            with self.assertRaisesRegex(ValueError, r"disk_throughput of 570 MiB/s is more than instance type"):
+                config_loader(deepcopy(c))
+
+            c["eks"]["unmanaged_nodegroups"]["platform-0"].update(disk_throughput=None, instance_types=["t2.large"])
+            with self.assertRaisesRegex(ValueError, "instance type t2.large isn't EBS optimized"):
+                config_loader(deepcopy(c))
+
+            ebs_limits.side_effect = ClientError(
+                {
+                    "Error": {
+                        "Code": "InvalidInstanceType",
+                        "Message": "The following supplied instance types do not exist: [t2.bogus]",
+                    }
+                },
+                "DescribeInstanceTypes",
+            )
+            c["eks"]["unmanaged_nodegroups"]["platform-0"]["instance_types"] = ["t2.bogus"]
+            with self.assertRaisesRegex(
+                ValueError, "Nodegroup platform-0 instance type t2.bogus couldn't be looked up: .*InvalidInstanceType"
+            ):
+                config_loader(deepcopy(c))
+
+    def test_lookup_requirements(self):
+        c = config_template().render()
+        self.assertEqual(
+            lookup_requirements(c), {"eks_version": "1.24", "instance_requirements": [], "ebs_instance_types": []}
+        )
+        c["eks"]["unmanaged_nodegroups"]["platform-0"]["disk_iops"] = 16000
+        self.assertEqual(lookup_requirements(c)["ebs_instance_types"], ["m5.2xlarge"])
+
+        managed = deepcopy(c["eks"]["unmanaged_nodegroups"]["compute-0"])
+        managed.update(
+            instance_types=[], instance_requirements={"vcpu_count": {"min": 4}, "memory_mib": {"min": 16384}}
+        )
+        c["eks"]["managed_nodegroups"] = {
+            "compute": managed,
+            "gpu": {**deepcopy(managed), "ami_id": "ami-123"},
+            "broken": {**deepcopy(managed), "instance_requirements": {"vcpu_count": {"min": 4}}},
+        }
+        request = {"VCpuCount": {"Min": 4}, "MemoryMiB": {"Min": 16384}}
+        self.assertEqual(
+            lookup_requirements(c),
+            {
+                "eks_version": "1.24",
+                "instance_requirements": [(request, None), (request, "ami-123")],
+                "ebs_instance_types": ["m5.2xlarge"],
+            },
+        )
+        # Read without consuming the config
+        self.assertEqual(c["eks"]["managed_nodegroups"]["compute"]["instance_requirements"]["vcpu_count"], {"min": 4})
+
     def test_istio(self):
         c = config_template(istio_compatible=True)
         self.assertEqual(["m5.4xlarge"], c.eks.unmanaged_nodegroups["platform-0"].instance_types)
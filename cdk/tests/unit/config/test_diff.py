@@ -0,0 +1,82 @@
+import unittest
+from copy import deepcopy
+
+from domino_cdk.config import config_loader
+from domino_cdk.config.diff import affected_stacks, config_diff, impact_of
+from domino_cdk.config.template import config_template
+from domino_cdk.lookups import DominoLookupCache
+
+
+class TestConfigDiff(unittest.TestCase):
+    def setUp(self):
+        self.old = config_template()
+
+    def tearDown(self):
+        DominoLookupCache.configure()
+
+    def test_no_changes(self):
+        self.assertEqual(config_diff(self.old, config_loader(self.old.render())), [])
+        self.assertEqual(affected_stacks([]), [])
+
+    def test_nodegroup_change(self):
+        new = deepcopy(self.old)
+        new.eks.unmanaged_nodegroups["gpu-0"].instance_types = ["p3.8xlarge"]
+        new.eks.unmanaged_nodegroups["gpu-0"].max_size = 20
+
+        changes = config_diff(self.old, new)
+        self.assertEqual(
+            [(c.name, c.old, c.new) for c in changes],
+            [
+                ("eks.unmanaged_nodegroups.gpu-0.max_size", 10, 20),
+                ("eks.unmanaged_nodegroups.gpu-0.instance_types", ["p3.2xlarge"], ["p3.8xlarge"]),
+            ],
+        )
+        self.assertEqual(
+            changes[0].impact, {"EksStack": ["auto scaling groups UnmanagedNodeGroupgpu-0/domino-gpu-0-<i>"]}
+        )
+        self.assertEqual(
+            changes[1].impact,
+            {
+                "EksStack": [
+                    "launch template UnmanagedNodeGroupgpu-0/LaunchTemplate0",
+                    "auto scaling groups UnmanagedNodeGroupgpu-0/domino-gpu-0-<i>",
+                ]
+            },
+        )
+        self.assertEqual(affected_stacks(changes), ["root", "EksStack"])
+
+    def test_sections_added_and_removed(self):
+        new = deepcopy(self.old)
+        new.efs = None
+        new.eks.unmanaged_nodegroups["compute-1"] = deepcopy(new.eks.unmanaged_nodegroups["compute-0"])
+        changes = {c.name: c for c in config_diff(self.old, new)}
+
+        self.assertEqual(sorted(changes), ["efs", "eks.unmanaged_nodegroups.compute-1"])
+        self.assertIsNone(changes["efs"].new)
+        self.assertIn("EfsStack", changes["efs"].impact)
+        self.assertIn(
+            "launch template UnmanagedNodeGroupcompute-1/LaunchTemplate0",
+            changes["eks.unmanaged_nodegroups.compute-1"].impact["EksStack"],
+        )
+
+    def test_impact_rules(self):
+        self.assertEqual(impact_of(("vpc", "flow_logging"), "d"), {"VpcStack": ["rejectFlowLogs flow log"]})
+        self.assertEqual(impact_of(("vpc", "availability_zones"), "d"), {})
+        # Specific keys win over wildcards of the same length
+        self.assertIn("VpcStack", impact_of(("s3", "buckets", "monitoring"), "d"))
+        self.assertEqual(
+            impact_of(("s3", "buckets", "blobs", "removal_policy_destroy"), "d"), {"S3Stack": ["bucket blobs"]}
+        )
+        # Keys containing dots stay a single path element
+        self.assertEqual(
+            impact_of(("eks", "managed_nodegroups", "ng", "labels", "dominodatalab.com/node-pool"), "d"),
+            {"EksStack": ["EKS nodegroups d-ng-<az>"]},
+        )
+
+    def test_offline_without_cached_azs(self):
+        DominoLookupCache.configure(offline=True)
+        c = self.old.render()
+        c["aws_region"] = "us-west-2"
+        c["aws_account_id"] = "1234"
+        c["eks"]["unmanaged_nodegroups"]["platform-0"]["availability_zones"] = ["us-west-2a"]
+        config_loader(c)
@@ -1,5 +1,6 @@
 import unittest
 from copy import deepcopy
+from unittest.mock import patch
 
 from domino_cdk.config import EFS
 
@@ -19,6 +20,12 @@ efs_obj = EFS(
         enable=True, schedule="0 12 * * ? *", move_to_cold_storage_after=35, delete_after=125, removal_policy="DESTROY"
     ),
     removal_policy_destroy=True,
+    performance_mode="general_purpose",
+    throughput_mode="bursting",
+    provisioned_throughput_mibps=None,
+    transition_to_ia=None,
+    transition_to_primary_storage_class=False,
+    replication_overwrite_protection=True,
 )
 
 
@@ -26,3 +33,39 @@ class TestConfigEFS(unittest.TestCase):
     def test_from_0_0_0(self):
         efs = EFS.from_0_0_0(deepcopy(efs_0_0_0_cfg))
         self.assertEqual(efs, efs_obj)
+
+    def test_performance_defaults(self):
+        efs = EFS.from_0_0_0(deepcopy(efs_0_0_0_cfg))
+        self.assertEqual(efs.performance_mode, "general_purpose")
+        self.assertEqual(efs.throughput_mode, "bursting")
+        self.assertIsNone(efs.transition_to_ia)
+        self.assertTrue(efs.replication_overwrite_protection)
+
+    def test_performance_profile(self):
+        efs_cfg = deepcopy(efs_0_0_0_cfg)
+        efs_cfg.update(
+            throughput_mode="provisioned",
+            provisioned_throughput_mibps=256,
+            transition_to_ia=30,
+            transition_to_primary_storage_class=True,
+            replication_overwrite_protection=False,
+        )
+        with patch("domino_cdk.config.util.log.warning") as warn:
+            efs = EFS.from_0_0_0(efs_cfg)
+            warn.assert_not_called()
+        self.assertEqual(efs.provisioned_throughput_mibps, 256)
+        self.assertEqual(efs.transition_to_ia, 30)
+
+    def test_performance_validation(self):
+        for (options, error) in [
+            ({"performance_mode": "fast"}, "performance_mode must be one of"),
+            ({"throughput_mode": "unlimited"}, "throughput_mode must be one of"),
+            ({"performance_mode": "max_io", "throughput_mode": "elastic"}, "requires the general_purpose"),
+            ({"throughput_mode": "provisioned"}, "provisioned_throughput_mibps must be set"),
+            ({"provisioned_throughput_mibps": 128}, "provisioned_throughput_mibps must be set"),
+            ({"transition_to_ia": 45}, "transition_to_ia must be one of"),
+        ]:
+            efs_cfg = deepcopy(efs_0_0_0_cfg)
+            efs_cfg.update(options)
+            with self.assertRaisesRegex(ValueError, error):
+                EFS.from_0_0_0(efs_cfg)
@@ -73,6 +73,14 @@ managed_ngs = {
         labels={},
         tags={},
         spot=False,
+        instance_requirements=None,
+        on_demand_allocation_strategy=None,
+        spot_allocation_strategy=None,
+        capacity_rebalance=False,
+        disk_type="gp3",
+        disk_iops=None,
+        disk_throughput=None,
+        stack=0,
         desired_size=1,
     )
 }
@@ -93,6 +101,15 @@ unmanaged_ngs = {
         ssm_agent=True,
         taints={},
         spot=False,
+        instance_requirements=None,
+        on_demand_allocation_strategy=None,
+        spot_allocation_strategy=None,
+        capacity_rebalance=False,
+        disk_type="gp3",
+        disk_iops=None,
+        disk_throughput=None,
+        stack=0,
+        warm_pool=None,
     ),
     "nvidia": EKS.UnmanagedNodegroup(
         disk_size=100,
@@ -110,6 +127,15 @@ unmanaged_ngs = {
         ssm_agent=False,
         taints={"nvidia.com/gpu": "true:NoSchedule"},
         spot=False,
+        instance_requirements=None,
+        on_demand_allocation_strategy=None,
+        spot_allocation_strategy=None,
+        capacity_rebalance=False,
+        disk_type="gp3",
+        disk_iops=None,
+        disk_throughput=None,
+        stack=0,
+        warm_pool=None,
     ),
 }
 
@@ -122,6 +148,7 @@ eks_object = EKS(
     managed_nodegroups=managed_ngs,
     unmanaged_nodegroups=unmanaged_ngs,
     secrets_encryption_key_arn=None,
+    share_launch_templates=False,
 )
 
 
@@ -167,6 +194,170 @@ class TestConfigEKS(unittest.TestCase):
         eks = EKS.from_0_0_1(eks_cfg)
         self.assertIsNone(eks.secrets_encryption_key_arn)
 
+    def test_from_0_0_1_with_shared_launch_templates(self):
+        eks_cfg = deepcopy(eks_0_0_1_cfg)
+        eks_cfg["share_launch_templates"] = True
+        eks = EKS.from_0_0_1(eks_cfg)
+        self.assertTrue(eks.share_launch_templates)
+
+    def test_from_0_0_1_without_shared_launch_templates(self):
+        eks = EKS.from_0_0_1(deepcopy(eks_0_0_1_cfg))
+        self.assertFalse(eks.share_launch_templates)
+
+    def test_warm_pool(self):
+        eks_cfg = deepcopy(eks_0_0_1_cfg)
+        eks_cfg["unmanaged_nodegroups"]["platform"]["warm_pool"] = {"min_size": 1, "pool_state": "hibernated"}
+        eks = EKS.from_0_0_1(eks_cfg)
+        self.assertEqual(
+            eks.unmanaged_nodegroups["platform"].warm_pool,
+            EKS.UnmanagedNodegroup.WarmPool(
+                min_size=1, max_prepared_capacity=None, pool_state="hibernated", reuse_on_scale_in=False
+            ),
+        )
+        self.assertIsNone(eks.unmanaged_nodegroups["nvidia"].warm_pool)
+
+    def test_instance_requirements(self):
+        eks_cfg = deepcopy(eks_0_0_1_cfg)
+        compute = eks_cfg["managed_nodegroups"]["compute"]
+        del compute["instance_types"]
+        compute["instance_requirements"] = {
+            "vcpu_count": {"min": 4, "max": 8},
+            "memory_mib": {"min": 16384},
+            "accelerator_count": {"min": 1},
+        }
+        with patch("domino_cdk.config.util.log.warning") as warn:
+            ir = EKS.from_0_0_1(eks_cfg).managed_nodegroups["compute"].instance_requirements
+            warn.assert_not_called()
+        self.assertEqual(
+            ir,
+            EKS.NodegroupBase.InstanceRequirements(
+                vcpu_count={"min": 4, "max": 8},
+                memory_mib={"min": 16384},
+                accelerator_count={"min": 1},
+                instance_generations=None,
+            ),
+        )
+        self.assertEqual(
+            ir.request(),
+            {
+                "VCpuCount": {"Min": 4, "Max": 8},
+                "MemoryMiB": {"Min": 16384},
+                "AcceleratorCount": {"Min": 1},
+                "AcceleratorTypes": ["gpu"],
+            },
+        )
+
+    def test_instance_selection_validation(self):
+        requirements = {"vcpu_count": {"min": 4}, "memory_mib": {"min": 16384}}
+        for (kind, options, error) in [
+            ("managed", {"instance_requirements": requirements}, "either instance_types or instance_requirements"),
+            ("managed", {"instance_types": []}, "either instance_types or instance_requirements"),
+            ("managed", {"on_demand_allocation_strategy": "lowest-price"}, "EKS picks it for managed nodegroups"),
+            ("unmanaged", {"spot_allocation_strategy": "cheapest"}, "spot_allocation_strategy must be one of"),
+            ("unmanaged", {"capacity_rebalance": True}, "only applies to spot nodegroups"),
+            (
+                "unmanaged",
+                {"instance_types": [], "instance_requirements": {**requirements, "vcpu_count": {"min": 8, "max": 4}}},
+                "vcpu_count must be a range",
+            ),
+            (
+                "unmanaged",
+                {"instance_types": [], "instance_requirements": {**requirements, "instance_generations": ["next"]}},
+                "can only be current or previous",
+            ),
+            (
+                "unmanaged",
+                {
+                    "instance_types": [],
+                    "instance_requirements": requirements,
+                    "spot": True,
+                    "spot_allocation_strategy": "capacity-optimized-prioritized",
+                },
+                "can't be capacity-optimized-prioritized with instance_requirements",
+            ),
+        ]:
+            eks_cfg = deepcopy(eks_0_0_1_cfg)
+            ng = (
+                eks_cfg["managed_nodegroups"]["compute"]
+                if kind == "managed"
+                else eks_cfg["unmanaged_nodegroups"]["platform"]
+            )
+            ng.update(deepcopy(options))
+            with self.assertRaisesRegex(ValueError, error):
+                EKS.from_0_0_1(eks_cfg)
+
+        # Valid unmanaged attribute-based spot nodegroup
+        eks_cfg = deepcopy(eks_0_0_1_cfg)
+        eks_cfg["unmanaged_nodegroups"]["platform"].update(
+            instance_types=[],
+            instance_requirements=requirements,
+            spot=True,
+            spot_allocation_strategy="price-capacity-optimized",
+            on_demand_allocation_strategy="lowest-price",
+            capacity_rebalance=True,
+        )
+        EKS.from_0_0_1(eks_cfg)
+
+    def test_disk_validation(self):
+        for (options, error) in [
+            ({"disk_type": "io1"}, r"disk_type must be one of \['gp3', 'io2'\]"),
+            ({"disk_iops": 2000}, "disk_iops of 2000 must be from 3000 to 16000"),
+            ({"disk_iops": 16000, "disk_size": 20}, "at most 500 per GB of disk_size"),
+            ({"disk_throughput": 1000}, r"at most a quarter of disk_iops \(3000\)"),
+            ({"disk_type": "io2"}, "io2 disks need disk_iops"),
+            ({"disk_type": "io2", "disk_iops": 120000, "disk_size": 100}, "at most 1000 per GB"),
+            ({"disk_type": "io2", "disk_iops": 10000, "disk_throughput": 500}, "only be set on gp3 disks"),
+            (
+                {"disk_iops": 4000, "ami_id": "ami-1234", "user_data": "some-user-data", "disk_size": 0},
+                "only apply to the default EKS AMI",
+            ),
+        ]:
+            eks_cfg = deepcopy(eks_0_0_1_cfg)
+            eks_cfg["unmanaged_nodegroups"]["platform"].update(options)
+            with self.assertRaisesRegex(ValueError, error):
+                EKS.from_0_0_1(eks_cfg)
+
+        eks_cfg = deepcopy(eks_0_0_1_cfg)
+        eks_cfg["managed_nodegroups"]["compute"].update(disk_iops=10000, disk_throughput=500)
+        eks_cfg["unmanaged_nodegroups"]["nvidia"].update(disk_type="io2", disk_iops=64000)
+        eks_cfg["unmanaged_nodegroups"]["platform"].update(disk_size=4)
+        eks = EKS.from_0_0_1(eks_cfg)
+        self.assertEqual(eks.managed_nodegroups["compute"].disk_throughput, 500)
+        self.assertEqual(eks.unmanaged_nodegroups["nvidia"].disk_type, "io2")
+
+    def test_stack_validation(self):
+        for stack in [-1, "NodegroupStack1"]:
+            eks_cfg = deepcopy(eks_0_0_1_cfg)
+            eks_cfg["managed_nodegroups"]["compute"]["stack"] = stack
+            with self.assertRaisesRegex(ValueError, r"stack must be 0 \(the EKS stack\) or above"):
+                EKS.from_0_0_1(eks_cfg)
+
+        eks_cfg = deepcopy(eks_0_0_1_cfg)
+        eks_cfg["unmanaged_nodegroups"]["platform"]["stack"] = 2
+        eks_cfg["unmanaged_nodegroups"]["nvidia"]["stack"] = None
+        eks = EKS.from_0_0_1(eks_cfg)
+        self.assertEqual(eks.unmanaged_nodegroups["platform"].stack, 2)
+        self.assertIsNone(eks.unmanaged_nodegroups["nvidia"].stack)
+        # Configs from before nested stacks leave it out, and their nodegroups stay in the EKS stack
+        self.assertEqual(eks.managed_nodegroups["compute"].stack, 0)
+
+    def test_warm_pool_validation(self):
+        for (option, value, error) in [
+            ("pool_state", "running", "Must be stopped or hibernated"),
+            ("max_prepared_capacity", 5, "can't be less than max_size"),
+            ("spot", True, "requires a single instance type and no spot"),
+            ("instance_types", ["m5.2xlarge", "m5.4xlarge"], "requires a single instance type and no spot"),
+        ]:
+            eks_cfg = deepcopy(eks_0_0_1_cfg)
+            platform = eks_cfg["unmanaged_nodegroups"]["platform"]
+            platform["warm_pool"] = {"min_size": 1}
+            if option in platform:
+                platform[option] = value
+            else:
+                platform["warm_pool"][option] = value
+            with self.assertRaisesRegex(ValueError, error):
+                EKS.from_0_0_1(eks_cfg)
+
     def test_oldest_newest_loaders_identical_result(self):
         eks_old = EKS.from_0_0_0(deepcopy(eks_0_0_0_cfg))
         eks_new = EKS.from_0_0_1(deepcopy(eks_0_0_1_cfg))
@@ -333,6 +524,14 @@ class TestConfigEKS(unittest.TestCase):
         del expected_base_result["desired_size"]
         expected_base_result["ami_id"] = "ami-1234"
         expected_base_result["user_data"] = "some-user-data"
+        expected_base_result["instance_requirements"] = None
+        expected_base_result["on_demand_allocation_strategy"] = None
+        expected_base_result["spot_allocation_strategy"] = None
+        expected_base_result["capacity_rebalance"] = False
+        expected_base_result["disk_type"] = "gp3"
+        expected_base_result["disk_iops"] = None
+        expected_base_result["disk_throughput"] = None
+        expected_base_result["stack"] = 0
 
         base_ng_dict = EKS.NodegroupBase.base_load(test_group_cfg)
         self.assertEqual(base_ng_dict, expected_base_result)
@@ -0,0 +1,26 @@
+import unittest
+
+from domino_cdk.config.iam import generate_iam, region_partition
+
+
+class TestIam(unittest.TestCase):
+    def test_region_partition(self):
+        self.assertEqual(region_partition("us-west-2"), "aws")
+        self.assertEqual(region_partition("ap-southeast-5"), "aws")
+        self.assertEqual(region_partition("cn-northwest-1"), "aws-cn")
+        self.assertEqual(region_partition("us-gov-east-1"), "aws-us-gov")
+        self.assertEqual(region_partition("us-iso-east-1"), "aws-iso")
+        self.assertEqual(region_partition("us-isob-east-1"), "aws-iso-b")
+        self.assertEqual(region_partition("<YOUR_REGION>"), "aws")
+
+    def test_generate_iam_partition(self):
+        policies = generate_iam("domino", "1234", "us-gov-west-1", manual=True, use_bastion=True)
+        resources = [
+            r
+            for policy in policies
+            for statement in policy["Statement"]
+            for r in (statement.get("Resource") if isinstance(statement.get("Resource"), list) else [])
+        ]
+        arns = [r for r in resources if r.startswith("arn:")]
+        self.assertTrue(arns)
+        self.assertTrue(all(r.startswith("arn:aws-us-gov:") for r in arns))
@@ -0,0 +1,86 @@
+import unittest
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Union
+
+from ruamel.yaml.comments import CommentedMap
+
+from domino_cdk.config import EKS, S3, VPC
+from domino_cdk.config.template import config_template
+from domino_cdk.config.validation import compile_checker, validate, validation_plan
+
+
+@dataclass
+class Inner:
+    name: str
+    count: int
+
+
+@dataclass
+class Outer:
+    inner: Inner
+    inners: Dict[str, Inner]
+    names: List[str]
+    either: Union[int, str]
+    maybe: Optional[str] = None
+
+
+class TestValidation(unittest.TestCase):
+    def test_template_is_valid(self):
+        self.assertEqual(validate(config_template(bastion=True), "config"), [])
+
+    def test_plans_are_cached(self):
+        self.assertIs(validation_plan(EKS.UnmanagedNodegroup), validation_plan(EKS.UnmanagedNodegroup))
+        self.assertIs(compile_checker(List[str]), compile_checker(List[str]))
+        self.assertEqual(
+            [name for name, _ in validation_plan(S3.BucketList.Bucket)],
+            ["auto_delete_objects", "removal_policy_destroy", "sse_kms_key_id", "name"],
+        )
+        self.assertIn("ingress_ports", [name for name, _ in validation_plan(VPC.Bastion)])
+
+    def test_generic_elements(self):
+        o = Outer(
+            inner=Inner("a", 1),
+            inners={"x": Inner("b", True), 5: Inner("c", 2)},
+            names=["a", 2],
+            either="x",
+            maybe="set",
+        )
+        self.assertEqual(
+            validate(o, "outer"),
+            [
+                "outer.inners.x.count type (<class 'int'>) does not match value: [True] (<class 'bool'>)",
+                "outer.inners.5 (key) type (<class 'str'>) does not match value: [5] (<class 'int'>)",
+                "outer.names.[1] type (<class 'str'>) does not match value: [2] (<class 'int'>)",
+            ],
+        )
+
+    def test_empty_values_accepted(self):
+        self.assertEqual(validate(Outer(inner=None, inners={}, names=None, either=None), "outer"), [])
+
+    def test_mismatches(self):
+        o = Outer(inner={"name": "a"}, inners=["x"], names="abc", either=1.5, maybe=1)
+        self.assertEqual(
+            validate(o, "outer"),
+            [
+                f"outer.inner type ({Inner}) does not match value: [{{'name': 'a'}}] (<class 'dict'>)",
+                f"outer.inners type ({Dict[str, Inner]}) does not match value: [['x']] (<class 'list'>)",
+                "outer.names type (typing.List[str]) does not match value: [abc] (<class 'str'>)",
+                "outer.either type (typing.Union[int, str]) does not match value: [1.5] (<class 'float'>)",
+                "outer.maybe type (<class 'str'>) does not match value: [1] (<class 'int'>)",
+            ],
+        )
+
+    def test_commented_map(self):
+        o = Outer(inner=Inner("a", 1), inners=CommentedMap(x=Inner("b", 2)), names=[], either=1)
+        self.assertEqual(validate(o, "outer"), [])
+
+    def test_config_errors(self):
+        c = config_template()
+        c.eks.unmanaged_nodegroups["platform-0"].instance_types = ["m5.2xlarge", 5]
+        c.s3.buckets.blobs.sse_kms_key_id = "some-key"
+        self.assertEqual(
+            validate(c, "config"),
+            [
+                "config.eks.unmanaged_nodegroups.platform-0.instance_types.[1] type (<class 'str'>) does not match value: [5] (<class 'int'>)"
+            ],
+        )
@@ -0,0 +1,62 @@
+from dataclasses import replace
+
+import aws_cdk.aws_ec2 as ec2
+from aws_cdk import App, Environment, Stack
+from aws_cdk.assertions import Match, Template
+
+from domino_cdk.config.template import config_template
+from domino_cdk.provisioners.efs import DominoEfsProvisioner
+
+from . import TestCase
+
+
+class TestDominoEfsProvisioner(TestCase):
+    def setUp(self):
+        self.app = App()
+        self.stack = Stack(self.app, "Efs", env=Environment(region="us-west-2", account="1234567890"))
+        self.vpc = ec2.Vpc(self.stack, "vpc", max_azs=1)
+        self.sg = ec2.SecurityGroup(self.stack, "sg", vpc=self.vpc)
+        self.efs_cfg = replace(config_template().efs, backup=replace(config_template().efs.backup, enable=False))
+
+    def provision(self) -> Template:
+        DominoEfsProvisioner(self.stack, "EfsStack", "test-efs", self.efs_cfg, self.vpc, self.sg, False)
+        return Template.from_stack(self.stack)
+
+    def test_defaults(self):
+        self.provision().has_resource_properties(
+            "AWS::EFS::FileSystem",
+            {
+                "ThroughputMode": "elastic",
+                "PerformanceMode": "generalPurpose",
+                "LifecyclePolicies": Match.absent(),
+                "FileSystemProtection": Match.absent(),
+            },
+        )
+
+    def test_performance_profile(self):
+        self.efs_cfg = replace(
+            self.efs_cfg,
+            throughput_mode="provisioned",
+            provisioned_throughput_mibps=256,
+            transition_to_ia=30,
+            transition_to_primary_storage_class=True,
+            replication_overwrite_protection=False,
+        )
+        self.provision().has_resource_properties(
+            "AWS::EFS::FileSystem",
+            {
+                "ThroughputMode": "provisioned",
+                "ProvisionedThroughputInMibps": 256,
+                "LifecyclePolicies": [
+                    {"TransitionToIA": "AFTER_30_DAYS"},
+                    {"TransitionToPrimaryStorageClass": "AFTER_1_ACCESS"},
+                ],
+                "FileSystemProtection": {"ReplicationOverwriteProtection": "DISABLED"},
+            },
+        )
+
+    def test_one_day_transition(self):
+        self.efs_cfg = replace(self.efs_cfg, transition_to_ia=1)
+        self.provision().has_resource_properties(
+            "AWS::EFS::FileSystem", {"LifecyclePolicies": [{"TransitionToIA": "AFTER_1_DAY"}]}
+        )
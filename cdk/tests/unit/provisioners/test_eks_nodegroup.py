@@ -0,0 +1,447 @@
+import json
+from copy import deepcopy
+from dataclasses import fields, replace
+from unittest.mock import patch
+
+import aws_cdk.aws_ec2 as ec2
+import aws_cdk.aws_eks as eks
+import aws_cdk.aws_iam as iam
+from aws_cdk import App, Environment, NestedStack, Stack
+from aws_cdk.assertions import Template
+
+from domino_cdk.config import EKS, config_loader
+from domino_cdk.config.template import config_template
+from domino_cdk.lookups import DominoLookupCache
+from domino_cdk.provisioners.eks.eks_nodegroup import (
+    DominoEksNodegroupProvisioner,
+    warm_pool_gate,
+)
+
+from . import TestCase
+
+STACK_NAME = "DominoCDK"
+
+
+class TestDominoEksNodegroupProvisioner(TestCase):
+    def setUp(self, context: dict = None):
+        self.app = App(context=context)
+        self.stack = Stack(self.app, STACK_NAME, env=Environment(region="us-west-2", account="1234567890"))
+        self.vpc = ec2.Vpc(self.stack, "vpc", max_azs=1)
+        self.scope = NestedStack(self.stack, "EksStack")
+        self.scope.untagged_resources = {"ec2": []}
+        self.eks_version = eks.KubernetesVersion.V1_21
+        self.cluster = eks.Cluster(self.scope, "eks", version=self.eks_version, vpc=self.vpc, default_capacity=0)
+        self.ng_role = iam.Role(self.scope, "ng_role", assumed_by=iam.ServicePrincipal("ec2.amazonaws.com"))
+
+        self.eks_cfg = config_template().eks
+        self.eks_cfg.max_nodegroup_azs = 1
+
+    def provision(self, nest: bool = True) -> DominoEksNodegroupProvisioner:
+        return DominoEksNodegroupProvisioner(
+            self.scope,
+            self.cluster,
+            self.ng_role,
+            STACK_NAME,
+            self.eks_cfg,
+            self.eks_version,
+            self.vpc,
+            "Private",
+            None,
+            nest=nest,
+        )
+
+    def limit_stacks_to_one_nodegroup(self):
+        """Patches the stack limits so the EKS stack has room for exactly one more unmanaged nodegroup"""
+        existing = DominoEksNodegroupProvisioner._count_resources(self.scope)
+        return patch.multiple(
+            "domino_cdk.provisioners.eks.eks_nodegroup", max_stack_resources=existing + 4, stack_headroom=1
+        )
+
+    def asgs(self, stack: Stack) -> dict:
+        """{ASG name: logical ID}"""
+        return {
+            r["Properties"]["AutoScalingGroupName"]: logical_id
+            for logical_id, r in Template.from_stack(stack).find_resources("AWS::AutoScaling::AutoScalingGroup").items()
+        }
+
+    def asg_names(self, stack: Stack) -> list:
+        return sorted(self.asgs(stack))
+
+    def ng_names(self, *nodegroups: str) -> list:
+        return [f"{STACK_NAME}-{ng}-{self.vpc.availability_zones[0]}" for ng in nodegroups]
+
+    def test_estimate_nodegroup(self):
+        provisioner = self.provision()
+        ng = self.eks_cfg.unmanaged_nodegroups["platform-0"]
+
+        one_az = provisioner.estimate_nodegroup(ng, "unmanaged", 1)
+        three_azs = provisioner.estimate_nodegroup(ng, "unmanaged", 3)
+        self.assertEqual(one_az["resources"], 4)
+        self.assertEqual(three_azs["resources"], 8)
+        self.assertGreater(three_azs["bytes"], one_az["bytes"])
+        self.assertEqual(provisioner.estimate_nodegroup(ng, "managed", 3)["resources"], 4)
+
+        # A warm pool and lifecycle hook in each availability zone, and the warm pool scripts in the user data
+        ng.warm_pool = EKS.UnmanagedNodegroup.WarmPool(
+            min_size=0, max_prepared_capacity=None, pool_state="stopped", reuse_on_scale_in=False
+        )
+        warm_pool = provisioner.estimate_nodegroup(ng, "unmanaged", 3)
+        self.assertEqual(warm_pool["resources"], 14)
+        self.assertGreater(warm_pool["bytes"], three_azs["bytes"] + 3 * 600 + len(warm_pool_gate))
+
+    def test_fits_in_eks_stack(self):
+        provisioner = self.provision()
+
+        self.assertEqual(len(provisioner.nodegroup_stacks), 1)
+        self.assertEqual(self.asg_names(self.scope), self.ng_names("compute-0", "gpu-0", "platform-0"))
+
+    def test_spills_into_nested_stacks(self):
+        with self.limit_stacks_to_one_nodegroup():
+            provisioner = self.provision()
+
+        self.assertEqual(len(provisioner.nodegroup_stacks), 2)
+        shard = provisioner.nodegroup_stacks[1]["scope"]
+        self.assertIsInstance(shard, NestedStack)
+        self.assertEqual(shard.node.id, "NodegroupStack1")
+        self.assertEqual(self.asg_names(self.scope), self.ng_names("platform-0"))
+        self.assertEqual(self.asg_names(shard), self.ng_names("compute-0", "gpu-0"))
+
+        # Nodegroups left in the EKS stack keep the IDs they have without sharding
+        sharded = self.asgs(self.scope)
+        self.setUp()
+        self.provision()
+        self.assertEqual(sharded.items() - self.asgs(self.scope).items(), set())
+
+    def test_no_nested_stacks_without_nest(self):
+        with self.limit_stacks_to_one_nodegroup():
+            provisioner = self.provision(nest=False)
+
+        self.assertEqual(len(provisioner.nodegroup_stacks), 1)
+        self.assertEqual(len(self.asg_names(self.scope)), 3)
+
+    def test_pinned_stacks(self):
+        recorded = {STACK_NAME: {"unmanaged": {"gpu-0": 1}}, "other": {"unmanaged": {"platform-0": 3}}}
+        self.setUp({"nodegroup_stacks": recorded})
+        self.eks_cfg.unmanaged_nodegroups["compute-0"].stack = 2
+        provisioner = self.provision()
+
+        self.assertEqual(
+            provisioner.placements, {"managed": {}, "unmanaged": {"compute-0": 2, "gpu-0": 1, "platform-0": 0}}
+        )
+        self.assertEqual(self.asg_names(self.scope), self.ng_names("platform-0"))
+        self.assertEqual(self.asg_names(provisioner.nodegroup_stacks[1]["scope"]), self.ng_names("gpu-0"))
+        self.assertEqual(self.asg_names(provisioner.nodegroup_stacks[2]["scope"]), self.ng_names("compute-0"))
+
+        # From -c on the command line
+        self.setUp({"nodegroup_stacks": json.dumps(recorded)})
+        self.assertEqual(self.provision().placements["unmanaged"]["gpu-0"], 1)
+
+    def test_configs_from_before_nested_stacks(self):
+        c = config_template().render()
+        for ng in c["eks"]["unmanaged_nodegroups"].values():
+            del ng["stack"]
+
+        # Without anything recorded, a deployment's nodegroups are where it has them, however full the EKS stack
+        self.eks_cfg = config_loader(deepcopy(c)).eks
+        self.eks_cfg.max_nodegroup_azs = 1
+        with patch.multiple("domino_cdk.provisioners.eks.eks_nodegroup", max_stack_resources=1, stack_headroom=1):
+            provisioner = self.provision()
+        self.assertEqual(len(provisioner.nodegroup_stacks), 1)
+        self.assertEqual(self.asg_names(self.scope), self.ng_names("compute-0", "gpu-0", "platform-0"))
+
+        # Nodegroups added since are placed by estimate
+        c["eks"]["unmanaged_nodegroups"]["new-0"] = {**c["eks"]["unmanaged_nodegroups"]["gpu-0"], "stack": None}
+        self.setUp()
+        self.eks_cfg = config_loader(c).eks
+        self.eks_cfg.max_nodegroup_azs = 1
+        with self.limit_stacks_to_one_nodegroup():
+            provisioner = self.provision()
+        self.assertEqual(provisioner.placements["unmanaged"], {"platform-0": 0, "compute-0": 0, "gpu-0": 0, "new-0": 1})
+        self.assertEqual(self.asg_names(self.scope), self.ng_names("compute-0", "gpu-0", "platform-0"))
+
+    def test_recorded_stacks_stay_put(self):
+        with self.limit_stacks_to_one_nodegroup():
+            placements = self.provision().placements
+        self.assertEqual(placements["unmanaged"], {"platform-0": 0, "compute-0": 1, "gpu-0": 1})
+
+        # platform-0 no longer fits in the EKS stack, and a new nodegroup is added ahead of the others
+        def grow(eks_cfg):
+            eks_cfg.unmanaged_nodegroups = {
+                "new-0": replace(eks_cfg.unmanaged_nodegroups["gpu-0"]),
+                **eks_cfg.unmanaged_nodegroups,
+            }
+            eks_cfg.unmanaged_nodegroups["platform-0"].user_data = "#" * 100_000
+
+        self.setUp({"nodegroup_stacks": {STACK_NAME: placements}})
+        grow(self.eks_cfg)
+        with self.limit_stacks_to_one_nodegroup():
+            provisioner = self.provision()
+        # Only the new nodegroup is placed by estimate, in the first stack with room after the others
+        self.assertEqual(provisioner.placements["unmanaged"], {"new-0": 1, "platform-0": 0, "compute-0": 1, "gpu-0": 1})
+
+        # Without the record, everything would move
+        self.setUp()
+        grow(self.eks_cfg)
+        with self.limit_stacks_to_one_nodegroup():
+            self.assertNotEqual(self.provision().placements["unmanaged"]["platform-0"], 0)
+
+    def launch_templates(self, stack: Stack) -> int:
+        return len(Template.from_stack(stack).find_resources("AWS::EC2::LaunchTemplate"))
+
+    def add_copies(self):
+        """Another unmanaged compute nodegroup, and two managed nodegroups differing only in sizes and labels"""
+        ngs = self.eks_cfg.unmanaged_nodegroups
+        ngs["compute-1"] = replace(ngs["compute-0"], max_size=20)
+        self.eks_cfg.managed_nodegroups = {
+            f"managed-{i}": EKS.ManagedNodegroup(
+                **{f.name: getattr(ngs["platform-0"], f.name) for f in fields(EKS.NodegroupBase)},
+                desired_size=1,
+            )
+            for i in range(2)
+        }
+        self.eks_cfg.managed_nodegroups["managed-1"].labels = {"some": "label"}
+
+    def test_shared_launch_templates(self):
+        self.add_copies()
+        self.eks_cfg.share_launch_templates = True
+        provisioner = self.provision()
+
+        # platform-0, compute-0 (shared with compute-1), gpu-0 and the managed nodegroups' one
+        self.assertEqual(self.launch_templates(self.scope), 4)
+        self.assertEqual(len(provisioner.user_data), 1)
+
+        # Both compute nodegroups' ASGs launch from the same template
+        asgs = Template.from_stack(self.scope).find_resources("AWS::AutoScaling::AutoScalingGroup").values()
+        compute_lts = {
+            json.dumps(asg["Properties"]["MixedInstancesPolicy"]["LaunchTemplate"]["LaunchTemplateSpecification"])
+            for asg in asgs
+            if "compute" in asg["Properties"]["AutoScalingGroupName"]
+        }
+        self.assertEqual(len(compute_lts), 1)
+
+    def test_unshared_launch_templates(self):
+        self.add_copies()
+        self.eks_cfg.share_launch_templates = False
+        self.provision()
+
+        self.assertEqual(self.launch_templates(self.scope), 6)
+
+    def test_shared_launch_templates_stay_in_their_stack(self):
+        self.eks_cfg.unmanaged_nodegroups["platform-1"] = replace(self.eks_cfg.unmanaged_nodegroups["platform-0"])
+        self.eks_cfg.share_launch_templates = True
+        with self.limit_stacks_to_one_nodegroup():
+            provisioner = self.provision()
+
+        # platform-1 lands in the nested stack, which gets its own copy of platform-0's template
+        shard = provisioner.nodegroup_stacks[1]["scope"]
+        self.assertEqual(self.asg_names(shard), self.ng_names("compute-0", "gpu-0", "platform-1"))
+        self.assertEqual(self.launch_templates(self.scope), 1)
+        self.assertEqual(self.launch_templates(shard), 3)
+
+    def test_warm_pool(self):
+        self.eks_cfg.unmanaged_nodegroups["compute-0"].warm_pool = EKS.UnmanagedNodegroup.WarmPool(
+            min_size=1, max_prepared_capacity=None, pool_state="hibernated", reuse_on_scale_in=True
+        )
+        self.provision()
+        template = Template.from_stack(self.scope)
+
+        template.resource_count_is("AWS::AutoScaling::WarmPool", 1)
+        template.has_resource_properties(
+            "AWS::AutoScaling::WarmPool",
+            {"MinSize": 1, "PoolState": "Hibernated", "InstanceReusePolicy": {"ReuseOnScaleIn": True}},
+        )
+        template.resource_count_is("AWS::AutoScaling::LifecycleHook", 1)
+        template.has_resource_properties(
+            "AWS::AutoScaling::LifecycleHook",
+            {
+                "LifecycleHookName": "domino-warm-pool",
+                "LifecycleTransition": "autoscaling:EC2_INSTANCE_LAUNCHING",
+                "DefaultResult": "CONTINUE",
+            },
+        )
+
+        # Warm pools can't have a mixed instances policy, so the ASG launches from the template directly
+        asgs = {
+            asg["Properties"]["AutoScalingGroupName"]: asg["Properties"]
+            for asg in template.find_resources("AWS::AutoScaling::AutoScalingGroup").values()
+        }
+        compute = asgs[self.ng_names("compute-0")[0]]
+        self.assertIn("LaunchTemplate", compute)
+        self.assertNotIn("MixedInstancesPolicy", compute)
+        self.assertIn("MixedInstancesPolicy", asgs[self.ng_names("platform-0")[0]])
+
+        lts = {
+            lt["Properties"]["LaunchTemplateName"]: lt["Properties"]["LaunchTemplateData"]
+            for lt in template.find_resources("AWS::EC2::LaunchTemplate").values()
+        }
+        compute_lt = lts[self.ng_names("compute-0")[0]]
+        self.assertEqual(compute_lt["HibernationOptions"], {"Configured": True})
+        self.assertIn("target-lifecycle-state", json.dumps(compute_lt["UserData"]))
+        self.assertNotIn("HibernationOptions", lts[self.ng_names("platform-0")[0]])
+        self.assertNotIn("target-lifecycle-state", json.dumps(lts[self.ng_names("platform-0")[0]]["UserData"]))
+
+        template.has_resource_properties(
+            "AWS::IAM::Policy",
+            {
+                "PolicyDocument": {
+                    "Statement": [
+                        {"Action": "autoscaling:DescribeAutoScalingInstances"},
+                        {"Action": "autoscaling:CompleteLifecycleAction"},
+                    ]
+                }
+            },
+        )
+
+    def test_instance_requirements(self):
+        requirements = EKS.NodegroupBase.InstanceRequirements(
+            vcpu_count={"min": 4, "max": 16},
+            memory_mib={"min": 16384},
+            accelerator_count=None,
+            instance_generations=["current"],
+        )
+        compute = self.eks_cfg.unmanaged_nodegroups["compute-0"]
+        compute.instance_types = []
+        compute.instance_requirements = requirements
+        compute.spot = True
+        compute.capacity_rebalance = True
+        self.eks_cfg.managed_nodegroups = {
+            "managed-0": EKS.ManagedNodegroup(
+                **{f.name: getattr(compute, f.name) for f in fields(EKS.NodegroupBase)},
+                desired_size=1,
+            )
+        }
+        self.eks_cfg.managed_nodegroups["managed-0"].min_size = 1
+
+        with patch.object(DominoLookupCache, "instance_types", return_value=["m5.xlarge", "m6i.xlarge"]) as lookup:
+            provisioner = self.provision()
+        lookup.assert_called_once_with(requirements.request(), None)
+        resolved = {
+            "instance_requirements": requirements.request(),
+            "ami_id": None,
+            "instance_types": ["m5.xlarge", "m6i.xlarge"],
+        }
+        self.assertEqual(provisioner.resolved_instance_types, {"managed-0": resolved})
+        template = Template.from_stack(self.scope)
+
+        asgs = {
+            asg["Properties"]["AutoScalingGroupName"]: asg["Properties"]
+            for asg in template.find_resources("AWS::AutoScaling::AutoScalingGroup").values()
+        }
+        compute_asg = asgs[self.ng_names("compute-0")[0]]
+        self.assertTrue(compute_asg["CapacityRebalance"])
+        self.assertEqual(
+            compute_asg["MixedInstancesPolicy"]["LaunchTemplate"]["Overrides"],
+            [
+                {
+                    "InstanceRequirements": {
+                        "VCpuCount": {"Min": 4, "Max": 16},
+                        "MemoryMiB": {"Min": 16384},
+                        "InstanceGenerations": ["current"],
+                    }
+                }
+            ],
+        )
+        self.assertEqual(
+            compute_asg["MixedInstancesPolicy"]["InstancesDistribution"],
+            {
+                "SpotAllocationStrategy": "price-capacity-optimized",
+                "OnDemandAllocationStrategy": "lowest-price",
+                "OnDemandPercentageAboveBaseCapacity": 0,
+                "OnDemandBaseCapacity": 0,
+            },
+        )
+
+        # Instance types are listed as before, and on-demand nodegroups still go in their order
+        platform_asg = asgs[self.ng_names("platform-0")[0]]
+        self.assertNotIn("CapacityRebalance", platform_asg)
+        self.assertNotIn("InstancesDistribution", platform_asg["MixedInstancesPolicy"])
+        self.assertEqual(
+            platform_asg["MixedInstancesPolicy"]["LaunchTemplate"]["Overrides"], [{"InstanceType": "m5.2xlarge"}]
+        )
+
+        template.has_resource_properties(
+            "AWS::EKS::Nodegroup", {"InstanceTypes": ["m5.xlarge", "m6i.xlarge"], "CapacityType": "SPOT"}
+        )
+
+    def test_recorded_instance_types(self):
+        requirements = EKS.NodegroupBase.InstanceRequirements(
+            vcpu_count={"min": 4}, memory_mib={"min": 16384}, accelerator_count=None, instance_generations=None
+        )
+        recorded = {"instance_requirements": requirements.request(), "ami_id": None, "instance_types": ["m5.xlarge"]}
+
+        def provision(record: dict) -> DominoEksNodegroupProvisioner:
+            self.setUp({"managed_instance_types": {STACK_NAME: {"managed-0": record}}})
+            platform = self.eks_cfg.unmanaged_nodegroups["platform-0"]
+            self.eks_cfg.managed_nodegroups = {
+                "managed-0": EKS.ManagedNodegroup(
+                    **{f.name: getattr(platform, f.name) for f in fields(EKS.NodegroupBase)}, desired_size=1
+                )
+            }
+            ng = self.eks_cfg.managed_nodegroups["managed-0"]
+            ng.instance_types, ng.instance_requirements = [], requirements
+            return self.provision()
+
+        # Kept however the matching types change, without looking them up
+        with patch.object(DominoLookupCache, "instance_types", return_value=["c5.xlarge"]) as lookup:
+            provisioner = provision(recorded)
+        lookup.assert_not_called()
+        self.assertEqual(provisioner.resolved_instance_types["managed-0"], recorded)
+        Template.from_stack(self.scope).has_resource_properties("AWS::EKS::Nodegroup", {"InstanceTypes": ["m5.xlarge"]})
+
+        # Resolved again once the requirements change
+        stale = {**recorded, "instance_requirements": {"VCpuCount": {"Min": 2}, "MemoryMiB": {"Min": 16384}}}
+        with patch.object(DominoLookupCache, "instance_types", return_value=["c5.xlarge"]) as lookup:
+            provisioner = provision(stale)
+        lookup.assert_called_once_with(requirements.request(), None)
+        self.assertEqual(provisioner.resolved_instance_types["managed-0"]["instance_types"], ["c5.xlarge"])
+
+    def test_on_demand_allocation_strategy(self):
+        self.eks_cfg.unmanaged_nodegroups["platform-0"].instance_types = ["m5.2xlarge", "m5a.2xlarge"]
+        self.eks_cfg.unmanaged_nodegroups["platform-0"].on_demand_allocation_strategy = "lowest-price"
+        self.provision()
+
+        Template.from_stack(self.scope).has_resource_properties(
+            "AWS::AutoScaling::AutoScalingGroup",
+            {
+                "AutoScalingGroupName": self.ng_names("platform-0")[0],
+                "MixedInstancesPolicy": {
+                    "InstancesDistribution": {"OnDemandAllocationStrategy": "lowest-price"},
+                    "LaunchTemplate": {"Overrides": [{"InstanceType": "m5.2xlarge"}, {"InstanceType": "m5a.2xlarge"}]},
+                },
+            },
+        )
+
+    def test_disk_performance(self):
+        self.eks_cfg.unmanaged_nodegroups["compute-0"].disk_iops = 6000
+        self.eks_cfg.unmanaged_nodegroups["compute-0"].disk_throughput = 500
+        self.eks_cfg.unmanaged_nodegroups["gpu-0"].disk_type = "io2"
+        self.eks_cfg.unmanaged_nodegroups["gpu-0"].disk_iops = 10000
+        self.provision()
+
+        lts = {
+            lt["Properties"]["LaunchTemplateName"]: lt["Properties"]["LaunchTemplateData"]["BlockDeviceMappings"][0]
+            for lt in Template.from_stack(self.scope).find_resources("AWS::EC2::LaunchTemplate").values()
+        }
+        self.assertEqual(
+            lts[self.ng_names("compute-0")[0]]["Ebs"],
+            {
+                "DeleteOnTermination": True,
+                "Encrypted": True,
+                "Iops": 6000,
+                "Throughput": 500,
+                "VolumeSize": 1000,
+                "VolumeType": "gp3",
+            },
+        )
+        self.assertEqual(
+            {
+                k: v
+                for k, v in lts[self.ng_names("gpu-0")[0]]["Ebs"].items()
+                if k in ["Iops", "Throughput", "VolumeType"]
+            },
+            {"Iops": 10000, "VolumeType": "io2"},
+        )
+        self.assertEqual(
+            set(lts[self.ng_names("platform-0")[0]]["Ebs"]),
+            {"DeleteOnTermination", "Encrypted", "VolumeSize", "VolumeType"},
+        )
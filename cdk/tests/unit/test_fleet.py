@@ -0,0 +1,143 @@
+import json
+import unittest
+from glob import glob
+from os import chdir, makedirs, remove
+from os.path import abspath, basename, dirname, exists, join
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+import fleet
+from benchmarks.synth_bench import scenario_config, seed_lookups
+from domino_cdk.lookups import DominoLookupCache
+from domino_cdk.synth_cache import cli_defaults, project_context
+from domino_cdk.util import DominoCdkUtil
+
+# Where the tests return to, rather than the working directory they're started in, which an earlier test may have
+# deleted
+CDK_DIR = dirname(dirname(dirname(abspath(__file__))))
+
+
+class TestProjectContext(unittest.TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        chdir(self.tmp.name)
+
+    def tearDown(self):
+        chdir(CDK_DIR)
+        self.tmp.cleanup()
+
+    def test_project_context(self):
+        with open("home.json", "w") as f:
+            json.dump({"context": {"a": "home", "b": "home"}}, f)
+        with open("cdk.json", "w") as f:
+            json.dump({"app": "python3 app.py", "context": {"b": "project", "c": "project"}}, f)
+        with open("cdk.context.json", "w") as f:
+            json.dump({"c": "cached", "d": "cached"}, f)
+
+        with patch("domino_cdk.synth_cache.expanduser", return_value="home.json"):
+            context = project_context({"d": "cli"})
+        self.assertEqual(context, {**cli_defaults, "a": "home", "b": "project", "c": "cached", "d": "cli"})
+
+    def test_no_project(self):
+        with patch("domino_cdk.synth_cache.expanduser", return_value="missing.json"):
+            self.assertEqual(project_context({"offline": "true"}), {**cli_defaults, "offline": "true"})
+
+
+class TestFleet(unittest.TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        chdir(self.tmp.name)
+
+        seed_lookups("cdk.lookups")
+        DominoLookupCache.configure(cache_dir="cdk.lookups", offline=True)
+        self.addCleanup(DominoLookupCache.configure)
+        with open("cdk.json", "w") as f:
+            json.dump({"app": "python3 app.py", "context": {"@aws-cdk/core:stackRelativeExports": "true"}}, f)
+        self.configs = join(self.tmp.name, "configs")
+        self.write_config("one")
+        self.write_config("two")
+
+    def tearDown(self):
+        chdir(CDK_DIR)
+        self.tmp.cleanup()
+
+    def write_config(self, name: str, cfg: dict = None):
+        cfg = cfg or scenario_config(1, 1, "unmanaged", "off")
+        cfg["name"] = name
+        makedirs(self.configs, exist_ok=True)
+        with open(join(self.configs, f"{name}.yaml"), "w") as f:
+            DominoCdkUtil.yaml_dump(cfg, f)
+
+    def run_fleet(self, *args: str) -> tuple:
+        argv = ["fleet.py", self.configs, "--offline", "-j", "2", *args]
+        with patch("sys.argv", argv), patch("builtins.print"):
+            try:
+                fleet.main()
+                code = 0
+            except SystemExit as e:
+                code = e.code
+        with open(join("cdk.fleet", fleet.FLEET_REPORT)) as f:
+            return code, json.load(f)
+
+    def test_fleet(self):
+        code, report = self.run_fleet("--synth-cache")
+        self.assertEqual(code, 0)
+        self.assertEqual(report["jobs"], 2)
+        self.assertEqual([r["name"] for r in report["deployments"]], ["one", "two"])
+        for r in report["deployments"]:
+            self.assertNotIn("error", r)
+            self.assertFalse(r.get("cached"))
+
+        # Synthesized with the context cdk synth hands app.py
+        with open(join("cdk.fleet", "one", "one.template.json")) as f:
+            template = json.load(f)
+        self.assertTrue(any("aws:cdk:path" in r.get("Metadata", {}) for r in template["Resources"].values()))
+
+        # Each deployment's nodegroup stacks are recorded for later synths
+        with open("cdk.context.json") as f:
+            self.assertEqual(set(json.load(f)["nodegroup_stacks"]), {"one", "two"})
+
+        # Nothing changed, so no worker is started
+        with patch("fleet.ProcessPoolExecutor") as pool:
+            code, report = self.run_fleet("--synth-cache")
+        self.assertEqual(code, 0)
+        pool.assert_not_called()
+        self.assertEqual([r.get("cached") for r in report["deployments"]], [True, True])
+
+    def test_failure(self):
+        cfg = scenario_config(1, 1, "unmanaged", "off")
+        cfg["eks"]["version"] = "1.0"
+        self.write_config("broken", cfg)
+
+        code, report = self.run_fleet()
+        self.assertEqual(code, 1)
+        results = {r["config"]: r for r in report["deployments"]}
+        self.assertIn("error", results[join(self.configs, "broken.yaml")])
+        # The rest of the fleet is still synthesized
+        for name in ["one", "two"]:
+            self.assertNotIn("error", results[join(self.configs, f"{name}.yaml")])
+            self.assertTrue(exists(join("cdk.fleet", name, f"{name}.template.json")))
+
+    def test_replay_nodegroup_stacks(self):
+        cfg = scenario_config(1, 1, "unmanaged", "off")
+        cfg["eks"]["unmanaged_nodegroups"]["compute-0"]["stack"] = 1
+        cfg["eks"]["unmanaged_nodegroups"]["gpu-0"].update(stack=2, warm_pool={"min_size": 1})
+        managed = scenario_config(1, 1, "managed", "off")["eks"]["managed_nodegroups"]["compute-0"]
+        cfg["eks"]["managed_nodegroups"] = {"mcompute-0": {**managed, "stack": 1}}
+        remove(join(self.configs, "two.yaml"))
+        self.write_config("one", cfg)
+        self.assertEqual(self.run_fleet("--synth-cache")[0], 0)
+
+        cfg["eks"]["unmanaged_nodegroups"]["compute-0"]["max_size"] += 1
+        self.write_config("one", cfg)
+        code, report = self.run_fleet("--synth-cache")
+        self.assertEqual(code, 0)
+        self.assertEqual(report["deployments"][0]["replayed"], ["NodegroupStack2"])
+
+        # Comes out as it would without replaying
+        self.assertEqual(self.run_fleet("-o", "cdk.full")[0], 0)
+        templates = sorted(basename(fn) for fn in glob(join("cdk.full", "one", "*.template.json")))
+        self.assertIn("oneEksStackNodegroupStack29808BDC1.nested.template.json", templates)
+        for fn in templates:
+            with open(join("cdk.fleet", "one", fn)) as f, open(join("cdk.full", "one", fn)) as g:
+                self.assertEqual(f.read(), g.read(), fn)
@@ -0,0 +1,23 @@
+import sys
+import unittest
+from os.path import dirname, join
+from subprocess import run
+
+CDK_DIR = join(dirname(__file__), "..", "..")
+
+
+class TestImports(unittest.TestCase):
+    def test_util_cli_does_not_import_jsii(self):
+        # A fresh interpreter, since the rest of the suite imports aws_cdk
+        result = run(
+            [
+                sys.executable,
+                "-c",
+                "import sys, util; print(sorted(m for m in sys.modules if m.split('.')[0] in ['jsii', 'aws_cdk']))",
+            ],
+            cwd=CDK_DIR,
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), "[]")
@@ -0,0 +1,281 @@
+import json
+import unittest
+from os.path import join
+from tempfile import TemporaryDirectory
+from threading import Barrier
+from unittest.mock import MagicMock, patch
+
+from botocore.exceptions import ClientError
+
+from domino_cdk.lookups import DominoLookupCache, OfflineLookupError
+
+AZS = {"AvailabilityZones": [{"ZoneName": "us-west-2a"}, {"ZoneName": "us-west-2b"}]}
+
+
+class TestDominoLookupCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.addCleanup(DominoLookupCache.configure)
+
+    def lookups(self, **kwargs) -> DominoLookupCache:
+        return DominoLookupCache("1234", "us-west-2", cache_dir=self.tmp.name, **kwargs)
+
+    @patch("domino_cdk.lookups.DominoLookupCache.client")
+    def test_persisted(self, client):
+        client.return_value.describe_availability_zones.return_value = AZS
+
+        self.assertEqual(self.lookups().availability_zones(), ["us-west-2a", "us-west-2b"])
+        self.assertEqual(self.lookups().availability_zones(), ["us-west-2a", "us-west-2b"])
+        client.assert_called_once_with("ec2")
+
+        with open(join(self.tmp.name, "1234.us-west-2.json")) as f:
+            cached = json.load(f)
+        self.assertEqual(cached["lookups"]["availability_zones"]["value"], ["us-west-2a", "us-west-2b"])
+
+    @patch("domino_cdk.lookups.DominoLookupCache.client")
+    def test_ttl_and_refresh(self, client):
+        client.return_value.describe_availability_zones.return_value = AZS
+
+        with patch("domino_cdk.lookups.time", return_value=1000):
+            self.lookups(ttls={"availability_zones": 60}).availability_zones()
+        with patch("domino_cdk.lookups.time", return_value=1059):
+            self.lookups(ttls={"availability_zones": 60}).availability_zones()
+        self.assertEqual(client.call_count, 1)
+        with patch("domino_cdk.lookups.time", return_value=1060):
+            self.lookups(ttls={"availability_zones": 60}).availability_zones()
+        self.assertEqual(client.call_count, 2)
+
+        # Refreshing fetches each lookup once, then reuses it
+        lookups = self.lookups(refresh=True)
+        lookups.availability_zones()
+        lookups.availability_zones()
+        self.assertEqual(client.call_count, 3)
+
+    @patch("domino_cdk.lookups.DominoLookupCache.client")
+    def test_offline(self, client):
+        with self.assertRaises(OfflineLookupError):
+            self.lookups(offline=True).availability_zones()
+
+        client.return_value.describe_availability_zones.return_value = AZS
+        with patch("domino_cdk.lookups.time", return_value=1000):
+            self.lookups().availability_zones()
+
+        # Offline, entries are used however old they are
+        client.reset_mock()
+        with patch("domino_cdk.lookups.time", return_value=10**10):
+            self.assertEqual(self.lookups(offline=True).availability_zones(), ["us-west-2a", "us-west-2b"])
+        client.assert_not_called()
+
+    @patch("domino_cdk.lookups.DominoLookupCache.client")
+    def test_addon_versions(self, client):
+        client.return_value.get_paginator.return_value.paginate.return_value = [
+            {
+                "addons": [
+                    {
+                        "addonName": "vpc-cni",
+                        "type": "networking",
+                        "addonVersions": [
+                            {
+                                "addonVersion": "v1.12.0-eksbuild.1",
+                                "architecture": ["amd64"],
+                                "compatibilities": [{"clusterVersion": "1.24", "defaultVersion": True}],
+                            }
+                        ],
+                    }
+                ]
+            },
+            {
+                "addons": [
+                    {
+                        "addonName": "vpc-cni",
+                        "addonVersions": [
+                            {"addonVersion": "v1.11.0-eksbuild.1", "compatibilities": [{"defaultVersion": False}]}
+                        ],
+                    }
+                ]
+            },
+        ]
+
+        self.assertEqual(
+            self.lookups().addon_versions("1.24"),
+            {
+                "vpc-cni": {
+                    "addonVersions": [
+                        {"addonVersion": "v1.12.0-eksbuild.1", "compatibilities": [{"defaultVersion": True}]},
+                        {"addonVersion": "v1.11.0-eksbuild.1", "compatibilities": [{"defaultVersion": False}]},
+                    ]
+                }
+            },
+        )
+        client.return_value.get_paginator.return_value.paginate.assert_called_once_with(kubernetesVersion="1.24")
+
+    @patch("domino_cdk.lookups.DominoLookupCache.client")
+    def test_instance_types(self, client):
+        ec2 = client.return_value
+        ec2.get_paginator.return_value.paginate.return_value = [
+            {"InstanceTypes": [{"InstanceType": "m5.xlarge"}, {"InstanceType": "c5.2xlarge"}]},
+            {"InstanceTypes": [{"InstanceType": "m6i.xlarge"}, {"InstanceType": "r5.xlarge"}]},
+        ]
+        sizes = {"m5.xlarge": (4, 16384), "c5.2xlarge": (8, 16384), "m6i.xlarge": (4, 16384), "r5.xlarge": (4, 32768)}
+        ec2.describe_instance_types.side_effect = lambda InstanceTypes: {
+            "InstanceTypes": [
+                {
+                    "InstanceType": it,
+                    "VCpuInfo": {"DefaultVCpus": sizes[it][0]},
+                    "MemoryInfo": {"SizeInMiB": sizes[it][1]},
+                }
+                for it in InstanceTypes
+            ]
+        }
+        requirements = {"VCpuCount": {"Min": 4}, "MemoryMiB": {"Min": 8192}}
+
+        # Smallest first: by vCPUs, then memory, then name
+        expected = ["m5.xlarge", "m6i.xlarge", "r5.xlarge", "c5.2xlarge"]
+        self.assertEqual(self.lookups().instance_types(requirements), expected)
+        self.assertEqual(self.lookups().instance_types(requirements), expected)
+        ec2.get_paginator.assert_called_once_with("get_instance_types_from_instance_requirements")
+        ec2.get_paginator.return_value.paginate.assert_called_once_with(
+            ArchitectureTypes=["x86_64"], VirtualizationTypes=["hvm"], InstanceRequirements=requirements
+        )
+        self.assertEqual(
+            [(method.__name__, args) for method, args in self.lookups().required(None, [(requirements, None)])],
+            [("identity", ()), ("availability_zones", ()), ("instance_types", (requirements, None))],
+        )
+
+        # On a custom AMI's architecture
+        ec2.describe_images.return_value = {"Images": [{"Architecture": "arm64"}]}
+        self.assertEqual(self.lookups().instance_types(requirements, "ami-1234"), expected)
+        ec2.describe_images.assert_called_once_with(ImageIds=["ami-1234"])
+        ec2.get_paginator.return_value.paginate.assert_called_with(
+            ArchitectureTypes=["arm64"], VirtualizationTypes=["hvm"], InstanceRequirements=requirements
+        )
+
+    @patch("domino_cdk.lookups.describe_instance_types_batch", 2)
+    @patch("domino_cdk.lookups.DominoLookupCache.client")
+    def test_instance_types_batches(self, client):
+        ec2 = client.return_value
+        ec2.get_paginator.return_value.paginate.return_value = [
+            {"InstanceTypes": [{"InstanceType": it} for it in ["a.large", "b.large", "c.large"]]}
+        ]
+        ec2.describe_instance_types.side_effect = lambda InstanceTypes: {
+            "InstanceTypes": [
+                {"InstanceType": it, "VCpuInfo": {"DefaultVCpus": 2}, "MemoryInfo": {"SizeInMiB": 8192}}
+                for it in InstanceTypes
+            ]
+        }
+        self.assertEqual(self.lookups().instance_types({}), ["a.large", "b.large", "c.large"])
+        self.assertEqual(
+            [c.kwargs["InstanceTypes"] for c in ec2.describe_instance_types.call_args_list],
+            [["a.large", "b.large"], ["c.large"]],
+        )
+
+    @patch("domino_cdk.lookups.DominoLookupCache.client")
+    def test_ebs_limits(self, client):
+        client.return_value.describe_instance_types.side_effect = lambda InstanceTypes: {
+            "InstanceTypes": [
+                {
+                    "EbsInfo": {
+                        "EbsOptimizedInfo": {
+                            "BaselineIops": 3600,
+                            "MaximumIops": 18750,
+                            "MaximumThroughputInMBps": 593.75,
+                        }
+                    }
+                    if InstanceTypes == ["m5.xlarge"]
+                    else {"EbsOptimizedSupport": "unsupported"}
+                }
+            ]
+        }
+
+        self.assertEqual(
+            self.lookups().ebs_limits("m5.xlarge"), {"MaximumIops": 18750, "MaximumThroughputInMBps": 593.75}
+        )
+        self.assertEqual(
+            self.lookups().ebs_limits("m5.xlarge"), {"MaximumIops": 18750, "MaximumThroughputInMBps": 593.75}
+        )
+        self.assertIsNone(self.lookups().ebs_limits("t2.micro"))
+        self.assertEqual(client.return_value.describe_instance_types.call_count, 2)
+        self.assertEqual(
+            [(method.__name__, args) for method, args in self.lookups().required(None, None, ["m5.xlarge"] * 2)],
+            [("identity", ()), ("availability_zones", ()), ("ebs_limits", ("m5.xlarge",))],
+        )
+
+    @patch("domino_cdk.lookups.requests_get")
+    def test_manifest(self, requests_get):
+        requests_get.return_value = MagicMock(text="kind: DaemonSet")
+        self.assertEqual(self.lookups().manifest("https://example.com/m.yaml"), "kind: DaemonSet")
+        self.assertEqual(self.lookups().manifest("https://example.com/m.yaml"), "kind: DaemonSet")
+        requests_get.assert_called_once_with("https://example.com/m.yaml")
+        requests_get.return_value.raise_for_status.assert_called_once_with()
+
+    def test_for_env(self):
+        DominoLookupCache.configure(cache_dir=self.tmp.name, offline=True)
+        lookups = DominoLookupCache.for_env(1234, "us-west-2")
+        self.assertIs(lookups, DominoLookupCache.for_env("1234", "us-west-2"))
+        self.assertTrue(lookups.offline)
+        self.assertEqual(lookups.cache_file, join(self.tmp.name, "1234.us-west-2.json"))
+        self.assertIsNot(lookups, DominoLookupCache.for_env("1234", "us-east-1"))
+
+    def test_prefetch(self):
+        lookups = self.lookups()
+        self.assertEqual(
+            [(method.__name__, args) for method, args in lookups.required("1.27")],
+            [("identity", ()), ("availability_zones", ()), ("addon_versions", ("1.27",))],
+        )
+        self.assertEqual(
+            [method.__name__ for method, _ in lookups.required("1.24")],
+            ["identity", "availability_zones", "addon_versions", "manifest", "manifest"],
+        )
+        self.assertEqual(len(lookups.required(None)), 2)
+
+        # Every fetch waits for all the others, so this only completes if they run at the same time
+        barrier = Barrier(5, timeout=5)
+
+        def fetch(value):
+            def f(*args, **kwargs):
+                barrier.wait()
+                return value
+
+            return f
+
+        client = MagicMock()
+        client.get_caller_identity.side_effect = fetch({"Account": "1234", "Arn": "arn", "UserId": "user"})
+        client.describe_availability_zones.side_effect = fetch(AZS)
+        client.get_paginator.return_value.paginate.side_effect = fetch([{"addons": []}])
+        with patch.object(DominoLookupCache, "client", return_value=client), patch(
+            "domino_cdk.lookups.requests_get", side_effect=fetch(MagicMock(text="kind: DaemonSet"))
+        ):
+            lookups.prefetch("1.24")
+
+        self.assertEqual(
+            sorted(lookups.entries),
+            [
+                "addon_versions:1.24",
+                "availability_zones",
+                "identity",
+                "manifest:https://raw.githubusercontent.com/aws/amazon-vpc-cni-k8s/v1.11.0/config/master/calico-crs.yaml",
+                "manifest:https://raw.githubusercontent.com/aws/amazon-vpc-cni-k8s/v1.11.0/config/master/calico-operator.yaml",
+            ],
+        )
+        with open(join(self.tmp.name, "1234.us-west-2.json")) as f:
+            self.assertEqual(len(json.load(f)["lookups"]), 5)
+
+    def test_prefetch_invalid_instance_type(self):
+        lookups = self.lookups()
+        client = MagicMock()
+        client.get_caller_identity.return_value = {"Account": "1234", "Arn": "arn", "UserId": "user"}
+        client.describe_availability_zones.return_value = AZS
+        client.describe_instance_types.side_effect = ClientError(
+            {"Error": {"Code": "InvalidInstanceType", "Message": "m5.bogus"}}, "DescribeInstanceTypes"
+        )
+        with patch.object(DominoLookupCache, "client", return_value=client):
+            # Left for loading the config to report
+            lookups.prefetch(None, ebs_instance_types=["m5.bogus"])
+            self.assertNotIn("ebs_limits:m5.bogus", lookups.entries)
+
+            client.describe_availability_zones.side_effect = ClientError(
+                {"Error": {"Code": "UnauthorizedOperation", "Message": "denied"}}, "DescribeAvailabilityZones"
+            )
+            with self.assertRaises(ClientError):
+                self.lookups(refresh=True).prefetch(None, ebs_instance_types=["m5.bogus"])
@@ -0,0 +1,102 @@
+import json
+import unittest
+from os.path import join
+from tempfile import TemporaryDirectory
+from time import sleep
+from unittest.mock import MagicMock
+
+from aws_cdk import App, Stack
+from jsii._kernel.providers.process import _NodeProcess
+
+from domino_cdk.profiling import (
+    SYNTH_PROFILE,
+    SYNTH_PROFILE_FOLDED,
+    DominoSynthProfiler,
+)
+
+
+class TestDominoSynthProfiler(unittest.TestCase):
+    def setUp(self):
+        self.app = App()
+        self.profiler = DominoSynthProfiler(self.app)
+
+    def tearDown(self):
+        self.profiler.stop()
+
+    def test_phases(self):
+        with self.profiler.phase("outer"):
+            Stack(self.app, "one")
+            with self.profiler.phase("inner"):
+                Stack(self.app, "two")
+                Stack(self.app, "three")
+
+        inner, outer = self.profiler.phases
+        self.assertEqual(inner["path"], "outer;inner")
+        self.assertEqual(outer["path"], "outer")
+        self.assertEqual(inner["constructs"], 2)
+        self.assertEqual(outer["constructs"], 3)
+        self.assertGreater(inner["jsii_calls"], 0)
+        self.assertGreater(outer["jsii_calls"], inner["jsii_calls"])
+        self.assertGreaterEqual(outer["duration"], inner["duration"])
+
+    def test_counting_excluded(self):
+        def find_all():
+            sleep(0.1)
+            return []
+
+        root = MagicMock()
+        root.node.find_all.side_effect = find_all
+        profiler = DominoSynthProfiler(root)
+        profiler.stop()
+
+        with profiler.phase("outer"):
+            with profiler.phase("inner"):
+                pass
+        inner, outer = profiler.phases
+        self.assertEqual(root.node.find_all.call_count, 4)
+        self.assertLess(outer["duration"], 0.1)
+        self.assertLess(inner["start"], 0.1)
+        self.assertGreaterEqual(profiler.count_time, 0.4)
+
+    def test_folded_self_time(self):
+        self.profiler.phases = [
+            {"name": "outer", "path": "outer", "start": 0.0, "duration": 0.5},
+            {"name": "inner", "path": "outer;inner", "start": 0.1, "duration": 0.2},
+        ]
+        self.assertEqual(self.profiler.folded(), "outer 300000\nouter;inner 200000\n")
+
+    def test_write(self):
+        with self.profiler.phase("stack"):
+            Stack(self.app, "stack")
+        with TemporaryDirectory() as outdir:
+            with open(join(outdir, "stack.template.json"), "w") as f:
+                json.dump({"Resources": {"a": {}, "b": {}}}, f)
+
+            report_file = self.profiler.write(outdir)
+            self.assertEqual(report_file, join(outdir, SYNTH_PROFILE))
+            with open(report_file) as f:
+                report = json.load(f)
+            with open(join(outdir, SYNTH_PROFILE_FOLDED)) as f:
+                folded = f.read()
+
+        self.assertEqual([p["name"] for p in report["phases"]], ["stack"])
+        self.assertEqual(report["templates"]["stack.template.json"]["resources"], 2)
+        self.assertEqual(report["traceEvents"][0]["ph"], "X")
+        self.assertEqual(report["traceEvents"][0]["args"]["constructs"], 1)
+        self.assertTrue(folded.startswith("stack "))
+
+    def test_stop(self):
+        self.assertIsNot(_NodeProcess.send, self.profiler._send)
+        send = self.profiler._send
+        self.profiler.stop()
+        self.assertIs(_NodeProcess.send, send)
+
+    def test_disabled(self):
+        self.profiler.stop()
+        send = _NodeProcess.send
+        profiler = DominoSynthProfiler(self.app, enabled=False)
+        self.assertIs(_NodeProcess.send, send)
+
+        with profiler.phase("nothing"):
+            Stack(self.app, "stack")
+        self.assertEqual(profiler.phases, [])
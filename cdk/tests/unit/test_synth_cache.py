@@ -0,0 +1,150 @@
+import json
+import unittest
+from copy import deepcopy
+from os import chdir, makedirs, remove
+from os.path import abspath, dirname, join
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from domino_cdk.config.template import config_template
+from domino_cdk.synth_cache import SYNTH_CACHE, DominoSynthCache
+
+# Where the tests return to, rather than the working directory they're started in, which an earlier test may have
+# deleted
+CDK_DIR = dirname(dirname(dirname(abspath(__file__))))
+
+
+class TestDominoSynthCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.outdir = self.tmp.name
+        self.cfg = config_template()
+
+        with open(join(self.outdir, "manifest.json"), "w") as f:
+            json.dump(
+                {
+                    "artifacts": {
+                        "domino.assets": {"type": "cdk:asset-manifest", "properties": {"file": "domino.assets.json"}},
+                        "domino": {
+                            "type": "aws:cloudformation:stack",
+                            "properties": {"templateFile": "domino.template.json"},
+                        },
+                    }
+                },
+                f,
+            )
+        with open(join(self.outdir, "domino.assets.json"), "w") as f:
+            json.dump(
+                {
+                    "files": {
+                        "aaaa": {"source": {"path": "asset.aaaa", "packaging": "zip"}},
+                        "bbbb": {"source": {"path": "dominoEksStack.nested.template.json", "packaging": "file"}},
+                    }
+                },
+                f,
+            )
+        makedirs(join(self.outdir, "asset.aaaa"))
+        for fn in ["domino.template.json", "dominoEksStack.nested.template.json"]:
+            with open(join(self.outdir, fn), "w") as f:
+                f.write("{}")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def cache(self, cfg=None, context=None) -> DominoSynthCache:
+        return DominoSynthCache(self.outdir, cfg or self.cfg, context or {"offline": "true"})
+
+    def test_reuse(self):
+        cache = self.cache()
+        self.assertFalse(cache.reusable())
+        cache.save()
+
+        with open(join(self.outdir, SYNTH_CACHE)) as f:
+            self.assertEqual(
+                json.load(f)["files"],
+                [
+                    "asset.aaaa",
+                    "domino.assets.json",
+                    "domino.template.json",
+                    "dominoEksStack.nested.template.json",
+                    "manifest.json",
+                ],
+            )
+        self.assertTrue(self.cache().reusable())
+        self.assertFalse(self.cache(context={"offline": "true", "singlestack": "true"}).reusable())
+
+        remove(join(self.outdir, "dominoEksStack.nested.template.json"))
+        cache = self.cache()
+        self.assertEqual(cache.stale(), [])
+        self.assertFalse(cache.reusable())
+
+    def test_stale_stacks(self):
+        self.cache().save()
+
+        cfg = deepcopy(self.cfg)
+        cfg.eks.unmanaged_nodegroups["compute-0"].max_size = 20
+        self.assertEqual(self.cache(cfg).stale(), ["EksStack", "EfsStack", "root"])
+
+        cfg = deepcopy(self.cfg)
+        cfg.s3.buckets.blobs.removal_policy_destroy = True
+        self.assertEqual(self.cache(cfg).stale(), ["S3Stack", "VpcStack", "EksStack", "EfsStack", "root"])
+
+        cfg = deepcopy(self.cfg)
+        cfg.tags = {"team": "ml"}
+        self.assertEqual(len(self.cache(cfg).stale()), 6)
+
+    def test_stale_environment(self):
+        self.cache().save()
+
+        with patch("domino_cdk.synth_cache.version", return_value="2.999.0"):
+            self.assertEqual(len(self.cache().stale()), 6)
+
+        self.addCleanup(chdir, CDK_DIR)
+        chdir(self.outdir)
+        self.cache().save()
+        for fn in ["cdk.json", "calico-operator.yaml"]:
+            with open(join(self.outdir, fn), "a") as f:
+                f.write("changed")
+            self.assertEqual(len(self.cache().stale()), 6)
+            self.cache().save()
+
+        # Either script building the app, wherever it's run from
+        cache = DominoSynthCache(self.outdir, self.cfg, {"offline": "true"}, app_dir=self.outdir)
+        cache.save()
+        with open(join(self.outdir, "fleet.py"), "w") as f:
+            f.write("changed")
+        self.assertEqual(
+            len(DominoSynthCache(self.outdir, self.cfg, {"offline": "true"}, app_dir=self.outdir).stale()), 6
+        )
+
+    def test_nodegroup_stack_replay(self):
+        nodegroups = {"unmanaged": {"compute-0": {"max_size": 10}}, "managed": {}}
+        replay = {"template": "dominoEksStack.nested.template.json", "untagged": {"unmanaged": {"compute-0": ["LT"]}}}
+        cache = self.cache()
+        cache.nodegroup_stack_key("NodegroupStack1", nodegroups)
+        cache.replays["NodegroupStack1"] = replay
+        cache.save()
+
+        # Recorded with the hash its template is uploaded under
+        cache = self.cache()
+        self.assertIsNone(cache.replay("NodegroupStack1"))
+        cache.nodegroup_stack_key("NodegroupStack1", nodegroups)
+        self.assertEqual(cache.replay("NodegroupStack1"), {**replay, "hash": "bbbb"})
+        cache.nodegroup_stack_key("NodegroupStack1", {**nodegroups, "managed": {"compute-1": {}}})
+        self.assertIsNone(cache.replay("NodegroupStack1"))
+
+        # Nodegroups elsewhere don't change the key, the rest of the EKS stack's inputs do
+        cfg = deepcopy(self.cfg)
+        cfg.eks.unmanaged_nodegroups["platform-0"].max_size = 20
+        cache = self.cache(cfg)
+        cache.nodegroup_stack_key("NodegroupStack1", nodegroups)
+        self.assertTrue(cache.replay("NodegroupStack1"))
+        cfg.eks.version = "1.23"
+        cache = self.cache(cfg)
+        cache.nodegroup_stack_key("NodegroupStack1", nodegroups)
+        self.assertIsNone(cache.replay("NodegroupStack1"))
+
+        remove(join(self.outdir, "dominoEksStack.nested.template.json"))
+        cache = self.cache()
+        cache.nodegroup_stack_key("NodegroupStack1", nodegroups)
+        self.assertIsNone(cache.replay("NodegroupStack1"))
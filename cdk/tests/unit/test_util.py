@@ -0,0 +1,387 @@
+import json
+import unittest
+from glob import glob
+from hashlib import sha256
+from io import BytesIO
+from os import chmod, makedirs, stat, utime
+from os.path import basename, join
+from tempfile import TemporaryDirectory
+from unittest.mock import MagicMock, patch
+from zipfile import ZipFile
+
+from ruamel.yaml import YAML
+from ruamel.yaml.comments import CommentedMap
+
+from domino_cdk.util import UPLOAD_MANIFEST, DominoCdkUtil
+
+
+def asset(path: str, source_hash: str) -> dict:
+    return {
+        "type": "aws:cdk:asset",
+        "data": {
+            "path": path,
+            "sourceHash": source_hash,
+            "artifactHashParameter": f"{path}ArtifactHash",
+            "s3BucketParameter": f"{path}S3Bucket",
+            "s3KeyParameter": f"{path}S3VersionKey",
+        },
+    }
+
+
+def populate(asset_dir: str, path: str, mtime: int = 1600000000):
+    makedirs(join(asset_dir, path, "bin"))
+    with open(join(asset_dir, path, "index.py"), "w") as f:
+        f.write("def handler(event, context):\n    pass\n")
+    with open(join(asset_dir, path, "bin", "kubectl"), "w") as f:
+        f.write("#!/bin/sh\n")
+    chmod(join(asset_dir, path, "bin", "kubectl"), 0o755)
+    for p in ["index.py", "bin/kubectl", "bin", ""]:
+        utime(join(asset_dir, path, p), (mtime, mtime))
+
+
+def file_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return sha256(f.read()).hexdigest()
+
+
+class TestDominoCdkUtil(unittest.TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory()
+        self.asset_dir = join(self.tmp.name, "cdk.out")
+        self.index_dir = join(self.tmp.name, "cdk.out.templates")
+        makedirs(self.asset_dir)
+        populate(self.asset_dir, "asset.aaaa")
+        populate(self.asset_dir, "asset.bbbb")
+        with open(join(self.asset_dir, "asset.cccc.json"), "w") as f:
+            f.write('{"Resources": {}}')
+        self.cfg = {
+            "metadata": [
+                asset("asset.aaaa", "aaaa"),
+                asset("asset.bbbb", "bbbb"),
+                asset("asset.cccc.json", "cccc"),
+                {"type": "aws:cdk:logicalId", "data": "SomeResource"},
+            ]
+        }
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_generate_asset_parameters(self):
+        params = DominoCdkUtil.generate_asset_parameters(self.asset_dir, "some-bucket", self.cfg, jobs=2)
+        self.assertEqual(
+            params,
+            {
+                "asset.aaaaArtifactHash": "aaaa",
+                "asset.aaaaS3Bucket": "some-bucket",
+                "asset.aaaaS3VersionKey": "||asset.aaaa.zip",
+                "asset.bbbbArtifactHash": "bbbb",
+                "asset.bbbbS3Bucket": "some-bucket",
+                "asset.bbbbS3VersionKey": "||asset.bbbb.zip",
+                "asset.cccc.jsonArtifactHash": "cccc",
+                "asset.cccc.jsonS3Bucket": "some-bucket",
+                "asset.cccc.jsonS3VersionKey": "||asset.cccc.json",
+            },
+        )
+
+        with ZipFile(join(self.asset_dir, "asset.aaaa.zip")) as z:
+            self.assertEqual(z.namelist(), ["bin/", "index.py", "bin/kubectl"])
+            self.assertEqual(z.getinfo("bin/kubectl").external_attr >> 16 & 0o777, 0o755)
+            self.assertEqual(z.comment, b"aaaa")
+
+    def test_zip_is_deterministic(self):
+        with TemporaryDirectory() as other_dir:
+            populate(other_dir, "asset.aaaa", mtime=1700000000)
+            DominoCdkUtil.zip_directory(join(self.asset_dir, "asset.aaaa"), join(self.asset_dir, "a.zip"), 6)
+            DominoCdkUtil.zip_directory(join(other_dir, "asset.aaaa"), join(other_dir, "a.zip"), 6)
+            with open(join(self.asset_dir, "a.zip"), "rb") as a, open(join(other_dir, "a.zip"), "rb") as b:
+                self.assertEqual(a.read(), b.read())
+
+    def test_zip_skips_top_level_dotfiles(self):
+        src = join(self.asset_dir, "asset.aaaa")
+        makedirs(join(src, ".git"))
+        for name in [".env", "bin/.keep"]:
+            with open(join(src, name), "w") as f:
+                f.write("")
+        DominoCdkUtil.zip_directory(src, join(self.asset_dir, "a.zip"))
+        with ZipFile(join(self.asset_dir, "a.zip")) as z:
+            self.assertEqual(z.namelist(), ["bin/", "index.py", "bin/.keep", "bin/kubectl"])
+
+    def test_zip_failure_removes_temp_file(self):
+        with patch("domino_cdk.util.ZipFile.writestr", side_effect=OSError("disk full")):
+            with self.assertRaisesRegex(OSError, "disk full"):
+                DominoCdkUtil.zip_directory(join(self.asset_dir, "asset.aaaa"), join(self.asset_dir, "a.zip"))
+        self.assertEqual(glob(join(self.asset_dir, "a.zip*")), [])
+
+    def test_unchanged_assets_are_not_rezipped(self):
+        DominoCdkUtil.generate_asset_parameters(self.asset_dir, "some-bucket", self.cfg, jobs=1)
+        zipped = stat(join(self.asset_dir, "asset.aaaa.zip")).st_mtime_ns
+
+        with patch.object(DominoCdkUtil, "zip_directory") as zip_directory:
+            DominoCdkUtil.generate_asset_parameters(self.asset_dir, "some-bucket", self.cfg, jobs=1)
+            zip_directory.assert_not_called()
+
+        self.cfg["metadata"][0]["data"]["sourceHash"] = "aaaa2"
+        with patch.object(DominoCdkUtil, "zip_directory") as zip_directory:
+            DominoCdkUtil.generate_asset_parameters(self.asset_dir, "some-bucket", self.cfg, 3, jobs=1)
+            zip_directory.assert_called_once_with(
+                join(self.asset_dir, "asset.aaaa"), join(self.asset_dir, "asset.aaaa.zip"), 3, "aaaa2"
+            )
+
+        self.assertEqual(stat(join(self.asset_dir, "asset.aaaa.zip")).st_mtime_ns, zipped)
+
+    def test_missing_asset_directory(self):
+        self.cfg["metadata"].append(asset("asset.dddd", "dddd"))
+        with self.assertRaises(FileNotFoundError):
+            DominoCdkUtil.generate_asset_parameters(self.asset_dir, "some-bucket", self.cfg, jobs=1)
+
+    def test_content_addressed_asset_parameters(self):
+        upload_manifest = {}
+        params = DominoCdkUtil.generate_asset_parameters(
+            self.asset_dir, "some-bucket", self.cfg, jobs=1, upload_manifest=upload_manifest
+        )
+        zip_hash = file_hash(join(self.asset_dir, "asset.aaaa.zip"))
+        json_hash = file_hash(join(self.asset_dir, "asset.cccc.json"))
+
+        self.assertEqual(params["asset.aaaaS3VersionKey"], f"||assets/{zip_hash}.zip")
+        self.assertEqual(params["asset.cccc.jsonS3VersionKey"], f"||assets/{json_hash}.json")
+        self.assertEqual(params["asset.aaaaArtifactHash"], "aaaa")
+        self.assertEqual(
+            upload_manifest[json_hash], {"key": f"assets/{json_hash}.json", "source": "asset.cccc.json", "size": 17}
+        )
+        self.assertEqual(upload_manifest[zip_hash]["source"], "asset.aaaa.zip")
+        self.assertEqual(len(upload_manifest), 3)
+
+    def test_terraform_bootstrap_upload_manifest(self):
+        stack = "test-eks-stack"
+        with open(join(self.asset_dir, "manifest.json"), "w") as f:
+            json.dump(
+                {
+                    "artifacts": {
+                        "Tree": {},
+                        f"{stack}.assets": {},
+                        stack: {
+                            "environment": "aws://1234/us-west-2",
+                            "metadata": {f"/{stack}": self.cfg["metadata"]},
+                        },
+                    }
+                },
+                f,
+            )
+        with open(join(self.asset_dir, f"{stack}.template.json"), "w") as f:
+            f.write("{}")
+
+        module = DominoCdkUtil.generate_terraform_bootstrap(
+            "./terraform", "some-bucket", self.asset_dir, None, "/out", jobs=1, content_addressed_assets=True
+        )["module"]["cdk"]
+
+        with open(join(self.asset_dir, UPLOAD_MANIFEST)) as f:
+            upload_manifest = json.load(f)
+        self.assertEqual(upload_manifest["bucket"], "some-bucket")
+        self.assertEqual(upload_manifest["region"], "us-west-2")
+        self.assertIn(module["template_filename"], [o["key"] for o in upload_manifest["objects"].values()])
+        self.assertEqual(
+            module["asset_manifest"],
+            {k: {"key": v["key"], "source": v["source"]} for k, v in upload_manifest["objects"].items()},
+        )
+        self.assertTrue(module["upload_assets"])
+
+        module = DominoCdkUtil.generate_terraform_bootstrap(
+            "./terraform", "some-bucket", self.asset_dir, None, "/out", jobs=1
+        )["module"]["cdk"]
+        self.assertNotIn("asset_manifest", module)
+        self.assertEqual(module["parameters"]["asset.aaaaS3VersionKey"], "||asset.aaaa.zip")
+
+    def test_upload_assets(self):
+        upload_manifest = {}
+        DominoCdkUtil.generate_asset_parameters(
+            self.asset_dir, "some-bucket", self.cfg, jobs=1, upload_manifest=upload_manifest
+        )
+        upload_manifest["template"] = {"key": "stack.template.json", "source": "asset.cccc.json", "size": 17}
+        manifest_file = join(self.asset_dir, UPLOAD_MANIFEST)
+        with open(manifest_file, "w") as f:
+            json.dump({"bucket": "some-bucket", "region": "us-west-2", "objects": upload_manifest}, f)
+
+        present = upload_manifest[file_hash(join(self.asset_dir, "asset.aaaa.zip"))]["key"]
+        s3 = MagicMock()
+        s3.get_paginator.return_value.paginate.return_value = [{"Contents": [{"Key": present}]}, {}]
+
+        result = DominoCdkUtil.upload_assets(manifest_file, s3_client=s3)
+
+        s3.get_paginator.return_value.paginate.assert_called_once_with(Bucket="some-bucket", Prefix="assets/")
+        self.assertEqual(result["skipped"], [present])
+        self.assertEqual(len(result["uploaded"]), 3)
+        self.assertIn("stack.template.json", result["uploaded"])
+        uploaded = sorted((c.args[0], c.args[2]) for c in s3.upload_file.call_args_list)
+        self.assertEqual(
+            uploaded,
+            sorted(
+                (join(self.asset_dir, o["source"]), o["key"]) for o in upload_manifest.values() if o["key"] != present
+            ),
+        )
+
+    def write_template(self, stack: str, body: str):
+        with open(join(self.asset_dir, f"{stack}.template.json"), "w") as f:
+            f.write(body)
+
+    def test_store_template(self):
+        self.write_template("stack", '{"v": 1}')
+        with patch("domino_cdk.util.time", return_value=1000):
+            first = DominoCdkUtil.store_template(self.asset_dir, "stack")
+            self.assertEqual(first, "stack-1000.template.json")
+            # Same content, same template; new content in the same second gets the next free timestamp
+            self.assertEqual(DominoCdkUtil.store_template(self.asset_dir, "stack"), first)
+            self.write_template("stack", '{"v": 2}')
+            self.assertEqual(DominoCdkUtil.store_template(self.asset_dir, "stack"), "stack-1001.template.json")
+
+        # Reverting reuses the original copy, not just the newest one
+        self.write_template("stack", '{"v": 1}')
+        with patch("domino_cdk.util.time", return_value=2000):
+            self.assertEqual(DominoCdkUtil.store_template(self.asset_dir, "stack"), first)
+
+        with open(join(self.index_dir, "stack.templates.json")) as f:
+            index = json.load(f)
+        self.assertEqual(
+            sorted((v["filename"], v["last_used"]) for v in index.values()),
+            [("stack-1000.template.json", 2000), ("stack-1001.template.json", 1000)],
+        )
+        with open(join(self.asset_dir, "stack-1001.template.json")) as f:
+            self.assertEqual(f.read(), '{"v": 2}')
+
+    def test_store_template_retention(self):
+        for i in range(4):
+            self.write_template("stack", f'{{"v": {i}}}')
+            with patch("domino_cdk.util.time", return_value=1000 + i * 10):
+                latest = DominoCdkUtil.store_template(self.asset_dir, "stack", retention=2)
+
+        self.assertEqual(latest, "stack-1030.template.json")
+        self.assertEqual(
+            sorted(basename(f) for f in glob(join(self.asset_dir, "stack-*.template.json"))),
+            ["stack-1020.template.json", "stack-1030.template.json"],
+        )
+        with open(join(self.index_dir, "stack.templates.json")) as f:
+            self.assertEqual(len(json.load(f)), 2)
+
+    def test_store_template_adopts_unindexed_templates(self):
+        self.write_template("stack", '{"v": 1}')
+        for ts, body in [(1000, '{"v": 1}'), (1010, '{"v": 2}'), (1020, '{"v": 3}')]:
+            with open(join(self.asset_dir, f"stack-{ts}.template.json"), "w") as f:
+                f.write(body)
+
+        with patch("domino_cdk.util.time", return_value=2000):
+            self.assertEqual(
+                DominoCdkUtil.store_template(self.asset_dir, "stack", retention=2), "stack-1000.template.json"
+            )
+
+        self.assertEqual(
+            sorted(basename(f) for f in glob(join(self.asset_dir, "stack-*.template.json"))),
+            ["stack-1000.template.json", "stack-1020.template.json"],
+        )
+
+    def test_store_template_moves_index_out_of_asset_dir(self):
+        self.write_template("stack", '{"v": 1}')
+        with open(join(self.asset_dir, "stack-1000.template.json"), "w") as f:
+            f.write('{"v": 1}')
+        with open(join(self.asset_dir, "stack.templates.json"), "w") as f:
+            f.write(
+                json.dumps(
+                    {
+                        file_hash(join(self.asset_dir, "stack.template.json")): {
+                            "filename": "stack-1000.template.json",
+                            "last_used": 1000,
+                        }
+                    }
+                )
+            )
+
+        with patch("domino_cdk.util.time", return_value=2000):
+            self.assertEqual(DominoCdkUtil.store_template(self.asset_dir, "stack"), "stack-1000.template.json")
+
+        self.assertEqual(glob(join(self.asset_dir, "*.templates.json")), [])
+        with open(join(self.index_dir, "stack.templates.json")) as f:
+            self.assertEqual([v["last_used"] for v in json.load(f).values()], [2000])
+
+    def test_record_context(self):
+        with TemporaryDirectory() as tmp:
+            context_file = join(tmp, "cdk.context.json")
+            with open(context_file, "w") as f:
+                json.dump({"other": "value", "nodegroup_stacks": {"one": {"managed": {"a": 0}}}}, f)
+
+            placements = {"two": {"managed": {"b": 1}, "unmanaged": {}}}
+            self.assertTrue(DominoCdkUtil.record_context("nodegroup_stacks", placements, context_file))
+            self.assertFalse(DominoCdkUtil.record_context("nodegroup_stacks", placements, context_file))
+            with open(context_file) as f:
+                self.assertEqual(
+                    json.load(f),
+                    {"other": "value", "nodegroup_stacks": {"one": {"managed": {"a": 0}}, **placements}},
+                )
+
+            new_file = join(tmp, "new", "cdk.context.json")
+            makedirs(join(tmp, "new"))
+            self.assertTrue(DominoCdkUtil.record_context("nodegroup_stacks", placements, new_file))
+            with open(new_file) as f:
+                self.assertEqual(json.load(f), {"nodegroup_stacks": placements})
+
+    def test_yaml_dump_plain_matches_round_trip(self):
+        data = {
+            "name": "test",
+            "unset": None,
+            "tags": {"a": "b: c", "n": "123"},
+            "user_data": "#!/bin/bash\necho 'hi'\n",
+            "version": "1.24",
+            "list": [{"x": 1, "y": True}, "  lead"],
+        }
+        buf = BytesIO()
+        YAML().dump(data, buf)
+        self.assertEqual(DominoCdkUtil.ruamel_dump(data), buf.getvalue().decode())
+        self.assertEqual(DominoCdkUtil.yaml_load(DominoCdkUtil.ruamel_dump(data)), data)
+
+    def test_yaml_dump_keeps_comments(self):
+        data = CommentedMap({"a": 1, "b": 2})
+        data.yaml_set_comment_before_after_key("b", before="about b")
+        self.assertEqual(DominoCdkUtil.ruamel_dump(data), "a: 1\n# about b\nb: 2\n")
+
+    def test_deep_merge(self):
+        base = {"a": {"b": 1, "c": {"d": 2}}, "e": [1], "f": {"g": 3}}
+        merged = DominoCdkUtil.deep_merge(base, None, {"a": {"c": {"h": 4}}, "e": [2]}, {"a": {"b": 5}, "i": 6})
+        self.assertEqual(merged, {"a": {"b": 5, "c": {"d": 2, "h": 4}}, "e": [2], "f": {"g": 3}, "i": 6})
+        # Subtrees only one dictionary provides are shared
+        self.assertIs(merged["f"], base["f"])
+
+        # A non-dict value cuts off what was merged before it
+        self.assertEqual(DominoCdkUtil.deep_merge({"a": {"b": 1}}, {"a": None}, {"a": {"c": 2}}), {"a": {"c": 2}})
+        self.assertIs(DominoCdkUtil.deep_merge(base), base)
+        self.assertEqual(DominoCdkUtil.deep_merge(), {})
+        with self.assertRaises(TypeError):
+            DominoCdkUtil.deep_merge({}, [])
+        with self.assertRaises(ValueError):
+            DominoCdkUtil.deep_merge({}, {}, list_strategy="prepend")
+
+    def test_deep_merge_list_strategies(self):
+        alpha = {"l": [{"name": "x", "v": 1}, {"name": "y"}, 3]}
+        omega = {"l": [{"name": "x", "w": 2}, 4]}
+        self.assertEqual(DominoCdkUtil.deep_merge(alpha, omega), omega)
+        self.assertEqual(DominoCdkUtil.deep_merge(alpha, omega, list_strategy="append"), {"l": alpha["l"] + omega["l"]})
+        self.assertEqual(
+            DominoCdkUtil.deep_merge(alpha, omega, list_strategy="by_key"),
+            {"l": [{"name": "x", "v": 1, "w": 2}, {"name": "y"}, 3, 4]},
+        )
+        self.assertEqual(
+            DominoCdkUtil.deep_merge(alpha, {"l": [{"id": "y", "z": 1}]}, list_strategy="by_key", list_key="id"),
+            {"l": alpha["l"] + [{"id": "y", "z": 1}]},
+        )
+
+    def test_deep_merge_many_deep_layers(self):
+        layers = [{"o": {f"k{i}": i}} for i in range(5000)]
+        self.assertEqual(DominoCdkUtil.deep_merge(*layers), {"o": {f"k{i}": i for i in range(5000)}})
+
+        def chain(depth: int, leaf_value: dict) -> dict:
+            top = leaf = {}
+            for _ in range(depth):
+                leaf = leaf.setdefault("n", {})
+            leaf.update(leaf_value)
+            return top
+
+        merged = DominoCdkUtil.deep_merge(chain(5000, {"a": 1}), chain(5000, {"b": 2}))
+        for _ in range(5000):
+            merged = merged["n"]
+        self.assertEqual(merged, {"a": 1, "b": 2})
@@ -4,18 +4,43 @@ import argparse
 from json import dumps as json_dumps
 from sys import stdout
 
-from ruamel.yaml import YAML, SafeLoader
-from ruamel.yaml import load as yaml_load
-
 from domino_cdk import __version__
 from domino_cdk.config import config_loader
+from domino_cdk.config.diff import affected_stacks
+from domino_cdk.config.diff import config_diff as diff_configs
 from domino_cdk.config.iam import generate_iam
 from domino_cdk.config.template import config_template
-from domino_cdk.util import DominoCdkUtil
+from domino_cdk.lookups import DominoLookupCache
+from domino_cdk.util import UPLOAD_MANIFEST, DominoCdkUtil
 
 DEFAULT_TF_MODULE_PATH = f"https://github.com/dominodatalab/cdk-cf-eks/releases/download/v{__version__}/domino-cdk-terraform-{__version__}.tar.gz"
 
 
+def positive_int(s: str) -> int:
+    value = int(s)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"{s} is not at least 1")
+    return value
+
+
+def add_asset_zip_args(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--compression-level",
+        help="Zip compression level for directory assets (0-9, lower is faster)",
+        default=9,
+        type=int,
+        choices=range(10),
+        metavar="{0-9}",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="Parallel processes zipping directory assets; None uses every cpu",
+        default=None,
+        type=positive_int,
+    )
+
+
 def parse_args():
     parser = argparse.ArgumentParser(
         description="domino_cdk utility", formatter_class=argparse.ArgumentDefaultsHelpFormatter
@@ -99,6 +124,7 @@ def parse_args():
         default="__FILL__",
     )
     asset_parser.add_argument("-d", "--dir", help="Directory with rendered CDK assets (optional)", default="cdk.out")
+    add_asset_zip_args(asset_parser)
     asset_parser.set_defaults(func=generate_asset_parameters)
 
     tf_bootstrap_parser = subparsers.add_parser(
@@ -131,6 +157,12 @@ def parse_args():
         action="store_true",
         default=False,
     )
+    tf_bootstrap_parser.add_argument(
+        "--template-retention",
+        help="How many of the most recently used timestamped templates to keep in the asset directory (0 keeps all)",
+        default=10,
+        type=int,
+    )
     tf_bootstrap_parser.add_argument(
         "--iam-role-arn", help="IAM Role to assign to CloudFormation stack (optional)", default=None
     )
@@ -145,8 +177,70 @@ def parse_args():
         help="Disable rollback on stack provisioniong failures",
         action="store_true",
     )
+    tf_bootstrap_parser.add_argument(
+        "--content-addressed-assets",
+        help=f"Key asset objects by content hash and write an upload manifest ({UPLOAD_MANIFEST}) to the asset directory",
+        action="store_true",
+    )
+    tf_bootstrap_parser.add_argument(
+        "--external-asset-upload",
+        help="Leave uploading content-addressed assets to upload_assets instead of terraform",
+        action="store_true",
+    )
+    add_asset_zip_args(tf_bootstrap_parser)
     tf_bootstrap_parser.set_defaults(func=generate_terraform_bootstrap)
 
+    upload_parser = subparsers.add_parser(
+        "upload_assets",
+        help="Upload assets missing from the asset bucket",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    upload_parser.add_argument(
+        "-m",
+        "--manifest",
+        help="Upload manifest written by generate_terraform_bootstrap --content-addressed-assets",
+        default=f"cdk.out/{UPLOAD_MANIFEST}",
+    )
+    upload_parser.add_argument("-b", "--bucket", help="Asset bucket, if not the manifest's", default=None)
+    upload_parser.add_argument(
+        "-d", "--dir", help="Directory with rendered CDK assets, if not the manifest's", default=None
+    )
+    upload_parser.add_argument("-j", "--jobs", help="Concurrent uploads", default=8, type=positive_int)
+    upload_parser.add_argument(
+        "--multipart-threshold", help="Size in MiB above which files are uploaded in parts", default=64, type=int
+    )
+    upload_parser.set_defaults(func=upload_assets)
+
+    lookups_parser = subparsers.add_parser(
+        "refresh_lookups",
+        help="Refresh the cached synth-time lookups (AZs, addon versions, manifests, identity) for a config",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    lookups_parser.add_argument("-f", "--file", help="Config file to refresh lookups for", default="config.yaml")
+    lookups_parser.add_argument(
+        "-c", "--cache-dir", help="Lookup cache directory (app.py's lookup_cache context)", default="cdk.lookups"
+    )
+    lookups_parser.set_defaults(func=refresh_lookups)
+
+    diff_parser = subparsers.add_parser(
+        "config_diff",
+        help="Show which stacks and resources a config change affects, without synthesizing",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    diff_parser.add_argument("old", help="Config file currently deployed")
+    diff_parser.add_argument("new", help="Config file to compare it to")
+    diff_parser.add_argument(
+        "-c",
+        "--cache-dir",
+        help="Lookup cache directory to check nodegroup availability zones against, if it has them",
+        default="cdk.lookups",
+    )
+    diff_parser.add_argument("--json", help="Print the changes as JSON", default=False, action="store_true")
+    diff_parser.add_argument(
+        "--exit-code", help="Exit with 1 if anything changes, like git diff", default=False, action="store_true"
+    )
+    diff_parser.set_defaults(func=config_diff)
+
     args = parser.parse_args()
 
     if not hasattr(args, "func"):
@@ -157,7 +251,7 @@ def parse_args():
 
 
 def generate_config_template(args):
-    YAML().dump(
+    DominoCdkUtil.yaml_dump(
         config_template(
             name=args.name,
             aws_region=args.aws_region,
@@ -200,19 +294,68 @@ def generate_iam_policies(args):
 def load_config(args):
     print(f"Loading config {args.file or 'from stdin'}...")
     with open(args.file or 0) as f:
-        cfg = config_loader(yaml_load(f, Loader=SafeLoader))
+        cfg = config_loader(DominoCdkUtil.yaml_load(f))
 
     print("Config loaded successfully")
 
     if args.out_file:
         with open(1 if args.out_file == "-" else args.out_file, "w") as out:
-            YAML().dump(cfg.render(args.no_comments), out)
+            DominoCdkUtil.yaml_dump(cfg.render(args.no_comments), out)
+
+
+def refresh_lookups(args):
+    # Refresh from the start, so the availability zones looked up while loading the config are fetched again too
+    DominoLookupCache.configure(cache_dir=args.cache_dir, refresh=True)
+    with open(args.file) as f:
+        cfg = config_loader(DominoCdkUtil.yaml_load(f))
+
+    lookups = DominoLookupCache.for_env(cfg.aws_account_id, cfg.aws_region)
+    for key in lookups.refresh_all(cfg):
+        print(f"Refreshed {key}")
+    print(f"Wrote {lookups.cache_file}")
+
+
+def config_diff(args):
+    # Never look anything up: nodegroup availability zones are only checked if the cache already has them
+    DominoLookupCache.configure(cache_dir=args.cache_dir, offline=True)
+    cfgs = []
+    for fn in [args.old, args.new]:
+        with open(fn) as f:
+            cfgs.append(config_loader(DominoCdkUtil.yaml_load(f)))
+
+    changes = diff_configs(*cfgs)
+    stacks = affected_stacks(changes)
+
+    if args.json:
+        print(
+            json_dumps(
+                {
+                    "stacks": stacks,
+                    "changes": [{"path": c.name, "old": c.old, "new": c.new, "impact": c.impact} for c in changes],
+                },
+                indent=4,
+                default=str,
+            )
+        )
+    else:
+        for c in changes:
+            print(f"{c.name}: {c.old!r} -> {c.new!r}")
+            for stack, resources in c.impact.items():
+                print(f"    {stack}: {', '.join(resources)}")
+            if not c.impact:
+                print("    no resources")
+        print(f"Affected stacks: {', '.join(stacks) or 'none'}")
+
+    if args.exit_code and changes:
+        exit(1)
 
 
 def generate_asset_parameters(args):
     print(
         json_dumps(
-            DominoCdkUtil.generate_asset_parameters(args.dir, args.bucket),
+            DominoCdkUtil.generate_asset_parameters(
+                args.dir, args.bucket, compression_level=args.compression_level, jobs=args.jobs
+            ),
             indent=4,
         )
     )
@@ -221,6 +364,8 @@ def generate_asset_parameters(args):
 def generate_terraform_bootstrap(args):
     if args.iam_role_arn and args.iam_policy_path:
         raise Exception("Cannot provide both --iam-role-arn and --iam-policy-path!")
+    if args.external_asset_upload and not args.content_addressed_assets:
+        raise Exception("--external-asset-upload requires --content-addressed-assets!")
     print(
         json_dumps(
             DominoCdkUtil.generate_terraform_bootstrap(
@@ -233,12 +378,29 @@ def generate_terraform_bootstrap(args):
                 args.iam_role_arn,
                 args.iam_policy_path,
                 args.disable_rollback,
+                args.compression_level,
+                args.jobs,
+                args.content_addressed_assets,
+                args.external_asset_upload,
+                args.template_retention,
             ),
             indent=4,
         )
     )
 
 
+def upload_assets(args):
+    result = DominoCdkUtil.upload_assets(
+        args.manifest, args.bucket, args.dir, args.jobs, args.multipart_threshold * 1024 * 1024
+    )
+    for key in result["uploaded"]:
+        print(f"Uploaded {key}")
+    print(
+        f"Uploaded {len(result['uploaded'])} objects ({result['bytes_uploaded']} bytes), "
+        f"{len(result['skipped'])} already present"
+    )
+
+
 if __name__ == "__main__":
     args = parse_args()
 
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import sys
+from contextlib import contextmanager, redirect_stderr, redirect_stdout
+from dataclasses import asdict
+from io import StringIO
+from os import chdir, getcwd, makedirs
+from os.path import join
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+import yaml
+
+# Run from the convert directory: lib.convert loads its resource map data relative to it at import time
+from lib.convert import app
+
+from .stand_in import ApiCalls, AwsStandIn, Deployment, DeploymentShape
+
+# convert.py command lines exercising each app method under test
+COMMANDS = {
+    "get_stacks": ["print-stack", "--verbose"],
+    "create_tfvars": ["create-tfvars", "--ssh-key-path", "dummy.pem"],
+    "get_imports": ["set-imports"],
+    "clean_stack": ["clean-stack"],
+    # Needs clean_stack_plan to have run first, to write the plan
+    "clean_stack_plan": ["clean-stack", "--plan-out", "plan.json"],
+    "clean_stack_apply": ["clean-stack", "--apply", "plan.json"],
+}
+
+
+def run_command(stand_in: AwsStandIn, argv: list[str]) -> ApiCalls:
+    out = StringIO()
+    with stand_in.measure() as result, redirect_stdout(out), redirect_stderr(out):
+        with patch.object(sys, "argv", ["convert.py", *argv]), patch("lib.convert.stderr", out):
+            try:
+                app()
+            except SystemExit as e:
+                if e.code:
+                    raise Exception(f"convert.py {' '.join(argv)} exited with {e.code}:\n{out.getvalue()}")
+    return result
+
+
+@contextmanager
+def workspace(deployment: Deployment):
+    """Run convert.py commands from a scratch directory holding the deployment's config and terraform dirs"""
+    convert_dir = getcwd()
+    with TemporaryDirectory() as workdir:
+        chdir(workdir)
+        try:
+            with open("config.yaml", "w") as f:
+                yaml.safe_dump(deployment.config, f)
+            for component in ["cdk_tf", "infra", "cluster", "nodes"]:
+                makedirs(join(deployment.name, "terraform", component))
+            yield workdir
+        finally:
+            chdir(convert_dir)
+
+
+def run(shape: DeploymentShape, region: str, commands: list[str]) -> dict:
+    results = {}
+    with AwsStandIn(region) as stand_in:
+        deployment = Deployment(stand_in, shape)
+        with workspace(deployment):
+            for name in commands:
+                result = run_command(stand_in, COMMANDS[name])
+                results[name] = {
+                    "wall_time": round(result.wall_time, 4),
+                    "api_calls": result.total,
+                    "calls": dict(sorted(result.calls.items())),
+                }
+
+    return {"shape": asdict(shape), "region": region, "results": results}
+
+
+def compare(report: dict, baseline: dict, time_tolerance: float) -> list[str]:
+    """API call counts must not grow at all; wall time may grow by time_tolerance (a fraction)"""
+    regressions = []
+    for name, result in report["results"].items():
+        if not (base := baseline["results"].get(name)):
+            continue
+        if result["api_calls"] > base["api_calls"]:
+            regressions.append(f"{name}: {result['api_calls']} API calls, baseline {base['api_calls']}")
+        if result["wall_time"] > base["wall_time"] * (1 + time_tolerance):
+            regressions.append(f"{name}: {result['wall_time']}s, baseline {base['wall_time']}s")
+    return regressions
+
+
+def check_baseline(report: dict, baseline_path: str, time_tolerance: float):
+    baseline = json.loads(Path(baseline_path).read_text())
+    if baseline["shape"] != report["shape"]:
+        print(f"Baseline deployment shape differs: {baseline['shape']}")
+        exit(1)
+    if regressions := compare(report, baseline, time_tolerance):
+        print("\nRegressions against baseline:")
+        print("\n".join(regressions))
+        exit(1)
+
+
+def print_report(report: dict, verbose: bool):
+    print(f"Deployment: {report['shape']}")
+    print(f"{'command':<16}{'wall time (s)':>16}{'api calls':>12}")
+    for name, result in report["results"].items():
+        print(f"{name:<16}{result['wall_time']:>16.4f}{result['api_calls']:>12}")
+        if verbose:
+            for call, count in result["calls"].items():
+                print(f"    {call:<50}{count:>8}")
+
+
+def add_shape_args(parser: argparse.ArgumentParser):
+    parser.add_argument("--region", help="Stand-in region (us-east-1 has six availability zones)", default="us-east-1")
+    parser.add_argument("--availability-zones", help="Availability zone count", default=3, type=int)
+    parser.add_argument("--unmanaged-nodegroups", help="Unmanaged nodegroup count", default=3, type=int)
+    parser.add_argument("--managed-nodegroups", help="Managed nodegroup count", default=0, type=int)
+    parser.add_argument("--filler", help="Extra lambdas per nested stack", default=0, type=int)
+    parser.add_argument("--noise", help="Unrelated resources of each kind in the account", default=0, type=int)
+    for opt in ["bastion", "route53", "monitoring", "flow-logging", "efs-backups"]:
+        parser.add_argument(f"--{opt}", default=True, action=argparse.BooleanOptionalAction)
+
+
+def add_report_args(parser: argparse.ArgumentParser):
+    parser.add_argument("--output", help="Write the JSON report to this file", default=None)
+    parser.add_argument("--baseline", help="Fail if the report regresses against this JSON report", default=None)
+    parser.add_argument("--time-tolerance", help="Allowed wall time growth over baseline", default=0.5, type=float)
+    parser.add_argument("--verbose", help="Print per-operation API call counts", default=False, action="store_true")
+
+
+def shape_from_args(args: argparse.Namespace) -> DeploymentShape:
+    return DeploymentShape(
+        availability_zones=args.availability_zones,
+        unmanaged_nodegroups=args.unmanaged_nodegroups,
+        managed_nodegroups=args.managed_nodegroups,
+        bastion=args.bastion,
+        route53=args.route53,
+        monitoring=args.monitoring,
+        flow_logging=args.flow_logging,
+        efs_backups=args.efs_backups,
+        filler=args.filler,
+        noise=args.noise,
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark convert.py discovery against an in-process AWS stand-in",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    add_shape_args(parser)
+    parser.add_argument(
+        "--commands",
+        help=f"Commands to benchmark, from {list(COMMANDS)}",
+        type=lambda s: [x.strip() for x in s.split(",")],
+        default=list(COMMANDS),
+    )
+    add_report_args(parser)
+    args = parser.parse_args()
+
+    for c in args.commands:
+        if c not in COMMANDS:
+            parser.error(f"{c} not a valid command. Should be: {list(COMMANDS)}")
+
+    return args
+
+
+def main():
+    args = parse_args()
+
+    report = run(shape_from_args(args), args.region, args.commands)
+    print_report(report, args.verbose)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=4))
+
+    if args.baseline:
+        check_baseline(report, args.baseline, args.time_tolerance)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+import argparse
+import json
+from contextlib import redirect_stdout
+from copy import deepcopy
+from dataclasses import asdict
+from io import StringIO
+from pathlib import Path
+from unittest.mock import patch
+
+from lib.meta import cdk_ids
+from lib.nuke import nuke
+
+from .convert_bench import (
+    COMMANDS,
+    add_report_args,
+    add_shape_args,
+    check_baseline,
+    run_command,
+    shape_from_args,
+    workspace,
+)
+from .stand_in import AwsStandIn, Deployment, DeploymentShape
+
+MODES = ["dry-run", "delete"]
+
+
+def staged_queue(stand_in: AwsStandIn, deployment: Deployment) -> dict:
+    """The nuke queue clean-stack resolves for the deployment, captured instead of being nuked"""
+    with workspace(deployment), patch("lib.convert.nuke") as nuker:
+        run_command(stand_in, COMMANDS["clean_stack"])
+    return nuker.return_value.nuke.call_args.args[0]
+
+
+def queued(resource_type: str, resources) -> int:
+    if resource_type == cdk_ids.security_group_rule_ids.value:
+        return sum(len(ids) for rules in resources.values() for ids in rules.values())
+    return len(resources)
+
+
+def measure(stand_in: AwsStandIn, func, *args) -> dict:
+    out = StringIO()
+    with stand_in.measure() as result, redirect_stdout(out):
+        func(*args)
+    return {
+        "wall_time": round(result.wall_time, 4),
+        "api_calls": result.total,
+        "calls": dict(sorted(result.calls.items())),
+    }
+
+
+def run_mode(stand_in: AwsStandIn, region: str, queue: dict, mode: str) -> dict:
+    nuker = nuke(region=region, delete=mode == "delete")
+    # Create the clients up front, so the first method to use each doesn't pay for it
+    for client in ["autoscaling", "ec2", "eks", "iam", "awslambda", "ssm", "stepfunctions"]:
+        getattr(nuker, client)
+
+    results = {}
+    for resource_type in nuker.order:
+        if not (resources := queue.get(resource_type.value)):
+            continue
+        result = measure(stand_in, getattr(nuker, resource_type.name), resources)
+        count = queued(resource_type.value, resources)
+        results[f"{mode}:{resource_type.name}"] = {
+            "queued": count,
+            "calls_per_resource": round(result["api_calls"] / count, 2) if count else 0,
+            **result,
+        }
+
+    if mode == "dry-run":
+        # The whole run, including the security group reference scan nuke() does before any method
+        result = measure(stand_in, nuker.nuke, deepcopy(queue))
+        count = sum(queued(k, v) for k, v in queue.items())
+        results[f"{mode}:nuke"] = {
+            "queued": count,
+            "calls_per_resource": round(result["api_calls"] / count, 2),
+            **result,
+        }
+
+    return results
+
+
+def run(shape: DeploymentShape, region: str, modes: list[str]) -> dict:
+    results = {}
+    with AwsStandIn(region) as stand_in, patch("lib.nuke.sleep"):
+        deployment = Deployment(stand_in, shape)
+        queue = staged_queue(stand_in, deployment)
+        # Deleting is destructive, so it always goes last
+        for mode in sorted(modes, key=MODES.index):
+            results.update(run_mode(stand_in, region, queue, mode))
+
+    return {"shape": asdict(shape), "region": region, "results": results}
+
+
+def print_report(report: dict, verbose: bool):
+    print(f"Deployment: {report['shape']}")
+    print(f"{'method':<40}{'queued':>8}{'wall time (s)':>16}{'api calls':>12}{'calls/resource':>16}")
+    for name, result in report["results"].items():
+        print(
+            f"{name:<40}{result['queued']:>8}{result['wall_time']:>16.4f}"
+            f"{result['api_calls']:>12}{result['calls_per_resource']:>16.2f}"
+        )
+        if verbose:
+            for call, count in result["calls"].items():
+                print(f"    {call:<50}{count:>8}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark nuke methods on the clean-stack queue of a large synthetic account",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    add_shape_args(parser)
+    parser.set_defaults(managed_nodegroups=1, filler=10, noise=2000)
+    parser.add_argument(
+        "--modes",
+        help=f"Modes to benchmark, from {MODES}",
+        type=lambda s: [x.strip() for x in s.split(",")],
+        default=MODES,
+    )
+    add_report_args(parser)
+    args = parser.parse_args()
+
+    for m in args.modes:
+        if m not in MODES:
+            parser.error(f"{m} not a valid mode. Should be: {MODES}")
+
+    return args
+
+
+def main():
+    args = parse_args()
+
+    report = run(shape_from_args(args), args.region, args.modes)
+    print_report(report, args.verbose)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=4))
+
+    if args.baseline:
+        check_baseline(report, args.baseline, args.time_tolerance)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,658 @@
+#!/usr/bin/env python3
+import hashlib
+import io
+import json
+import zipfile
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import Any, Callable, Optional
+
+import boto3
+import yaml
+from botocore.awsrequest import AWSResponse
+from moto import mock_aws
+
+ACCOUNT_ID = "123456789012"
+
+# CloudFormation pages list_stack_resources/list_stacks at 100 entries
+CF_PAGE_SIZE = 100
+
+ASSUME_ROLE_POLICY = json.dumps(
+    {
+        "Version": "2012-10-17",
+        "Statement": [
+            {"Effect": "Allow", "Principal": {"Service": "ec2.amazonaws.com"}, "Action": "sts:AssumeRole"},
+        ],
+    }
+)
+POLICY_DOCUMENT = json.dumps(
+    {"Version": "2012-10-17", "Statement": [{"Effect": "Allow", "Action": "s3:ListBucket", "Resource": "*"}]}
+)
+AMI_ID = "ami-12c6146b"  # one of moto's stock AMIs
+
+# List operations moto answers in a single page, with AWS's default page size:
+# (service, operation): (page size, result key, input token, output token)
+AWS_PAGES = {
+    ("lambda", "ListFunctions"): (50, "Functions", "Marker", "NextMarker"),
+    ("iam", "ListInstanceProfiles"): (100, "InstanceProfiles", "Marker", "Marker"),
+}
+
+
+def lambda_zip() -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as z:
+        z.writestr("index.py", "def on_event(event, context):\n    pass\n")
+    return buf.getvalue()
+
+
+def cdk_hash(logical_id: str) -> str:
+    """Mimic the 8 character uppercase hex suffix CDK appends to logical ids"""
+    return hashlib.md5(logical_id.encode()).hexdigest()[:8].upper()
+
+
+@dataclass
+class ApiCalls:
+    wall_time: float = 0.0
+    calls: Counter = field(default_factory=Counter)
+
+    @property
+    def total(self) -> int:
+        return sum(self.calls.values())
+
+
+class FakeCloudFormation:
+    """Serves nested stack inventories, which moto can't model for CDK-generated stacks"""
+
+    def __init__(self, region: str):
+        self.region = region
+        self.stacks: dict[str, dict[str, Any]] = {}
+
+    def add_stack(self, name: str, resources: list[dict[str, str]], outputs: Optional[dict[str, str]] = None) -> str:
+        stack_id = f"arn:aws:cloudformation:{self.region}:{ACCOUNT_ID}:stack/{name}/{cdk_hash(name).lower()}"
+        stack = {
+            "StackName": name,
+            "StackId": stack_id,
+            "StackStatus": "UPDATE_COMPLETE",
+            "CreationTime": datetime(2023, 1, 1, tzinfo=timezone.utc),
+            "LastUpdatedTime": datetime(2023, 6, 1, tzinfo=timezone.utc),
+            "Outputs": [{"OutputKey": k, "OutputValue": v} for k, v in (outputs or {}).items()],
+            "Resources": resources,
+        }
+        self.stacks[name] = stack
+        self.stacks[stack_id] = stack
+        return stack_id
+
+    def _stack(self, name: str) -> dict[str, Any]:
+        if name not in self.stacks:
+            raise StandInError("ValidationError", f"Stack with id {name} does not exist")
+        return self.stacks[name]
+
+    @staticmethod
+    def _page(items: list, key: str, params: dict) -> dict:
+        start = int(params.get("NextToken") or 0)
+        end = start + CF_PAGE_SIZE
+        out = {key: items[start:end]}
+        if end < len(items):
+            out["NextToken"] = str(end)
+        return out
+
+    def list_stack_resources(self, params: dict) -> dict:
+        stack = self._stack(params["StackName"])
+        summaries = [{**r, "ResourceStatus": "CREATE_COMPLETE"} for r in stack["Resources"]]
+        return self._page(summaries, "StackResourceSummaries", params)
+
+    def describe_stack_resources(self, params: dict) -> dict:
+        stack = self._stack(params["StackName"])
+        return {
+            "StackResources": [
+                {**r, "StackName": stack["StackName"], "StackId": stack["StackId"], "ResourceStatus": "CREATE_COMPLETE"}
+                for r in stack["Resources"]
+            ]
+        }
+
+    def describe_stacks(self, params: dict) -> dict:
+        stack = self._stack(params["StackName"])
+        return {"Stacks": [{k: v for k, v in stack.items() if k != "Resources"}]}
+
+    def list_stacks(self, params: dict) -> dict:
+        status_filter = params.get("StackStatusFilter")
+        summaries = [
+            {"StackName": s["StackName"], "StackId": s["StackId"], "StackStatus": s["StackStatus"]}
+            for k, s in self.stacks.items()
+            if k == s["StackName"] and (not status_filter or s["StackStatus"] in status_filter)
+        ]
+        return self._page(summaries, "StackSummaries", params)
+
+
+class StandInError(Exception):
+    def __init__(self, code: str, message: str, status: int = 400):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
+
+
+class AwsStandIn:
+    """
+    In-process AWS for benchmarking convert.py without an account.
+
+    moto serves every service, except CloudFormation and any operation overridden via respond(). Every
+    API call made through boto3's default session is counted, regardless of who serves it. Operations in
+    AWS_PAGES are re-paged to AWS's page size, so full-account scans cost as many calls as they would in AWS.
+    """
+
+    def __init__(self, region: str = "us-east-1"):
+        self.region = region
+        self.cf = FakeCloudFormation(region)
+        self.responders: dict[tuple[str, str], Callable[[dict], dict]] = {
+            ("cloudformation", "ListStackResources"): self.cf.list_stack_resources,
+            ("cloudformation", "DescribeStackResources"): self.cf.describe_stack_resources,
+            ("cloudformation", "DescribeStacks"): self.cf.describe_stacks,
+            ("cloudformation", "ListStacks"): self.cf.list_stacks,
+        }
+        self.calls: Counter = Counter()
+        self._mock = mock_aws()
+
+    def __enter__(self) -> "AwsStandIn":
+        self._mock.start()
+        boto3.setup_default_session(region_name=self.region)
+        events = boto3.DEFAULT_SESSION.events
+        events.register("before-parameter-build", self._stash_params)
+        events.register("before-call", self._before_call)
+        events.register("after-call", self._repage)
+        return self
+
+    def __exit__(self, *exc):
+        boto3.DEFAULT_SESSION = None
+        self._mock.stop()
+
+    def respond(self, service: str, operation: str, handler: Callable[[dict], dict]):
+        self.responders[(service, operation)] = handler
+
+    def client(self, service: str):
+        return boto3.client(service, self.region)
+
+    @staticmethod
+    def _stash_params(params, model, context, **kwargs):
+        context["stand_in_params"] = params
+        if page := AWS_PAGES.get((model.service_model.service_name, model.name)):
+            # moto doesn't understand our page tokens, so don't pass them on
+            context["stand_in_offset"] = int(params.pop(page[2], None) or 0)
+
+    @staticmethod
+    def _repage(parsed, model, context, **kwargs):
+        if not (page := AWS_PAGES.get((model.service_model.service_name, model.name))):
+            return
+        size, key, _, token = page
+        start = context.get("stand_in_offset", 0)
+        end = start + size
+        items = parsed.get(key, [])
+        parsed[key] = items[start:end]
+        parsed.pop(token, None)
+        truncated = end < len(items)
+        if truncated:
+            parsed[token] = str(end)
+        if "IsTruncated" in model.output_shape.members:
+            parsed["IsTruncated"] = truncated
+
+    def _before_call(self, model, context, **kwargs):
+        key = (model.service_model.service_name, model.name)
+        self.calls[f"{key[0]}:{key[1]}"] += 1
+
+        if not (responder := self.responders.get(key)):
+            return None
+
+        try:
+            status, parsed = 200, responder(context.get("stand_in_params", {}))
+        except StandInError as e:
+            status, parsed = e.status, {"Error": {"Code": e.code, "Message": e.message}}
+        parsed["ResponseMetadata"] = {"HTTPStatusCode": status, "RequestId": "stand-in"}
+        return AWSResponse(f"https://stand-in/{key[0]}", status, {}, None), parsed
+
+    @contextmanager
+    def measure(self):
+        """Time the enclosed block and record the API calls it issues"""
+        result = ApiCalls()
+        self.calls.clear()
+        start = perf_counter()
+        try:
+            yield result
+        finally:
+            result.wall_time = perf_counter() - start
+            result.calls = Counter(self.calls)
+
+
+@dataclass
+class DeploymentShape:
+    name: str = "domino-bench"
+    availability_zones: int = 3
+    unmanaged_nodegroups: int = 3
+    managed_nodegroups: int = 0
+    bastion: bool = True
+    route53: bool = True
+    monitoring: bool = True
+    flow_logging: bool = True
+    efs_backups: bool = True
+    # Extra log-retention style lambdas per nested stack, to grow the stacks themselves
+    filler: int = 0
+    # Unrelated resources of every kind in the account, which discovery has to page past
+    noise: int = 0
+
+
+class Deployment:
+    """
+    A synthetic CDK deployment: the live resources are created in moto, and the matching
+    nested-stack inventory (as CDK names it) is registered with the CloudFormation stand-in.
+    """
+
+    nested_stack_ids = {
+        "efs_stack": "EfsStackNestedStackEfsStackNestedStackResource",
+        "eks_stack": "EksStackNestedStackEksStackNestedStackResource",
+        "s3_stack": "S3StackNestedStackS3StackNestedStackResource",
+        "vpc_stack": "VpcStackNestedStackVpcStackNestedStackResource",
+        "kubectl_stack": "awscdkawseksKubectlProviderNestedStackawscdkawseksKubectlProviderNestedStackResource",
+        "cluster_stack": "awscdkawseksClusterResourceProviderNestedStackawscdkawseksClusterResourceProviderNestedStackResource",
+    }
+
+    def __init__(self, stand_in: AwsStandIn, shape: DeploymentShape):
+        self.stand_in = stand_in
+        self.shape = shape
+        self.name = shape.name
+        self.key = "".join(c for c in shape.name if c.isalnum() or c == "_")
+        self.region = stand_in.region
+
+        self.ec2 = stand_in.client("ec2")
+        self.iam = stand_in.client("iam")
+        self.awslambda = stand_in.client("lambda")
+        self.ssm = stand_in.client("ssm")
+        self.autoscaling = stand_in.client("autoscaling")
+        self.stepfunctions = stand_in.client("stepfunctions")
+        self.eks = stand_in.client("eks")
+        self.route53 = stand_in.client("route53")
+
+        self.zip = lambda_zip()
+        self.azs = [az["ZoneName"] for az in self.ec2.describe_availability_zones()["AvailabilityZones"]][
+            : shape.availability_zones
+        ]
+        if len(self.azs) < shape.availability_zones:
+            raise ValueError(f"{self.region} only has {len(self.azs)} availability zones in the stand-in")
+
+        self.vpc_id = self.ec2.create_vpc(CidrBlock="10.0.0.0/16")["Vpc"]["VpcId"]
+        self.node_role_arn = self.iam.create_role(
+            RoleName=f"{self.name}-node-role", AssumeRolePolicyDocument=ASSUME_ROLE_POLICY
+        )["Role"]["Arn"]
+
+        self.stacks = {name: [] for name in self.nested_stack_ids}
+        self.stacks["core_stack"] = []
+
+        self.cluster_sg = self.security_group(f"eks-cluster-sg-{self.name}")
+        self.zone_ids = []
+        if shape.route53:
+            zone = self.route53.create_hosted_zone(Name=f"{self.name}.example.com", CallerReference=self.name)
+            self.zone_ids.append(zone["HostedZone"]["Id"].split("/")[-1])
+        self.populate()
+        self.register_cluster()
+        self.register_stacks()
+        self.add_noise(shape.noise)
+
+    # Resource helpers: each creates the live resource and returns its physical id
+
+    def resource(self, stack: str, logical_id: str, resource_type: str, physical_id: str) -> str:
+        self.stacks[stack].append(
+            {
+                "LogicalResourceId": f"{logical_id}{cdk_hash(stack + logical_id)}",
+                "PhysicalResourceId": physical_id,
+                "ResourceType": resource_type,
+            }
+        )
+        return physical_id
+
+    def role(self, name: str) -> str:
+        self.iam.create_role(RoleName=name, AssumeRolePolicyDocument=ASSUME_ROLE_POLICY)
+        return name
+
+    def policy(self, name: str) -> str:
+        return self.iam.create_policy(PolicyName=name, PolicyDocument=POLICY_DOCUMENT)["Policy"]["Arn"]
+
+    def function(self, name: str) -> str:
+        self.awslambda.create_function(
+            FunctionName=name,
+            Runtime="python3.9",
+            Role=self.node_role_arn,
+            Handler="index.on_event",
+            Code={"ZipFile": self.zip},
+        )
+        return name
+
+    def layer(self, name: str) -> str:
+        return self.awslambda.publish_layer_version(LayerName=name, Content={"ZipFile": self.zip})["LayerVersionArn"]
+
+    def security_group(self, name: str) -> str:
+        return self.ec2.create_security_group(GroupName=name, Description=name, VpcId=self.vpc_id)["GroupId"]
+
+    def sg_rule(self, group_id: str, port: int, description: str, source_group: Optional[str] = None):
+        permission: dict[str, Any] = {"IpProtocol": "tcp", "FromPort": port, "ToPort": port}
+        if source_group:
+            permission["UserIdGroupPairs"] = [{"GroupId": source_group, "Description": description}]
+        else:
+            permission["IpRanges"] = [{"CidrIp": "10.0.0.0/16", "Description": description}]
+        self.ec2.authorize_security_group_ingress(GroupId=group_id, IpPermissions=[permission])
+
+    def launch_template(self, name: str) -> str:
+        return self.ec2.create_launch_template(LaunchTemplateName=name, LaunchTemplateData={"ImageId": AMI_ID})[
+            "LaunchTemplate"
+        ]["LaunchTemplateId"]
+
+    def lambda_safe(self, stack: str, prefix: str):
+        """A CDK singleton/custom resource lambda: function plus its service role"""
+        fn_name = f"{self.name}-{prefix}-{cdk_hash(stack + prefix).lower()}"
+        self.resource(stack, prefix, "AWS::Lambda::Function", self.function(fn_name))
+        self.resource(stack, f"{prefix}ServiceRole", "AWS::IAM::Role", self.role(f"{fn_name}-role"))
+
+    # Stacks
+
+    def populate(self):
+        s = self.shape
+
+        for prefix in ["fixmissingtagsonevent", "LogRetentionaae0aa3c5b4d4f87b02d85b201efdd8a"]:
+            self.lambda_safe("core_stack", prefix)
+
+        self.populate_s3()
+        self.populate_vpc()
+        self.populate_eks()
+        self.populate_efs()
+
+        for stack in self.stacks:
+            for i in range(s.filler):
+                self.lambda_safe(stack, f"LogRetentionFiller{i}")
+
+    def populate_s3(self):
+        buckets = ["blobs", "logs", "backups", "registry"] + (["monitoring"] if self.shape.monitoring else [])
+        for b in buckets:
+            self.resource("s3_stack", b, "AWS::S3::Bucket", f"{self.name}-{b}")
+            self.resource("s3_stack", f"{b}Policy", "AWS::S3::BucketPolicy", f"{self.name}-{b}")
+        self.lambda_safe("s3_stack", "CustomS3AutoDeleteObjectsCustomResourceProviderHandler")
+
+    def populate_vpc(self):
+        s, k = self.shape, self.key
+
+        self.resource("vpc_stack", "VPC", "AWS::EC2::VPC", self.vpc_id)
+        igw = self.ec2.create_internet_gateway()["InternetGateway"]["InternetGatewayId"]
+        self.resource("vpc_stack", "VPCIGW", "AWS::EC2::InternetGateway", igw)
+
+        self.private_subnets = []
+        for i, az in enumerate(self.azs, start=1):
+            for j, kind in enumerate(["Public", "Private", "Pod"]):
+                prefix = f"VPC{k}{kind}Subnet{i}" if kind != "Pod" else f"{k}PodSubnet{i}"
+                subnet = self.ec2.create_subnet(
+                    VpcId=self.vpc_id, CidrBlock=f"10.0.{i * 3 + j}.0/24", AvailabilityZone=az
+                )["Subnet"]["SubnetId"]
+                if kind == "Private":
+                    self.private_subnets.append(subnet)
+                self.resource("vpc_stack", f"{prefix}Subnet", "AWS::EC2::Subnet", subnet)
+                self.resource("vpc_stack", f"{prefix}RouteTable", "AWS::EC2::RouteTable", f"rtb-{cdk_hash(prefix)}")
+                self.resource(
+                    "vpc_stack",
+                    f"{prefix}RouteTableAssociation",
+                    "AWS::EC2::SubnetRouteTableAssociation",
+                    f"rtbassoc-{cdk_hash(prefix)}",
+                )
+            eip = self.ec2.allocate_address(Domain="vpc")["PublicIp"]
+            self.resource("vpc_stack", f"VPC{k}PublicSubnet{i}EIP", "AWS::EC2::EIP", eip)
+            self.resource("vpc_stack", f"VPC{k}PublicSubnet{i}NATGateway", "AWS::EC2::NatGateway", f"nat-{i}")
+
+        endpoints_sg = self.security_group(f"{self.name}-endpoints")
+        self.resource("vpc_stack", "endpointssg", "AWS::EC2::SecurityGroup", endpoints_sg)
+        s3_endpoint = self.ec2.create_vpc_endpoint(
+            VpcId=self.vpc_id, ServiceName=f"com.amazonaws.{self.region}.s3", VpcEndpointType="Gateway"
+        )
+        self.resource("vpc_stack", "VPCS3", "AWS::EC2::VPCEndpoint", s3_endpoint["VpcEndpoint"]["VpcEndpointId"])
+        for svc in ["ec2", "ecr", "ecrdkr", "logs", "sts"]:
+            endpoint = self.ec2.create_vpc_endpoint(
+                VpcId=self.vpc_id, ServiceName=f"com.amazonaws.{self.region}.{svc}", VpcEndpointType="Interface"
+            )
+            self.resource(
+                "vpc_stack", f"{svc}ENDPOINT", "AWS::EC2::VPCEndpoint", endpoint["VpcEndpoint"]["VpcEndpointId"]
+            )
+
+        self.bastion_sg = None
+        if s.bastion:
+            self.bastion_sg = self.security_group(f"{self.name}-bastion")
+            self.resource("vpc_stack", "bastionsg", "AWS::EC2::SecurityGroup", self.bastion_sg)
+            instance = self.ec2.run_instances(ImageId=AMI_ID, MinCount=1, MaxCount=1)["Instances"][0]["InstanceId"]
+            self.resource("vpc_stack", "bastion", "AWS::EC2::Instance", instance)
+            role = self.role(f"{self.name}-bastion")
+            self.resource("vpc_stack", "bastionInstanceRole", "AWS::IAM::Role", role)
+            self.iam.create_instance_profile(InstanceProfileName=f"{self.name}-bastion")
+            self.resource("vpc_stack", "bastionInstanceProfile", "AWS::IAM::InstanceProfile", f"{self.name}-bastion")
+            self.resource(
+                "vpc_stack", "bastioneip", "AWS::EC2::EIP", self.ec2.allocate_address(Domain="vpc")["PublicIp"]
+            )
+
+        if s.flow_logging:
+            self.resource("vpc_stack", "VPCrejectFlowLogsFlowLog", "AWS::EC2::FlowLog", f"fl-{cdk_hash(self.name)}")
+
+        self.lambda_safe("vpc_stack", "LogRetentionaae0aa3c5b4d4f87b02d85b201efdd8a")
+        self.lambda_safe("vpc_stack", "AWS679f53fac002430cb0da5b7982bd2287")
+
+    def populate_eks(self):
+        s, k = self.shape, self.key
+
+        self.resource("eks_stack", "eks", "Custom::AWSCDK-EKS-Cluster", self.name)
+        self.eks_sg = self.security_group(f"{self.name}-EKSSG")
+        self.resource("eks_stack", "EKSSG", "AWS::EC2::SecurityGroup", self.eks_sg)
+        self.sg_rule(self.cluster_sg, 443, f"from {k}EKSSG:443")
+
+        for role in ["eksRole", "eksCreationRole", "eksMastersRole"]:
+            self.resource("eks_stack", role, "AWS::IAM::Role", self.role(f"{self.name}-{role}"))
+        self.node_role = self.role(f"{self.name}-NG")
+        self.resource("eks_stack", f"{k}NG", "AWS::IAM::Role", self.node_role)
+
+        policies = ["S3", "snapshot", f"{k}ebscsi", f"{k}DominoEcrRestricted", "autoscaler"]
+        if s.route53:
+            policies.append("route53")
+        for p in policies:
+            self.resource("eks_stack", p, "AWS::IAM::ManagedPolicy", self.policy(f"{self.name}-{p}"))
+
+        param = f"/cdk/{self.name}/KubectlReadyBarrier"
+        self.ssm.put_parameter(Name=param, Value="ready", Type="String")
+        self.resource("eks_stack", "eksKubectlReadyBarrier", "AWS::SSM::Parameter", param)
+        self.resource(
+            "eks_stack",
+            f"{k}kubernetessecretsenvelopekey",
+            "AWS::KMS::Key",
+            f"{cdk_hash(self.name).lower()}-kms-key",
+        )
+
+        for prefix in ["clusterpostcreationtasksonevent", "clusterpostdeletiontasksonevent"]:
+            self.lambda_safe("eks_stack", prefix)
+        self.lambda_safe("eks_stack", "LogRetentionaae0aa3c5b4d4f87b02d85b201efdd8a")
+
+        if s.unmanaged_nodegroups:
+            self.unmanaged_sg = self.security_group(f"{self.name}-sharedNodeSG")
+            self.resource("eks_stack", "UnmanagedSG", "AWS::EC2::SecurityGroup", self.unmanaged_sg)
+            self.sg_rule(self.eks_sg, 443, f"from {k}UnmanagedSG:443", self.unmanaged_sg)
+            self.sg_rule(self.unmanaged_sg, 443, f"from {k}EKSSG:443", self.eks_sg)
+            if self.bastion_sg:
+                self.sg_rule(self.unmanaged_sg, 22, f"from {k}bastionsg:22", self.bastion_sg)
+
+        for n in range(s.unmanaged_nodegroups):
+            ng = f"compute-{n}"
+            scope = f"UnmanagedNodeGroup{ng.replace('-', '')}"
+            lt = self.launch_template(f"{self.name}-{ng}")
+            self.resource("eks_stack", f"{scope}LaunchTemplate0", "AWS::EC2::LaunchTemplate", lt)
+            self.iam.create_instance_profile(InstanceProfileName=f"{self.name}-{ng}")
+            self.resource("eks_stack", f"{scope}InstanceProfile", "AWS::IAM::InstanceProfile", f"{self.name}-{ng}")
+            for i, az in enumerate(self.azs):
+                asg_name = f"{self.name}-{ng}-{az}"
+                self.autoscaling.create_auto_scaling_group(
+                    AutoScalingGroupName=asg_name,
+                    LaunchTemplate={"LaunchTemplateId": lt},
+                    MinSize=0,
+                    MaxSize=10,
+                    VPCZoneIdentifier=self.private_subnets[i],
+                )
+                self.resource(
+                    "eks_stack",
+                    f"{scope}{k}{ng.replace('-', '')}{i}ASG",
+                    "AWS::AutoScaling::AutoScalingGroup",
+                    asg_name,
+                )
+
+        if s.managed_nodegroups:
+            self.eks.create_cluster(
+                name=self.name, roleArn=self.node_role_arn, resourcesVpcConfig={"subnetIds": self.private_subnets}
+            )
+        for n in range(s.managed_nodegroups):
+            ng = f"managed-{n}"
+            lt = self.launch_template(f"{self.name}-LaunchTemplate{ng}")
+            self.resource("eks_stack", f"LaunchTemplate{ng.replace('-', '')}", "AWS::EC2::LaunchTemplate", lt)
+            for i, az in enumerate(self.azs):
+                ng_name = f"{self.name}-{ng}-{az}"
+                self.eks.create_nodegroup(
+                    clusterName=self.name,
+                    nodegroupName=ng_name,
+                    subnets=[self.private_subnets[i]],
+                    nodeRole=self.node_role_arn,
+                )
+                self.resource(
+                    "eks_stack",
+                    f"eksNodegroup{k}{ng.replace('-', '')}{i}",
+                    "AWS::EKS::Nodegroup",
+                    f"{self.name}/{ng_name}",
+                )
+
+        for prefix in ["OnEventHandler", "IsCompleteHandler"]:
+            self.lambda_safe("cluster_stack", prefix)
+        for prefix in ["ProviderframeworkonEvent", "ProviderframeworkisComplete", "ProviderframeworkonTimeout"]:
+            self.lambda_safe("cluster_stack", prefix)
+        sm_role = self.iam.get_role(RoleName=self.node_role)["Role"]["Arn"]
+        sm = self.stepfunctions.create_state_machine(
+            name=f"{self.name}-Providerwaiterstatemachine", definition="{}", roleArn=sm_role
+        )["stateMachineArn"]
+        self.resource("cluster_stack", "Providerwaiterstatemachine", "AWS::StepFunctions::StateMachine", sm)
+        self.resource(
+            "cluster_stack", "NodeProxyAgentLayer", "AWS::Lambda::LayerVersion", self.layer("NodeProxyAgentLayer")
+        )
+
+        self.lambda_safe("kubectl_stack", "Handler")
+        self.lambda_safe("kubectl_stack", "ProviderframeworkonEvent")
+        self.resource("kubectl_stack", "KubectlLayer", "AWS::Lambda::LayerVersion", self.layer("KubectlLayer"))
+
+    def populate_efs(self):
+        fs_id = f"fs-{cdk_hash(self.name).lower()}"
+        self.resource("efs_stack", "Efs", "AWS::EFS::FileSystem", fs_id)
+        self.resource("efs_stack", "Efsaccesspoint", "AWS::EFS::AccessPoint", f"fsap-{cdk_hash(fs_id).lower()}")
+        for i in range(1, len(self.azs) + 1):
+            self.resource("efs_stack", f"EfsEfsMountTarget{i}", "AWS::EFS::MountTarget", f"fsmt-{i}")
+        if self.shape.efs_backups:
+            self.resource("efs_stack", "efsbackup", "AWS::Backup::BackupVault", f"{self.name}-efs")
+            self.resource("efs_stack", "efsbackupplan", "AWS::Backup::BackupPlan", "plan-id")
+            self.resource("efs_stack", "efsbackuprole", "AWS::IAM::Role", self.role(f"{self.name}-efs-backup"))
+            self.resource("efs_stack", "efsbackupselection", "AWS::Backup::BackupSelection", "selection-id_plan-id")
+            self.lambda_safe("efs_stack", "backuppostcreationtasksonevent")
+        self.lambda_safe("efs_stack", "LogRetentionaae0aa3c5b4d4f87b02d85b201efdd8a")
+
+    @property
+    def cdkconfig(self) -> dict:
+        s = self.shape
+        bucket = {"auto_delete_objects": True, "removal_policy_destroy": True, "sse_kms_key_id": None}
+        return {
+            "name": self.name,
+            "aws_region": self.region,
+            "aws_account_id": ACCOUNT_ID,
+            "tags": {"domino-infrastructure": "true"},
+            "vpc": {
+                "create": True,
+                "id": None,
+                "max_azs": s.availability_zones,
+                "flow_logging": s.flow_logging,
+                "bastion": {"enabled": s.bastion},
+            },
+            "efs": {
+                "backup": {
+                    "enable": s.efs_backups,
+                    "schedule": "0 12 * * ? *",
+                    "move_to_cold_storage_after": 35,
+                    "delete_after": 125,
+                    "removal_policy": "DESTROY",
+                },
+            },
+            "route53": {"zone_ids": self.zone_ids},
+            "s3": {
+                "buckets": {
+                    **{b: bucket for b in ["blobs", "logs", "backups", "registry"]},
+                    "monitoring": bucket if s.monitoring else None,
+                }
+            },
+            "eks": {
+                "unmanaged_nodegroups": {f"compute-{n}": {} for n in range(s.unmanaged_nodegroups)},
+                "managed_nodegroups": {f"managed-{n}": {} for n in range(s.managed_nodegroups)},
+            },
+        }
+
+    def register_cluster(self):
+        cluster = {
+            "name": self.name,
+            "arn": f"arn:aws:eks:{self.region}:{ACCOUNT_ID}:cluster/{self.name}",
+            "version": "1.24",
+            "resourcesVpcConfig": {
+                "subnetIds": self.private_subnets,
+                "clusterSecurityGroupId": self.cluster_sg,
+                "endpointPublicAccess": True,
+                "endpointPrivateAccess": self.shape.bastion,
+                "publicAccessCidrs": ["0.0.0.0/0"],
+            },
+            "kubernetesNetworkConfig": {"serviceIpv4Cidr": "172.20.0.0/16"},
+            "encryptionConfig": [
+                {
+                    "resources": ["secrets"],
+                    "provider": {"keyArn": f"arn:aws:kms:{self.region}:{ACCOUNT_ID}:key/{cdk_hash(self.name).lower()}"},
+                }
+            ],
+            "status": "ACTIVE",
+        }
+
+        def describe_cluster(params: dict) -> dict:
+            if params["name"] != self.name:
+                raise StandInError("ResourceNotFoundException", f"No cluster found for name: {params['name']}.", 404)
+            return {"cluster": cluster}
+
+        self.stand_in.respond("eks", "DescribeCluster", describe_cluster)
+
+    def register_stacks(self):
+        cf = self.stand_in.cf
+
+        def nested(parent: str, child: str, stack_id: str):
+            self.resource(parent, self.nested_stack_ids[child], "AWS::CloudFormation::Stack", stack_id)
+
+        def add(child: str) -> str:
+            return cf.add_stack(f"{self.name}-{child}-{cdk_hash(child)}", self.stacks[child])
+
+        nested("eks_stack", "cluster_stack", add("cluster_stack"))
+        nested("eks_stack", "kubectl_stack", add("kubectl_stack"))
+        for child in ["efs_stack", "eks_stack", "s3_stack", "vpc_stack"]:
+            nested("core_stack", child, add(child))
+        cf.add_stack(self.name, self.stacks["core_stack"], outputs={"cdkconfig": yaml.safe_dump(self.cdkconfig)})
+
+    def add_noise(self, count: int):
+        """Unrelated account resources that full-account scans have to page through"""
+        noise_sg = None
+        for i in range(count):
+            if i % 50 == 0:  # stay under the per-group rule limit
+                noise_sg = self.security_group(f"noise-{i // 50}")
+            self.role(f"noise-role-{i}")
+            self.policy(f"noise-policy-{i}")
+            self.function(f"noise-function-{i}")
+            self.ssm.put_parameter(Name=f"/noise/{i}", Value="noise", Type="String")
+            self.launch_template(f"noise-lt-{i}")
+            self.iam.create_instance_profile(InstanceProfileName=f"noise-profile-{i}")
+            self.sg_rule(noise_sg, 1024 + i, f"noise {i}")
+
+    @property
+    def config(self) -> dict:
+        """convert.py's config.yaml"""
+        return {"AWS_REGION": self.region, "STACK_NAME": self.name, "MOD_VERSION": "v3.0.11"}
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+import re
+from typing import Optional
+
+import yaml
+
+from .meta import cdk_ids
+
+# Where each rule stack lives in the inventory built by app.get_stacks
+stack_paths = {
+    "efs_stack": ["efs_stack"],
+    "eks_cluster_stack": ["eks_stack", "cluster_stack"],
+    "eks_kubectl_stack": ["eks_stack", "kubectl_stack"],
+    "eks_stack": ["eks_stack"],
+    "s3_stack": ["s3_stack"],
+    "vpc_stack": ["vpc_stack"],
+    "core_stack": [],
+}
+
+lambda_safe = [
+    cdk_ids.lambda_function,
+    cdk_ids.iam_role,
+    cdk_ids.lambda_layerversion,
+    cdk_ids.stepfunctions_statemachine,
+]
+
+# {stack: {logical id regex: [resource types]}}; {stack_key} is replaced with the stack's alphanumeric name
+default_rules = {
+    "efs_stack": {
+        "(LogRetention|backuppostcreationtasks).*": lambda_safe,
+    },
+    "eks_cluster_stack": {
+        "(LogRetention|IsCompleteHandler|NodeProxyAgentLayer|OnEventHandler|Provider).*": lambda_safe,
+    },
+    "eks_kubectl_stack": {
+        "(Handler|KubectlLayer|ProviderframeworkonEvent).*": lambda_safe,
+    },
+    "eks_stack": {
+        "(snapshot|{stack_key}ebscsi|{stack_key}DominoEcrRestricted|autoscaler)": [cdk_ids.iam_policy],
+        "(eksMastersRole|{stack_key}NG)$": [cdk_ids.iam_role],
+        "eksKubectlReadyBarrier": [cdk_ids.ssm_parameter],
+        "(clusterpost(creation|deletion)tasks|LogRetention)": lambda_safe,
+        "Unmanaged": [cdk_ids.instance_profile, cdk_ids.asg, cdk_ids.launch_template],
+        "eksNodegroup": [cdk_ids.eks_nodegroup],
+    },
+    "s3_stack": {
+        "CustomS3AutoDeleteObjectsCustomResourceProvider": lambda_safe,
+    },
+    "vpc_stack": {
+        "endpointssg": [cdk_ids.security_group],
+        "(.*ENDPOINT|VPCS3)": [cdk_ids.endpoint],
+        "bastion": [cdk_ids.instance, cdk_ids.instance_profile, cdk_ids.iam_role, cdk_ids.eip],
+        "(LogRetention|AWS)": lambda_safe,
+    },
+    "core_stack": {
+        "(LogRetention|fixmissingtags)": lambda_safe,
+    },
+}
+
+
+# Rules the shared alternation would change the meaning of: global inline flags would apply to every rule (or fail
+# to compile mid-pattern), and backreferences and group names would refer to the alternation's groups
+standalone_re = re.compile(r"\(\?[aiLmsux]+\)|\\\d|\(\?P[<=]")
+
+
+def resource_type(t) -> str:
+    """Rules may name resource types by cdk_ids member, cdk_ids name or CloudFormation type"""
+    if isinstance(t, cdk_ids):
+        return t.value
+    if t in cdk_ids.__members__:
+        return cdk_ids[t].value
+    if t in [x.value for x in cdk_ids]:
+        return t
+    raise ValueError(f"Unknown resource type {t}. Should be one of: {list(cdk_ids.__members__)}")
+
+
+class rule_set:
+    """
+    Cleanup rules compiled to one alternation per (stack, resource type), so classifying a
+    resource costs a dict lookup and a single regex match. Each rule is a named group, which
+    tells us which rule claimed the resource without re-matching. Rules with inline flags,
+    backreferences or named groups are compiled on their own and tried in rule order.
+    """
+
+    def __init__(self, stack_key: str, rules_files: Optional[list[str]] = None):
+        self.stack_key = stack_key
+        self.rules: list[tuple[str, str, str, list[str]]] = []
+        self.add(default_rules, "default")
+        for f in rules_files or []:
+            self.load(f)
+
+    def load(self, rules_file: str):
+        with open(rules_file) as f:
+            rules = yaml.safe_load(f.read()) or {}
+        if not isinstance(rules, dict):
+            raise ValueError(f"{rules_file}: expected a mapping of stack name to rules")
+        self.add(rules, rules_file)
+
+    def add(self, rules: dict, source: str):
+        for stack, stack_rules in rules.items():
+            if stack not in stack_paths:
+                raise ValueError(f"{source}: unknown stack {stack}. Should be one of: {list(stack_paths)}")
+            for regex, types in (stack_rules or {}).items():
+                if isinstance(types, str):
+                    types = [types]
+                try:
+                    types = [resource_type(t) for t in types]
+                except ValueError as e:
+                    raise ValueError(f"{source}: {stack} rule {regex}: {e}")
+                regex = regex.replace("{stack_key}", self.stack_key)
+                try:
+                    re.compile(regex)
+                except re.error as e:
+                    raise ValueError(f"{source}: {stack} rule {regex} is not a valid regex: {e}")
+                self.rules.append((source, stack, regex, types))
+
+        by_type: dict[str, dict[str, tuple[list[str], list[tuple[int, re.Pattern]]]]] = {}
+        for i, (_, stack, regex, types) in enumerate(self.rules):
+            for t in types:
+                alternatives, standalone = by_type.setdefault(stack, {}).setdefault(t, ([], []))
+                if standalone_re.search(regex):
+                    standalone.append((i, re.compile(regex)))
+                else:
+                    alternatives.append(f"(?P<rule{i}>{regex})")
+        self.compiled = {
+            stack: {
+                t: (re.compile("|".join(alternatives)) if alternatives else None, standalone)
+                for t, (alternatives, standalone) in types.items()
+            }
+            for stack, types in by_type.items()
+        }
+
+    def match(self, stack: str, logical_id: str, resource_type: str) -> Optional[int]:
+        """Index of the rule claiming the resource, if any"""
+        if not (compiled := self.compiled.get(stack, {}).get(resource_type)):
+            return None
+        pattern, standalone = compiled
+        rule = int(m.lastgroup[4:]) if pattern and (m := pattern.match(logical_id)) else None
+        # A standalone rule only wins if it comes before the alternation's match
+        for i, p in standalone:
+            if rule is not None and i > rule:
+                break
+            if p.match(logical_id):
+                return i
+        return rule
+
+    def stack_resources(self, stacks: dict) -> dict[str, dict]:
+        """Resources (from get_stacks(full=True) or an inventory file) for each rule stack still present"""
+        out = {}
+        for stack, path in stack_paths.items():
+            s = stacks
+            for p in path:
+                s = (s or {}).get(p)
+            if s:
+                out[stack] = s["resources"]
+        return out
+
+    def classify(self, stacks: dict) -> list[tuple[int, str, str, dict]]:
+        """(rule index, stack, logical id, resource) for every resource claimed by a rule"""
+        return [
+            (rule, stack, logical_id, resource)
+            for stack, stack_resources in self.stack_resources(stacks).items()
+            for logical_id, resource in stack_resources.items()
+            if (rule := self.match(stack, logical_id, resource["ResourceType"])) is not None
+        ]
+
+    def queue(self, stacks: dict, nuke_queue: dict[str, list[str]]) -> dict[str, list[str]]:
+        """Add claimed resources of the types present in nuke_queue to it"""
+        for _, _, _, resource in self.classify(stacks):
+            if resource["ResourceType"] in nuke_queue:
+                nuke_queue[resource["ResourceType"]].append(resource["PhysicalResourceId"])
+        return nuke_queue
+
+    def explain(self, stacks: dict) -> list[dict]:
+        """Every rule, where it came from and the resources it claims"""
+        matches = {i: [] for i in range(len(self.rules))}
+        for rule, stack, logical_id, resource in self.classify(stacks):
+            matches[rule].append(
+                {
+                    "logical_id": logical_id,
+                    "type": resource["ResourceType"],
+                    "physical_id": resource["PhysicalResourceId"],
+                }
+            )
+        return [
+            {"source": source, "stack": stack, "rule": regex, "types": types, "matches": matches[i]}
+            for i, (source, stack, regex, types) in enumerate(self.rules)
+        ]
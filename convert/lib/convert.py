@@ -15,14 +15,16 @@ from subprocess import CalledProcessError, check_output, run
 from sys import stderr
 from textwrap import dedent
 from time import sleep
-from typing import Any
+from typing import Any, Optional
 
 import boto3
 import yaml
 from packaging import version
 
+from .cleanup import rule_set
 from .meta import cdk_ids, cf_status, stack_map
 from .nuke import nuke
+from .tfstate import can_synthesize, synthesize_state
 
 resources = {}
 
@@ -33,6 +35,8 @@ for filename in listdir("data"):
 
 clean_categories = [x.name for x in cdk_ids if x.name != "cloudformation_stack"]
 
+clean_plan_version = 1
+
 
 def nested_az_replace(d: dict, count: int):
     for k, v in d.items():
@@ -117,6 +121,9 @@ class app:
         return self.config["MOD_VERSION"]
 
     def get_stacks(self, stack: str = None, full: bool = False):
+        if not stack:
+            # IDs of the root and every nested stack found, for fingerprinting
+            self.stack_ids = {self.stack_name: self.stack_name}
         stacks = {"resources": {}}
         p = self.cf.get_paginator("list_stack_resources")
         resources = [
@@ -135,6 +142,7 @@ class app:
                     if logical_id.startswith(mapped_logical_id):
                         try:
                             stacks[name] = self.get_stacks(physical_id, full)
+                            self.stack_ids[name] = physical_id
                         except self.cf.exceptions.ClientError as e:
                             if "does not exist" in e.response["Error"]["Message"]:
                                 stacks[name] = None
@@ -261,6 +269,18 @@ class app:
         import_parser.add_argument(
             "--resource-map", help="Path to custom resource map file (otherwise, we autoconfigure)", default=None
         )
+        import_parser.add_argument(
+            "--synthesize-state",
+            help="Write resources whose state can be derived from their ID to synthesized.tfstate in each module, instead of import blocks",
+            default=False,
+            action="store_true",
+        )
+        import_parser.add_argument(
+            "--push-state",
+            help="terraform state push each synthesized state (the modules must be initialized and have no state yet)",
+            default=False,
+            action="store_true",
+        )
         import_parser.set_defaults(command=self.write_imports)
 
         clean_stack_parser = subparsers.add_parser(
@@ -290,9 +310,39 @@ class app:
             default=False,
             action="store_true",
         )
+        clean_stack_parser.add_argument(
+            "--rules-file",
+            help="YAML file of extra cleanup rules ({stack: {logical id regex: [resource types]}}); may be repeated",
+            action="append",
+        )
+        clean_plan_group = clean_stack_parser.add_mutually_exclusive_group()
+        clean_plan_group.add_argument(
+            "--plan-out",
+            help="Also write the resolved deletion plan to this file, to review now and --apply later",
+        )
+        clean_plan_group.add_argument(
+            "--apply",
+            help="Run a plan written by --plan-out instead of rediscovering the stack (with --delete to delete)",
+        )
         clean_stack_parser.add_argument("--verbose", help="Verbose logging", default=False, action="store_true")
         clean_stack_parser.set_defaults(command=self.clean_stack)
 
+        check_rules_parser = subparsers.add_parser(
+            name="check-rules",
+            help="Show what each clean-stack rule matches in a saved stack inventory, without calling AWS",
+            parents=[common_parser],
+        )
+        check_rules_parser.add_argument(
+            "--resource-file",
+            help="Stack inventory generated via print-stack --verbose --yaml",
+            required=True,
+        )
+        check_rules_parser.add_argument(
+            "--rules-file", help="YAML file of extra cleanup rules; may be repeated", action="append"
+        )
+        check_rules_parser.add_argument("--yaml", help="Output as YAML", default=False, action="store_true")
+        check_rules_parser.set_defaults(command=self.check_rules)
+
         delete_stack_parser = subparsers.add_parser(
             name="delete-stack", help="Get commands to delete old stack", parents=[common_parser]
         )
@@ -361,7 +411,7 @@ class app:
         unmanaged_nodegroups: bool,
         flow_logging: bool,
     ) -> dict:
-        template = resources["resource_template"]["resources"]
+        template = deepcopy(resources["resource_template"]["resources"])
 
         optional_resources = []
         for count in range(availability_zones):
@@ -404,17 +454,9 @@ class app:
         val = re.sub(r"%cf_stack_key%", self.cf_stack_key, val)
         return val
 
-    def get_imports(self, resource_map: dict):
-        import_template = dedent(
-            """
-                import {{
-                    id = "{resource_id}"
-                    to = {tf_import_path}
-                  }}
-                """
-        )
-
-        imports: dict[str, list[str]] = {"cdk_tf": [], "infra": [], "cluster": [], "nodes": []}
+    def get_import_ids(self, resource_map: dict) -> list[tuple[str, str]]:
+        """(terraform address, import ID) for every resource to adopt"""
+        import_ids = []
 
         for map_stack, items in resource_map.items():
             resources = self.stacks[map_stack]["resources"]
@@ -443,28 +485,47 @@ class app:
                 else:
                     resource_id = resources[self.t(item["cf"])]
 
-                import_block = import_template.format(tf_import_path=tf_import_path, resource_id=resource_id)
-
-                if tf_import_path.startswith("module.infra"):
-                    imports["infra"].append(import_block)
-                elif tf_import_path.startswith("module.eks"):
-                    imports["cluster"].append(import_block)
-                elif tf_import_path.startswith("module.nodes"):
-                    imports["nodes"].append(import_block)
-                else:
-                    imports["cdk_tf"].append(import_block)
+                import_ids.append((tf_import_path, resource_id))
 
         eks_cluster_result = self.eks.describe_cluster(name=self.cdkconfig["name"])
         eks_cluster_auto_sg = eks_cluster_result["cluster"]["resourcesVpcConfig"]["clusterSecurityGroupId"]
-        imports["cdk_tf"].append(
-            import_template.format(
-                tf_import_path="aws_security_group.eks_cluster_auto", resource_id=eks_cluster_auto_sg
-            )
+        import_ids.append(("aws_security_group.eks_cluster_auto", eks_cluster_auto_sg))
+
+        return import_ids
+
+    @staticmethod
+    def tf_component(tf_import_path: str) -> str:
+        if tf_import_path.startswith("module.infra"):
+            return "infra"
+        elif tf_import_path.startswith("module.eks"):
+            return "cluster"
+        elif tf_import_path.startswith("module.nodes"):
+            return "nodes"
+        return "cdk_tf"
+
+    def get_imports(self, resource_map: dict, import_ids: Optional[list[tuple[str, str]]] = None):
+        import_template = dedent(
+            """
+                import {{
+                    id = "{resource_id}"
+                    to = {tf_import_path}
+                  }}
+                """
         )
 
+        imports: dict[str, list[str]] = {"cdk_tf": [], "infra": [], "cluster": [], "nodes": []}
+
+        for tf_import_path, resource_id in self.get_import_ids(resource_map) if import_ids is None else import_ids:
+            imports[self.tf_component(tf_import_path)].append(
+                import_template.format(tf_import_path=tf_import_path, resource_id=resource_id)
+            )
+
         return imports
 
     def write_imports(self):
+        if self.args.push_state and not self.args.synthesize_state:
+            raise ValueError("--push-state needs --synthesize-state")
+
         self.setup()
 
         if self.args.resource_map:
@@ -481,10 +542,38 @@ class app:
                 flow_logging=self.cdkconfig["vpc"]["flow_logging"],
             )
 
-        imports = self.get_imports(resource_map)
+        import_ids = self.get_import_ids(resource_map)
+
+        if self.args.synthesize_state:
+            state_ids = [(path, resource_id) for path, resource_id in import_ids if can_synthesize(path)]
+            import_ids = [(path, resource_id) for path, resource_id in import_ids if not can_synthesize(path)]
+            self.write_states(state_ids)
+
+        imports = self.get_imports(resource_map, import_ids)
         for component, import_values in imports.items():
             self.write_blocks(component, import_values)
 
+    def write_states(self, state_ids: list[tuple[str, str]]) -> None:
+        by_component: dict[str, list[tuple[str, str]]] = {"cdk_tf": [], "infra": [], "cluster": [], "nodes": []}
+        for path, resource_id in state_ids:
+            by_component[self.tf_component(path)].append((path, resource_id))
+
+        for component, entries in by_component.items():
+            if not entries:
+                continue
+            state_path = Path(self.terraform_dir, component, "synthesized.tfstate")
+            with open(state_path, "w") as f:
+                json.dump(synthesize_state(entries), f, indent=2)
+            print(f"Wrote {len(entries)} resources to {state_path}")
+
+            if self.args.push_state:
+                cmd = ["terraform", f"-chdir={Path(self.terraform_dir, component)}", "state", "push", state_path.name]
+                print(f"Running {cmd}...")
+                push_run = run(cmd, capture_output=True, text=True)
+                if push_run.returncode != 0:
+                    print(f"Error pushing state for {component}.", push_run.stdout, push_run.stderr)
+                    exit(1)
+
     def write_blocks(self, component: str, imports: list) -> None:
         imports_path = Path(self.terraform_dir, component, "imports.tf")
         with open(imports_path, "w") as f:
@@ -720,6 +809,12 @@ class app:
         return True
 
     def clean_stack(self):
+        if self.args.apply:
+            return self.apply_clean_plan()
+
+        if self.args.plan_out and self.args.delete:
+            raise ValueError("--plan-out only reviews. Delete with `clean-stack --apply <plan> --delete`.")
+
         self.setup(full=True, no_stacks=self.args.resource_file)
 
         if self.args.resource_file:
@@ -732,70 +827,8 @@ class app:
             if t not in clean_categories:
                 raise ValueError(f"{t} not a valid category for `--include-types`. Should be: {clean_categories}")
 
-        lambda_safe = [
-            cdk_ids.lambda_function.value,
-            cdk_ids.iam_role.value,
-            cdk_ids.lambda_layerversion.value,
-            cdk_ids.stepfunctions_statemachine.value,
-        ]
-        nukey = {
-            "efs_stack": {
-                "(LogRetention|backuppostcreationtasks).*": lambda_safe,
-            },
-            "eks_cluster_stack": {
-                "(LogRetention|IsCompleteHandler|NodeProxyAgentLayer|OnEventHandler|Provider).*": lambda_safe,
-            },
-            "eks_kubectl_stack": {
-                "(Handler|KubectlLayer|ProviderframeworkonEvent).*": lambda_safe,
-            },
-            "eks_stack": {
-                f"(snapshot|{self.cf_stack_key}ebscsi|{self.cf_stack_key}DominoEcrRestricted|autoscaler)": [
-                    cdk_ids.iam_policy.value
-                ],
-                f"(eksMastersRole|{self.cf_stack_key}NG)$": [cdk_ids.iam_role.value],
-                "eksKubectlReadyBarrier": [cdk_ids.ssm_parameter.value],
-                "(clusterpost(creation|deletion)tasks|LogRetention)": lambda_safe,
-                "Unmanaged": [cdk_ids.instance_profile.value, cdk_ids.asg.value, cdk_ids.launch_template.value],
-                "eksNodegroup": [cdk_ids.eks_nodegroup.value],
-            },
-            "s3_stack": {
-                "CustomS3AutoDeleteObjectsCustomResourceProvider": lambda_safe,
-            },
-            "vpc_stack": {
-                "endpointssg": [cdk_ids.security_group.value],
-                "(.*ENDPOINT|VPCS3)": [cdk_ids.endpoint.value],
-                "bastion": [
-                    cdk_ids.instance.value,
-                    cdk_ids.instance_profile.value,
-                    cdk_ids.iam_role.value,
-                    cdk_ids.eip.value,
-                ],
-                "(LogRetention|AWS)": lambda_safe,
-            },
-            "core_stack": {
-                "(LogRetention|fixmissingtags)": lambda_safe,
-            },
-        }
-
         nuke_queue = {x.value: [] for x in cdk_ids if x.name in include_types}
-
-        def get_nukes(stack_name, stack_resources):
-            for k, v in stack_resources.items():
-                for nukey_regex in nukey[stack_name].keys():
-                    if (
-                        re.match(nukey_regex, k)
-                        and v["ResourceType"] in nukey[stack_name][nukey_regex]
-                        and v["ResourceType"] in nuke_queue
-                    ):
-                        nuke_queue[v["ResourceType"]].append(v["PhysicalResourceId"])
-
-        get_nukes("efs_stack", self.stacks["efs_stack"]["resources"])
-        get_nukes("eks_cluster_stack", self.stacks["eks_stack"]["cluster_stack"]["resources"])
-        get_nukes("eks_kubectl_stack", self.stacks["eks_stack"]["kubectl_stack"]["resources"])
-        get_nukes("eks_stack", self.stacks["eks_stack"]["resources"])
-        get_nukes("s3_stack", self.stacks["s3_stack"]["resources"])
-        get_nukes("vpc_stack", self.stacks["vpc_stack"]["resources"])
-        get_nukes("core_stack", self.stacks["resources"])
+        self.cleanup_rules.queue(self.stacks, nuke_queue)
 
         empty_sg_rules = {"egress": [], "ingress": []}
         try:
@@ -835,10 +868,102 @@ class app:
             pprint(nuke_queue)
             exit(0)
 
+        if self.args.plan_out:
+            self.write_clean_plan(self.args.plan_out, nuke_queue)
+
         nuke(region=self.region, verbose=self.args.verbose, delete=self.args.delete).nuke(
             nuke_queue, self.args.remove_security_group_references
         )
 
+    def stack_fingerprints(self, stack_ids: dict[str, str]) -> dict[str, Optional[dict[str, str]]]:
+        """One describe_stacks per stack: any update or deletion since changes its fingerprint"""
+        fingerprints = {}
+        for name, stack_id in stack_ids.items():
+            try:
+                stack = self.cf.describe_stacks(StackName=stack_id)["Stacks"][0]
+            except self.cf.exceptions.ClientError as e:
+                if "does not exist" in e.response["Error"]["Message"]:
+                    fingerprints[name] = None
+                    continue
+                raise
+            fingerprints[name] = {
+                "StackId": stack["StackId"],
+                "StackStatus": stack["StackStatus"],
+                "LastUpdatedTime": str(stack.get("LastUpdatedTime") or stack.get("CreationTime")),
+            }
+        return fingerprints
+
+    def write_clean_plan(self, plan_file: str, nuke_queue: dict):
+        # Inventories loaded via --resource-file carry no stack IDs, so there's nothing to fingerprint
+        stack_ids = {} if self.args.resource_file else self.stack_ids
+        plan = {
+            "version": clean_plan_version,
+            "stack_name": self.stack_name,
+            "region": self.region,
+            "stacks": stack_ids,
+            "fingerprints": self.stack_fingerprints(stack_ids),
+            "order": [x.name for x in nuke.order if x.value in nuke_queue],
+            "queue": {k: v for k, v in nuke_queue.items() if k != cdk_ids.security_group_rule_ids.value},
+            "security_group_rule_ids": nuke_queue.get(cdk_ids.security_group_rule_ids.value, {}),
+        }
+        with open(plan_file, "w") as f:
+            json.dump(plan, f, indent=4)
+        print(f"Wrote deletion plan to {plan_file}, run it with `clean-stack --apply {plan_file} --delete`\n")
+
+    def apply_clean_plan(self):
+        for arg in ["resource_file", "include_types", "rules_file", "all_staged_resources"]:
+            if getattr(self.args, arg):
+                raise ValueError(f"--{arg.replace('_', '-')} has no effect with --apply, the plan is already resolved")
+
+        self.setup(no_stacks=True)
+
+        with open(self.args.apply) as f:
+            plan = json.load(f)
+
+        if plan.get("version") != clean_plan_version:
+            raise ValueError(f"{self.args.apply} is plan version {plan.get('version')}, expected {clean_plan_version}")
+        if (plan["stack_name"], plan["region"]) != (self.stack_name, self.region):
+            raise ValueError(
+                f"{self.args.apply} is for stack {plan['stack_name']} in {plan['region']}, "
+                f"but config.yaml is for {self.stack_name} in {self.region}"
+            )
+
+        if not plan["stacks"]:
+            print("Plan was made from a resource file, skipping stack staleness check\n")
+        elif stale := {
+            name: fingerprint
+            for name, fingerprint in self.stack_fingerprints(plan["stacks"]).items()
+            if fingerprint != plan["fingerprints"][name]
+        }:
+            print(f"Stacks have changed since {self.args.apply} was written:")
+            pprint(stale)
+            print("\nWrite a new plan with `clean-stack --plan-out`.")
+            exit(1)
+
+        nuke_queue = {**plan["queue"], cdk_ids.security_group_rule_ids.value: plan["security_group_rule_ids"]}
+        nuke(region=self.region, verbose=self.args.verbose, delete=self.args.delete).nuke(
+            nuke_queue, self.args.remove_security_group_references, [cdk_ids[x] for x in plan["order"]]
+        )
+
+    @cached_property
+    def cleanup_rules(self) -> rule_set:
+        return rule_set(re.sub(r"\W", "", self.stack_name), self.args.rules_file)
+
+    def check_rules(self):
+        with open(self.args.resource_file) as f:
+            stacks = yaml.safe_load(f.read())
+
+        rules = self.cleanup_rules.explain(stacks)
+        if self.args.yaml:
+            print(yaml.safe_dump(rules, sort_keys=False))
+        else:
+            pprint(rules, sort_dicts=False)
+
+        if unmatched := [r for r in rules if not r["matches"]]:
+            print("\nRules matching nothing:", file=stderr)
+            for r in unmatched:
+                print(f"  {r['source']}: {r['stack']} {r['rule']}", file=stderr)
+
     def _print_stacks_status(self, stacks_names: list):
         for stack_name in stacks_names:
             stack_status = self.cf.describe_stacks(StackName=stack_name)["Stacks"][0]["StackStatus"]
@@ -3,6 +3,7 @@ import re
 from functools import cached_property
 from pprint import pprint
 from time import sleep
+from typing import Optional
 
 import boto3
 from retry import retry
@@ -11,6 +12,25 @@ from .meta import cdk_ids
 
 
 class nuke:
+    # Resources are deleted in this order, so dependents go before what they depend on
+    order = [
+        cdk_ids.endpoint,
+        cdk_ids.eks_nodegroup,
+        cdk_ids.asg,
+        cdk_ids.instance,
+        cdk_ids.eip,
+        cdk_ids.launch_template,
+        cdk_ids.security_group,
+        cdk_ids.stepfunctions_statemachine,
+        cdk_ids.lambda_function,
+        cdk_ids.lambda_layerversion,
+        cdk_ids.iam_role,
+        cdk_ids.iam_policy,
+        cdk_ids.instance_profile,
+        cdk_ids.ssm_parameter,
+        cdk_ids.security_group_rule_ids,
+    ]
+
     def __init__(self, region: str, verbose: bool = False, delete: bool = False):
         self.region = region
         self.verbose = verbose
@@ -334,6 +354,9 @@ class nuke:
                                 raise Exception(
                                     f"VPC Endpoint {e} in unexpected state {state} after delete_endpoint call"
                                 )
+                            # Deleted endpoints can linger in describe results before they disappear
+                            if state.lower() == "deleted":
+                                deleted_endpoints += 1
                         except self.ec2.exceptions.ClientError as e:
                             if e.response["Error"]["Code"] == "InvalidVpcEndpointId.NotFound":
                                 deleted_endpoints += 1
@@ -358,7 +381,12 @@ class nuke:
                         raise
                     print(e)
 
-    def nuke(self, nuke_queue: dict[str, list[str]], remove_security_group_references: bool = False):
+    def nuke(
+        self,
+        nuke_queue: dict[str, list[str]],
+        remove_security_group_references: bool = False,
+        order: Optional[list[cdk_ids]] = None,
+    ):
         all_referenced_groups = {}
         if security_groups := nuke_queue.get(cdk_ids.security_group.value):
             for sg in security_groups:
@@ -392,24 +420,7 @@ class nuke:
                 exit(1)
 
         local_queue = []
-        order = [
-            cdk_ids.endpoint,
-            cdk_ids.eks_nodegroup,
-            cdk_ids.asg,
-            cdk_ids.instance,
-            cdk_ids.eip,
-            cdk_ids.launch_template,
-            cdk_ids.security_group,
-            cdk_ids.stepfunctions_statemachine,
-            cdk_ids.lambda_function,
-            cdk_ids.lambda_layerversion,
-            cdk_ids.iam_role,
-            cdk_ids.iam_policy,
-            cdk_ids.instance_profile,
-            cdk_ids.ssm_parameter,
-            cdk_ids.security_group_rule_ids,
-        ]
-        for x in order:
+        for x in order or self.order:
             if x.value in nuke_queue:
                 resource_list = nuke_queue.pop(x.value)
                 local_queue.append([getattr(self, x.name), resource_list])
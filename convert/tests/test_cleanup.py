@@ -0,0 +1,58 @@
+import unittest
+from os.path import join
+from tempfile import TemporaryDirectory
+
+from lib.cleanup import rule_set
+from lib.meta import cdk_ids
+
+
+def stacks(*logical_ids: str, resource_type: str = cdk_ids.iam_role.value) -> dict:
+    return {
+        "resources": {},
+        "eks_stack": {
+            "resources": {
+                logical_id: {"ResourceType": resource_type, "PhysicalResourceId": f"{logical_id}-physical"}
+                for logical_id in logical_ids
+            }
+        },
+    }
+
+
+class TestRuleSet(unittest.TestCase):
+    def rules(self, rules: str) -> rule_set:
+        with TemporaryDirectory() as tmp:
+            rules_file = join(tmp, "rules.yaml")
+            with open(rules_file, "w") as f:
+                f.write(rules)
+            return rule_set("mystack", [rules_file])
+
+    def claimed(self, rules: rule_set, *logical_ids: str) -> dict:
+        return {logical_id: rules.rules[i][2] for i, _, logical_id, _ in rules.classify(stacks(*logical_ids))}
+
+    def test_defaults(self):
+        rules = rule_set("mystack")
+        self.assertEqual(
+            self.claimed(rules, "eksMastersRole", "mystackNG", "SomethingElse"),
+            {"eksMastersRole": "(eksMastersRole|mystackNG)$", "mystackNG": "(eksMastersRole|mystackNG)$"},
+        )
+
+    def test_inline_flags(self):
+        rules = self.rules('eks_stack:\n  "(?i)extrarole": [iam_role]\n  "Other": [iam_role]\n')
+        self.assertEqual(
+            self.claimed(rules, "ExtraRole", "extraROLE", "Other", "other"),
+            {"ExtraRole": "(?i)extrarole", "extraROLE": "(?i)extrarole", "Other": "Other"},
+        )
+
+    def test_backreferences(self):
+        rules = self.rules('eks_stack:\n  "(Role)\\\\1": [iam_role]\n  "(?P<x>ab)(?P=x)": [iam_role]\n')
+        self.assertEqual(
+            self.claimed(rules, "RoleRole", "RoleOther", "abab"),
+            {"RoleRole": "(Role)\\1", "abab": "(?P<x>ab)(?P=x)"},
+        )
+
+    def test_rule_order(self):
+        # The first matching rule claims a resource, whether or not it's compiled on its own
+        rules = self.rules('eks_stack:\n  "(?i)mystackng": [iam_role]\n')
+        self.assertEqual(self.claimed(rules, "mystackNG"), {"mystackNG": "(eksMastersRole|mystackNG)$"})
+        rules = self.rules('eks_stack:\n  "(?i)custom": [iam_role]\n  "Custom": [iam_role]\n')
+        self.assertEqual(self.claimed(rules, "Custom"), {"Custom": "(?i)custom"})
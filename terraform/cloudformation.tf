@@ -7,7 +7,7 @@ resource "aws_cloudformation_stack" "cdk_stack" {
   parameters         = var.parameters
   template_url       = "https://${aws_s3_bucket.cf_asset_bucket.bucket_regional_domain_name}/${var.template_filename}"
   iam_role_arn       = length(var.iam_policy_paths) != 0 ? aws_iam_role.deployment[0].arn : var.iam_role_arn
-  depends_on         = [aws_s3_bucket_object.assets]
+  depends_on         = [aws_s3_bucket_object.assets, aws_s3_bucket_object.content_addressed_assets]
   timeout_in_minutes = var.cloudformation_timeout_in_minutes
   disable_rollback = var.disable_rollback
 
@@ -51,7 +51,7 @@ resource "aws_s3_bucket_public_access_block" "deny_public_access" {
 }
 
 resource "aws_s3_bucket_object" "assets" {
-  for_each    = fileset("${var.asset_dir}/", "**")
+  for_each    = length(var.asset_manifest) == 0 ? fileset("${var.asset_dir}/", "**") : toset([])
   bucket      = aws_s3_bucket.cf_asset_bucket.id
   key         = each.value
   source      = "${var.asset_dir}/${each.value}"
@@ -60,3 +60,14 @@ resource "aws_s3_bucket_object" "assets" {
     aws_s3_bucket_public_access_block.deny_public_access
   ]
 }
+
+# Keyed by content hash, so only new or changed assets are uploaded
+resource "aws_s3_bucket_object" "content_addressed_assets" {
+  for_each = { for k, v in var.asset_manifest : k => v if var.upload_assets }
+  bucket   = aws_s3_bucket.cf_asset_bucket.id
+  key      = each.value.key
+  source   = "${var.asset_dir}/${each.value.source}"
+  depends_on = [
+    aws_s3_bucket_public_access_block.deny_public_access
+  ]
+}
@@ -8,6 +8,18 @@ variable "asset_dir" {
   description = "Local path of CDK asset directory"
 }
 
+variable "asset_manifest" {
+  type        = map(object({ key = string, source = string }))
+  description = "Content-addressed asset objects (sha256 => key and source path in asset_dir). Uploads every file in asset_dir by name when empty"
+  default     = {}
+}
+
+variable "upload_assets" {
+  type        = bool
+  description = "Upload the objects in asset_manifest. Disable when they're uploaded beforehand with util.py upload_assets"
+  default     = true
+}
+
 variable "aws_region" {
   type        = string
   description = "AWS Region to deploy stack into"